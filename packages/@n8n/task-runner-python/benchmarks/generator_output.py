@@ -0,0 +1,111 @@
+"""Worker peak memory and time to first result of user code that returns a list versus yields.
+
+Each variant runs in a fresh worker of its own runner, against the stand-in
+broker streaming results in chunks, with items that user code yields slowly
+streamed as they come.
+
+Run with: just bench generator_output
+"""
+
+import asyncio
+from typing import Dict
+
+from benchmarks.stand_in_broker import StandInBroker
+from src.constants import (
+    DEFAULT_MAX_PAYLOAD_SIZE,
+    DEFAULT_RESULT_BUFFER_MEMORY_LIMIT,
+    DEFAULT_SEND_QUEUE_HIGH_WATER_MARK,
+    RESULT_STREAMING,
+    RUNNER_TASK_OFFERS,
+)
+from src.task_runner import TaskRunner, TaskRunnerOpts
+
+ITEM_COUNT = 500_000
+SLOW_ITEM_COUNT = 20
+PORT = 5695  # and up, one per variant
+
+ITEM = "{'json': {'index': index, 'label': f'item {index}', 'tags': ['a', 'b', 'c']}}"
+
+VARIANTS: Dict[str, str] = {
+    "return list": f"return [{ITEM} for index in range({ITEM_COUNT})]",
+    "yield": f"for index in range({ITEM_COUNT}):\n    yield {ITEM}",
+    "return list, slow": (
+        "import time\n"
+        "result = []\n"
+        f"for index in range({SLOW_ITEM_COUNT}):\n"
+        "    time.sleep(0.05)\n"
+        f"    result.append({ITEM})\n"
+        "return result"
+    ),
+    "yield, slow": (
+        "import time\n"
+        f"for index in range({SLOW_ITEM_COUNT}):\n"
+        "    time.sleep(0.05)\n"
+        f"    yield {ITEM}"
+    ),
+}
+
+
+async def run(name: str, code: str, port: int) -> None:
+    broker = StandInBroker([RUNNER_TASK_OFFERS, RESULT_STREAMING])
+    runner = TaskRunner(
+        TaskRunnerOpts(
+            grant_token="stand-in",
+            task_broker_uri=f"http://127.0.0.1:{port}",
+            max_concurrency=1,
+            max_payload_size=DEFAULT_MAX_PAYLOAD_SIZE,
+            task_timeout=120,
+            worker_pool_size=1,
+            worker_max_tasks=2,  # so the worker and its peak RSS outlive the task
+            worker_max_rss=0,
+            worker_max_age=0,
+            worker_start_method="forkserver",
+            worker_preload_modules=["json"],
+            per_item_parallelism=1,
+            send_queue_high_water_mark=DEFAULT_SEND_QUEUE_HIGH_WATER_MARK,
+            auth_token="",
+            result_buffer_memory_limit=DEFAULT_RESULT_BUFFER_MEMORY_LIMIT,
+            drain_timeout=0,
+        )
+    )
+
+    async with broker.serve(port):
+        runner_task = asyncio.create_task(runner.start())
+
+        try:
+            outcome = await broker.run_task(
+                {
+                    "code": code,
+                    "nodeMode": "runOnceForAllItems",
+                    "continueOnFail": False,
+                    "items": [],
+                }
+            )
+            assert outcome.message["type"] == "runner:taskdone", outcome.message
+            item_count = len(outcome.message["data"]["result"])
+            worker_rss = max(
+                worker.peak_rss for worker in runner.worker_pool.idle_workers
+            )
+        finally:
+            runner_task.cancel()
+            await runner.stop()
+
+    first_chunk_latency = outcome.first_chunk_latency or 0
+    print(
+        f"{name:<18} {item_count:>8} {worker_rss / 1024:>9.0f}MiB "
+        f"{first_chunk_latency * 1000:>9.0f}ms {outcome.latency * 1000:>9.0f}ms "
+        f"{outcome.result_chunk_count:>7}"
+    )
+
+
+def main():
+    print(
+        f"{'code':<18} {'items':>8} {'worker RSS':>12} {'first':>11} {'last':>11} {'chunks':>7}"
+    )
+
+    for port, (name, code) in enumerate(VARIANTS.items(), PORT):
+        asyncio.run(run(name, code, port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Encode and decode throughput of each installed JSON backend on n8n item payloads.
+
+Run with: just bench json_codec
+"""
+
+import json
+import time
+from typing import Any, Callable
+
+from src import json_codec
+
+ITEM_COUNT = 20_000
+REPEATS = 5
+
+
+def make_items():
+    return [
+        {
+            "json": {
+                "id": index,
+                "email": f"user{index}@example.com",
+                "name": "Zoë Müller",
+                "active": index % 3 == 0,
+                "score": index * 0.37,
+                "tags": ["lead", "newsletter"],
+                "address": {"city": "Berlin", "zip": "10115", "geo": [52.53, 13.38]},
+                "notes": None,
+            },
+            "pairedItem": {"item": index},
+        }
+        for index in range(ITEM_COUNT)
+    ]
+
+
+def best_of(fn: Callable[[], Any]) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    print(f"Using: {json_codec.JSON_BACKEND}\n")
+
+    items = make_items()
+    encoded = json_codec._stdlib_dumps(items)
+    size_mib = len(encoded) / 1024 / 1024
+    print(f"{ITEM_COUNT:,} items, {size_mib:.1f} MiB encoded")
+
+    baseline = (
+        best_of(lambda: json.dumps(items).encode()),
+        best_of(lambda: json.loads(encoded)),
+    )
+
+    print(f"{'backend':<10} {'encode':>13} {'decode':>13} {'speedup':>10}")
+    print(
+        f"{'json (old)':<10} {size_mib / baseline[0]:>8.0f}MiB/s "
+        f"{size_mib / baseline[1]:>8.0f}MiB/s"
+    )
+    for name, (dumps, loads) in json_codec.BACKENDS.items():
+        encode = best_of(lambda: dumps(items))
+        decode = best_of(lambda: loads(encoded))
+        print(
+            f"{name:<10} {size_mib / encode:>8.0f}MiB/s {size_mib / decode:>8.0f}MiB/s "
+            f"{baseline[0] / encode:>6.1f}x/{baseline[1] / decode:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Encode time per runner message type, against `asdict`.
+
+Run with: just bench message_serde
+"""
+
+import json
+import time
+from dataclasses import asdict
+from typing import Any, Callable, List, Tuple
+
+from src import json_codec
+from src.message_serde import MessageSerde
+from src.message_types import (
+    RunnerInfo,
+    RunnerMessage,
+    RunnerTaskAccepted,
+    RunnerTaskDone,
+    RunnerTaskError,
+    RunnerTaskOffer,
+    RunnerTaskOffers,
+    RunnerTaskRejected,
+)
+
+ITERATIONS = 100_000
+
+RUNNER_MESSAGES: List[RunnerMessage] = [
+    RunnerInfo(
+        name="Python Task Runner", types=["python"], capabilities=["runner:taskoffers"]
+    ),
+    RunnerTaskOffer(
+        offer_id="V1StGXR8_Z5jdHi6B-myT", task_type="python", valid_for=5000
+    ),
+    RunnerTaskOffers(
+        task_type="python",
+        offers=[
+            {"offerId": f"V1StGXR8_Z5jdHi6B-my{i}", "validFor": 5000} for i in range(5)
+        ],
+    ),
+    RunnerTaskAccepted(task_id="V1StGXR8_Z5jdHi6B-myT"),
+    RunnerTaskRejected(
+        task_id="V1StGXR8_Z5jdHi6B-myT",
+        reason="No open task slots - runner already at capacity",
+    ),
+    RunnerTaskDone(task_id="V1StGXR8_Z5jdHi6B-myT", result=b'[{"json":{"a":1}}]'),
+    RunnerTaskError(
+        task_id="V1StGXR8_Z5jdHi6B-myT",
+        error={
+            "message": "name 'x' is not defined",
+            "description": "NameError",
+            "stack": "Traceback (most recent call last):\n" * 10,
+        },
+    ),
+]
+
+
+def snake_to_camel_case(snake_case_str: str) -> str:
+    parts = snake_case_str.split("_")
+    return parts[0] + "".join(word.capitalize() for word in parts[1:])
+
+
+def serialize_with_asdict(message: RunnerMessage) -> bytes:
+    """Previous encoder: deep copy with `asdict`, then convert every key."""
+
+    if isinstance(message, RunnerTaskDone):
+        return MessageSerde._serialize_task_done(message)
+
+    data = asdict(message)
+    return json_codec.dumps({snake_to_camel_case(k): v for k, v in data.items()})
+
+
+def microseconds_per_call(fn: Callable[[Any], Any], arg: Any) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        fn(arg)
+    return (time.perf_counter() - start) / ITERATIONS * 1_000_000
+
+
+def report(rows: List[Tuple[str, float, float]]) -> None:
+    for name, before, after in rows:
+        print(f"{name:<26} {before:>8.2f}us {after:>8.2f}us {before / after:>7.2f}x")
+
+
+def main():
+    print(f"JSON backend: {json_codec.JSON_BACKEND}\n")
+    print(f"{'message':<26} {'before':>10} {'after':>10} {'speedup':>8}")
+
+    rows = []
+    for message in RUNNER_MESSAGES:
+        assert json.loads(serialize_with_asdict(message)) == json.loads(
+            MessageSerde.serialize_runner_message(message)
+        )
+        rows.append(
+            (
+                message.type,
+                microseconds_per_call(serialize_with_asdict, message),
+                microseconds_per_call(MessageSerde.serialize_runner_message, message),
+            )
+        )
+    report(rows)
+
+
+if __name__ == "__main__":
+    main()
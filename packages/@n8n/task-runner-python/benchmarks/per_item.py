@@ -0,0 +1,87 @@
+"""Items per second of the per-item executor against a fresh exec of the wrapped code per item.
+
+Run with: just bench per_item
+"""
+
+import time
+
+from src.constants import EXECUTOR_USER_OUTPUT_KEY
+from src.task_executor import TaskExecutor
+
+ITEM_COUNT = 100_000
+
+BODIES = {
+    "trivial": "return _item",
+    "realistic": """
+data = _item["json"]
+return {
+    "json": {
+        "full_name": f"{data['first']} {data['last']}".title(),
+        "total": round(sum(data["prices"]) * 1.2, 2),
+        "tags": [tag.upper() for tag in data["tags"]],
+    }
+}
+""",
+}
+
+
+def make_items():
+    return [
+        {
+            "json": {
+                "first": "ada",
+                "last": f"lovelace {index}",
+                "prices": [1.5, 2.25, index % 7],
+                "tags": ["a", "b", "c"],
+            }
+        }
+        for index in range(ITEM_COUNT)
+    ]
+
+
+def exec_per_item(raw_code, items):
+    """Previous per-item strategy: new globals and a full exec of the module per item."""
+
+    compiled_code = compile(TaskExecutor._wrap_code(raw_code), "<bench>", "exec")
+    result = []
+    for index, item in enumerate(items):
+        globals = {"__builtins__": __builtins__, "_item": item}
+        exec(compiled_code, globals)
+        user_output = globals[EXECUTOR_USER_OUTPUT_KEY]
+        if user_output is None:
+            continue
+        user_output["pairedItem"] = {"item": index}
+        result.append(user_output)
+    return {"result": result}
+
+
+def call_per_item(raw_code, items):
+    """Current per-item strategy: the user function defined once and called per item."""
+
+    return TaskExecutor._per_item(TaskExecutor._compile(raw_code, "per_item"), items)
+
+
+def items_per_second(fn, raw_code):
+    items = make_items()
+    start = time.perf_counter()
+    returned = fn(raw_code, items)
+    assert "error" not in returned, returned
+    # The per-item executor returns a generator, which runs the code as it is consumed.
+    result = list(returned["result"])
+    elapsed = time.perf_counter() - start
+    assert len(result) == ITEM_COUNT
+    return ITEM_COUNT / elapsed
+
+
+def main():
+    print(f"{'body':<10} {'exec per item':>16} {'call per item':>16} {'speedup':>8}")
+    for name, body in BODIES.items():
+        before = items_per_second(exec_per_item, body)
+        after = items_per_second(call_per_item, body)
+        print(
+            f"{name:<10} {before:>14,.0f}/s {after:>14,.0f}/s {after / before:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
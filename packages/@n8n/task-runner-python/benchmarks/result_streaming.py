@@ -0,0 +1,94 @@
+"""Runner peak memory, largest frame and latency of large results, whole and streamed in chunks.
+
+The runner runs in its own process against the stand-in broker, so that its
+peak RSS, read from /proc once all tasks are done, excludes the broker's copy
+of the results. Linux only.
+
+Run with: just bench result_streaming
+"""
+
+import asyncio
+import os
+import sys
+from typing import List
+
+from benchmarks.stand_in_broker import StandInBroker
+from src.constants import (
+    DEFAULT_SEND_QUEUE_HIGH_WATER_MARK,
+    ENV_GRANT_TOKEN,
+    ENV_MAX_PAYLOAD_SIZE,
+    ENV_TASK_BROKER_URI,
+    RESULT_STREAMING,
+    RUNNER_TASK_OFFERS,
+)
+
+RESULT_SIZES = [10, 100, 400]  # MiB, of 1 KiB items
+PORT = 5690  # and up, one per mode
+
+
+def peak_rss(pid: int) -> int:
+    """Peak RSS of a process in KiB."""
+
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+
+    raise ValueError(f"No peak RSS for process {pid}")
+
+
+async def run(capabilities: List[str], port: int) -> None:
+    broker = StandInBroker(capabilities)
+    mode = "streamed" if RESULT_STREAMING in capabilities else "whole"
+
+    async with broker.serve(port):
+        runner = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "src.main",
+            env={
+                **os.environ,
+                ENV_GRANT_TOKEN: "stand-in",
+                ENV_TASK_BROKER_URI: f"http://127.0.0.1:{port}",
+                ENV_MAX_PAYLOAD_SIZE: str(2 * max(RESULT_SIZES) * 1024 * 1024),
+            },
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+
+        try:
+            for size in RESULT_SIZES:
+                outcome = await broker.run_task(
+                    {
+                        "code": f"return [{{'json': {{'s': 'x' * 1000}}}}] * {size * 1024}",
+                        "nodeMode": "runOnceForAllItems",
+                        "continueOnFail": False,
+                        "items": [],
+                    }
+                )
+                assert outcome.message["type"] == "runner:taskdone", outcome.message
+                assert len(outcome.message["data"]["result"]) == size * 1024
+
+                print(
+                    f"{mode:<9} {size:>6}MiB {outcome.result_frame_size / 1024 / 1024:>9.1f}MiB "
+                    f"{outcome.result_chunk_count:>7} {outcome.latency * 1000:>9.0f}ms"
+                )
+
+            # Peak over all tasks, so the largest result dominates.
+            print(f"{mode:<9} runner peak RSS: {peak_rss(runner.pid) / 1024:.0f}MiB")
+        finally:
+            runner.terminate()
+            await runner.wait()
+
+
+def main():
+    print(
+        f"Send queue high water mark: {DEFAULT_SEND_QUEUE_HIGH_WATER_MARK // 1024 // 1024}MiB\n"
+    )
+    print(f"{'mode':<9} {'result':>9} {'largest':>12} {'chunks':>7} {'latency':>11}")
+
+    asyncio.run(run([RUNNER_TASK_OFFERS], PORT))
+    asyncio.run(run([RUNNER_TASK_OFFERS, RESULT_STREAMING], PORT + 1))
+
+
+if __name__ == "__main__":
+    main()
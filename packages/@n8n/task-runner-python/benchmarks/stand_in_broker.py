@@ -0,0 +1,221 @@
+"""A minimal task broker to run the runner against locally, without n8n.
+
+It registers a single runner, agreeing to the capabilities it is given, hands
+queued tasks to the runner's offers, and times each task from sending its
+settings to receiving its result. Task settings go out as MessagePack when
+that wire format was agreed, and as JSON otherwise, in frames of at most
+`fragment_size` bytes if given, as the n8n broker fragments large messages.
+The runner offers MessagePack only if msgpack is installed. Results streamed in chunks are assembled into the `runner:taskdone` message
+they stand for.
+"""
+
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import websockets
+
+from src import json_codec, msgpack_codec
+from src.constants import WIRE_FORMAT_MSGPACK
+
+
+@dataclass
+class TaskOutcome:
+    message: Dict[str, Any]  # runner:taskdone or runner:taskerror
+    settings_frame_size: int
+    result_frame_size: int  # of the largest frame, if the result was streamed
+    latency: float  # seconds, from settings sent to result received
+    result_chunk_count: int = 0
+    first_chunk_latency: Optional[float] = None  # seconds, if the result was streamed
+
+
+@dataclass
+class StreamedResult:
+    items: List[Any] = field(default_factory=list)
+    first_chunk_at: Optional[float] = None
+    chunk_count: int = 0
+    largest_frame_size: int = 0
+
+
+class StandInBroker:
+    def __init__(self, capabilities: List[str], fragment_size: Optional[int] = None):
+        self.capabilities = capabilities
+        self.fragment_size = fragment_size
+        self.agreed_capabilities: List[str] = []
+        self.registered = asyncio.Event()
+        self.pending: List[Tuple[str, Dict[str, Any]]] = []
+        self.accepted: Dict[str, Dict[str, Any]] = {}
+        self.offers: List[Tuple[str, float]] = []  # offer ID, valid until
+        self.outcomes: Dict[str, asyncio.Future] = {}
+        self.started_at: Dict[str, Tuple[float, int]] = {}
+        self.streams: Dict[str, StreamedResult] = {}
+        self.task_ids = (f"task-{index}" for index in itertools.count())
+        self.websocket: Optional[Any] = None
+
+    def serve(self, port: int):
+        # Without compression, as the n8n broker does not negotiate it.
+        return websockets.serve(
+            self._handle, "127.0.0.1", port, max_size=None, compression=None
+        )
+
+    async def run_task(self, settings: Dict[str, Any]) -> TaskOutcome:
+        """Queue a task for the runner's next offer and wait for its result."""
+
+        await self.registered.wait()
+
+        task_id = next(self.task_ids)
+        outcome = asyncio.get_running_loop().create_future()
+        self.outcomes[task_id] = outcome
+        self.pending.append((task_id, settings))
+        await self._match()
+
+        try:
+            return await outcome
+        finally:
+            del self.outcomes[task_id]
+
+    @property
+    def uses_msgpack(self) -> bool:
+        return WIRE_FORMAT_MSGPACK in self.agreed_capabilities
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        if self.uses_msgpack:
+            return msgpack_codec.dumps(message)
+        return json_codec.dumps(message)
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        assert self.websocket is not None
+        await self.websocket.send(json_codec.dumps(message), text=True)
+
+    async def _handle(self, websocket) -> None:
+        self.websocket = websocket
+        await self._send({"type": "broker:inforequest"})
+
+        async for frame in websocket:
+            received_at = time.perf_counter()
+
+            if isinstance(frame, bytes):
+                message = msgpack_codec.loads(frame)
+            else:
+                message = json_codec.loads(frame)
+                frame = frame.encode()
+
+            match message["type"]:
+                case "runner:info":
+                    self.agreed_capabilities = [
+                        capability
+                        for capability in message.get("capabilities", [])
+                        if capability in self.capabilities
+                    ]
+                    await self._send(
+                        {
+                            "type": "broker:runnerregistered",
+                            "capabilities": self.agreed_capabilities,
+                        }
+                    )
+                    self.registered.set()
+                case "runner:taskoffer":
+                    self._add_offer(message["offerId"], message["validFor"])
+                    await self._match()
+                case "runner:taskoffers":
+                    for offer in message["offers"]:
+                        self._add_offer(offer["offerId"], offer["validFor"])
+                    await self._match()
+                case "runner:taskaccepted":
+                    await self._send_settings(message["taskId"])
+                case "runner:taskresultbegin":
+                    self.streams[message["taskId"]] = StreamedResult()
+                case "runner:taskresultchunk":
+                    # Chunks of a stream replaced by a result or error are dropped.
+                    stream = self.streams.get(message["taskId"])
+                    if stream is None:
+                        continue
+                    assert message["sequence"] == stream.chunk_count, message
+                    if stream.first_chunk_at is None:
+                        stream.first_chunk_at = received_at
+                    stream.items.extend(message["items"])
+                    stream.chunk_count += 1
+                    stream.largest_frame_size = max(
+                        stream.largest_frame_size, len(frame)
+                    )
+                case "runner:taskresultend":
+                    stream = self.streams.pop(message["taskId"], None)
+                    if stream is None:
+                        continue
+                    assert message["chunkCount"] == stream.chunk_count, message
+                    self._complete(
+                        {
+                            "type": "runner:taskdone",
+                            "taskId": message["taskId"],
+                            "data": {"result": stream.items},
+                        },
+                        stream.largest_frame_size,
+                        received_at,
+                        stream.chunk_count,
+                        stream.first_chunk_at,
+                    )
+                case "runner:taskdone" | "runner:taskerror":
+                    self.streams.pop(message["taskId"], None)
+                    self._complete(message, len(frame), received_at)
+
+    def _complete(
+        self,
+        message: Dict[str, Any],
+        result_frame_size: int,
+        received_at: float,
+        result_chunk_count: int = 0,
+        first_chunk_at: Optional[float] = None,
+    ) -> None:
+        sent_at, settings_frame_size = self.started_at.pop(message["taskId"])
+        self.outcomes[message["taskId"]].set_result(
+            TaskOutcome(
+                message=message,
+                settings_frame_size=settings_frame_size,
+                result_frame_size=result_frame_size,
+                latency=received_at - sent_at,
+                result_chunk_count=result_chunk_count,
+                first_chunk_latency=(
+                    None if first_chunk_at is None else first_chunk_at - sent_at
+                ),
+            )
+        )
+
+    def _add_offer(self, offer_id: str, valid_for: int) -> None:
+        self.offers.append((offer_id, time.monotonic() + valid_for / 1000))
+
+    async def _match(self) -> None:
+        """Accept open offers for queued tasks, as the broker does."""
+
+        while self.pending and self.offers:
+            offer_id, valid_until = self.offers.pop(0)
+            if valid_until < time.monotonic():
+                continue
+
+            task_id, settings = self.pending.pop(0)
+            self.accepted[task_id] = settings
+            await self._send(
+                {
+                    "type": "broker:taskofferaccept",
+                    "taskId": task_id,
+                    "offerId": offer_id,
+                }
+            )
+
+    async def _send_settings(self, task_id: str) -> None:
+        settings = self.accepted.pop(task_id)
+        frame = self.encode(
+            {"type": "broker:tasksettings", "taskId": task_id, "settings": settings}
+        )
+
+        fragments = [frame]
+        if self.fragment_size:
+            fragments = [
+                memoryview(frame)[offset : offset + self.fragment_size]
+                for offset in range(0, len(frame), self.fragment_size)
+            ]
+
+        assert self.websocket is not None
+        self.started_at[task_id] = (time.perf_counter(), len(frame))
+        await self.websocket.send(fragments, text=not self.uses_msgpack)
@@ -0,0 +1,191 @@
+"""Frame size, encode/decode time and end-to-end latency of the JSON and MessagePack wire formats.
+
+Items carry numeric arrays and base64 binary data, as n8n items often do. The
+end-to-end latency is measured against the stand-in broker, from sending the
+task settings to receiving the result of code returning its items unchanged.
+
+Run with: just bench wire_format
+"""
+
+import asyncio
+import base64
+import os
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+import msgpack
+
+from benchmarks.stand_in_broker import StandInBroker
+from src import json_codec
+from src.constants import (
+    DEFAULT_MAX_PAYLOAD_SIZE,
+    DEFAULT_RESULT_BUFFER_MEMORY_LIMIT,
+    DEFAULT_SEND_QUEUE_HIGH_WATER_MARK,
+    RUNNER_TASK_OFFERS,
+    WIRE_FORMAT_MSGPACK,
+)
+from src.message_serde import MessageSerde
+from src.message_types import RunnerTaskDone
+from src.message_types.broker import WireFormat
+from src.task_executor import TaskExecutor
+from src.task_runner import TaskRunner, TaskRunnerOpts
+
+ITEM_COUNT = 200
+REPEATS = 5
+TASK_COUNT = 20
+PORT = 5680  # and up, one per payload and format
+
+
+def make_items(with_binary: bool) -> List[Dict[str, Any]]:
+    items: List[Dict[str, Any]] = [
+        {
+            "json": {
+                "id": index,
+                "readings": [index * 0.1 + offset * 0.01 for offset in range(256)],
+                "counts": list(range(64)),
+            },
+        }
+        for index in range(ITEM_COUNT)
+    ]
+
+    if with_binary:
+        for index, item in enumerate(items):
+            item["binary"] = {
+                "data": {
+                    "data": base64.b64encode(os.urandom(16 * 1024)).decode(),
+                    "mimeType": "image/png",
+                    "fileName": f"image-{index}.png",
+                }
+            }
+
+    return items
+
+
+def settings_frame(items, wire_format: WireFormat) -> bytes:
+    message = {
+        "type": "broker:tasksettings",
+        "taskId": "task-0",
+        "settings": {
+            "code": "return _items",
+            "nodeMode": "runOnceForAllItems",
+            "continueOnFail": False,
+            "items": items,
+        },
+    }
+    if wire_format == "msgpack":
+        return msgpack.packb(message)
+    return json_codec.dumps(message)
+
+
+def decode_settings(frame: bytes, wire_format: WireFormat):
+    """Runner envelope parse, then the worker's items decode."""
+
+    message = MessageSerde.deserialize_broker_message(frame)
+    return TaskExecutor._items_decoder(wire_format)(memoryview(message.settings.items))
+
+
+def result_frame(items, wire_format: WireFormat) -> bytes:
+    """Worker result encode, then the runner's splice into the taskdone frame."""
+
+    result = TaskExecutor._encode_result(items, wire_format)
+    return MessageSerde.serialize_runner_message(
+        RunnerTaskDone(task_id="task-0", result=result, wire_format=wire_format)
+    )
+
+
+def best_of(fn: Callable[[], Any]) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+async def end_to_end_latencies(
+    items, wire_format: WireFormat, port: int
+) -> List[float]:
+    capabilities = [RUNNER_TASK_OFFERS]
+    if wire_format == "msgpack":
+        capabilities.append(WIRE_FORMAT_MSGPACK)
+
+    broker = StandInBroker(capabilities)
+    runner = TaskRunner(
+        TaskRunnerOpts(
+            grant_token="stand-in",
+            task_broker_uri=f"http://127.0.0.1:{port}",
+            max_concurrency=1,
+            max_payload_size=DEFAULT_MAX_PAYLOAD_SIZE,
+            task_timeout=60,
+            worker_pool_size=1,
+            worker_max_tasks=TASK_COUNT,
+            worker_max_rss=512,
+            worker_max_age=3600,
+            worker_start_method="forkserver",
+            worker_preload_modules=["json", "msgpack"],
+            per_item_parallelism=1,
+            send_queue_high_water_mark=DEFAULT_SEND_QUEUE_HIGH_WATER_MARK,
+            auth_token="",
+            result_buffer_memory_limit=DEFAULT_RESULT_BUFFER_MEMORY_LIMIT,
+            drain_timeout=0,
+        )
+    )
+
+    settings = {
+        "code": "return _items",
+        "nodeMode": "runOnceForAllItems",
+        "continueOnFail": False,
+        "items": items,
+    }
+
+    async with broker.serve(port):
+        runner_task = asyncio.create_task(runner.start())
+        latencies = []
+
+        try:
+            for _ in range(TASK_COUNT):
+                outcome = await broker.run_task(settings)
+                assert outcome.message["type"] == "runner:taskdone", outcome.message
+                latencies.append(outcome.latency)
+        finally:
+            runner_task.cancel()
+            await runner.stop()
+
+    return latencies
+
+
+def main():
+    print(f"{ITEM_COUNT} items, JSON backend: {json_codec.JSON_BACKEND}")
+
+    for index, with_binary in enumerate((False, True)):
+        print(f"\nNumeric arrays{' and 16 KiB of binary data' if with_binary else ''}")
+        compare(make_items(with_binary), PORT + 2 * index)
+
+
+def compare(items: List[Dict[str, Any]], first_port: int):
+    print(
+        f"{'format':<8} {'settings':>10} {'result':>10} "
+        f"{'encode':>9} {'decode':>9} {'result enc':>11} {'e2e p50':>9} {'e2e p95':>9}"
+    )
+
+    for port, wire_format in enumerate(("json", "msgpack"), first_port):
+        settings = settings_frame(items, wire_format)
+        result = result_frame(items, wire_format)
+        assert decode_settings(settings, wire_format) == items
+
+        encode = best_of(lambda: settings_frame(items, wire_format))
+        decode = best_of(lambda: decode_settings(settings, wire_format))
+        result_encode = best_of(lambda: result_frame(items, wire_format))
+        latencies = asyncio.run(end_to_end_latencies(items, wire_format, port))
+        p95 = statistics.quantiles(latencies, n=20)[-1]
+
+        print(
+            f"{wire_format:<8} {len(settings) / 1024:>8.0f}KiB {len(result) / 1024:>8.0f}KiB "
+            f"{encode * 1000:>7.1f}ms {decode * 1000:>7.1f}ms {result_encode * 1000:>9.1f}ms "
+            f"{statistics.median(latencies) * 1000:>7.1f}ms {p95 * 1000:>7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
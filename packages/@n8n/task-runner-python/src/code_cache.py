@@ -0,0 +1,63 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from types import CodeType
+from typing import Callable
+
+
+class CodeCache:
+    """Bounded LRU cache of compiled user code, keyed by a hash of the source and node mode.
+
+    Syntax errors are cached as well, so broken code is not recompiled on every run.
+    Safe to share between threads, as the runner compiles off the event loop.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict[bytes, CodeType | SyntaxError] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(
+        self, raw_code: str, node_mode: str, compile_code: Callable[[str], CodeType]
+    ) -> CodeType:
+        """Return the compiled code, compiling it with `compile_code` on a miss.
+
+        Raises the `SyntaxError` of code that failed to compile.
+        """
+
+        key = self._key(raw_code, node_mode)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+
+        if entry is None:
+            # Compiled outside the lock, so a large compile does not hold up hits.
+            try:
+                entry = compile_code(raw_code)
+            except SyntaxError as e:
+                entry = e
+
+            with self.lock:
+                self._put(key, entry)
+
+        if isinstance(entry, SyntaxError):
+            raise entry.with_traceback(None)
+
+        return entry
+
+    def _put(self, key: bytes, entry: CodeType | SyntaxError) -> None:
+        self.entries[key] = entry
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def _key(raw_code: str, node_mode: str) -> bytes:
+        return hashlib.sha256(f"{node_mode}\0{raw_code}".encode()).digest()
@@ -6,10 +6,14 @@ BROKER_TASK_SETTINGS = "broker:tasksettings"
 BROKER_TASK_CANCEL = "broker:taskcancel"
 RUNNER_INFO = "runner:info"
 RUNNER_TASK_OFFER = "runner:taskoffer"
+RUNNER_TASK_OFFERS = "runner:taskoffers"
 RUNNER_TASK_ACCEPTED = "runner:taskaccepted"
 RUNNER_TASK_REJECTED = "runner:taskrejected"
 RUNNER_TASK_DONE = "runner:taskdone"
 RUNNER_TASK_ERROR = "runner:taskerror"
+RUNNER_TASK_RESULT_BEGIN = "runner:taskresultbegin"
+RUNNER_TASK_RESULT_CHUNK = "runner:taskresultchunk"
+RUNNER_TASK_RESULT_END = "runner:taskresultend"
 
 # Runner
 TASK_TYPE_PYTHON = "python"
@@ -17,25 +21,60 @@ RUNNER_NAME = "Python Task Runner"
 DEFAULT_MAX_CONCURRENCY = 5  # tasks
 DEFAULT_MAX_PAYLOAD_SIZE = 1024 * 1024 * 1024  # 1 GiB
 DEFAULT_TASK_TIMEOUT = 60  # seconds
-OFFER_INTERVAL = 0.25  # 250ms
+OFFER_SAFETY_INTERVAL = 1  # seconds, offers are otherwise sent on events
 OFFER_VALIDITY = 5000  # ms
 OFFER_VALIDITY_MAX_JITTER = 500  # ms
 OFFER_VALIDITY_LATENCY_BUFFER = 0.1  # 100ms
+ENVELOPE_SCAN_INITIAL_SIZE = 64 * 1024  # 64 KiB
+WIRE_FORMAT_MSGPACK = "wireformat:msgpack"  # settings and results as MessagePack
+RESULT_STREAMING = "runner:taskresultchunks"  # results as begin, chunk and end messages
+RUNNER_CAPABILITIES = [RUNNER_TASK_OFFERS, RESULT_STREAMING]  # requested in runner:info
+DEFAULT_SEND_QUEUE_HIGH_WATER_MARK = 64 * 1024 * 1024  # 64 MiB of queued messages
+RECONNECT_BASE_DELAY = 0.5  # seconds, doubled per failed attempt
+RECONNECT_MAX_DELAY = 30  # seconds
+DEFAULT_RESULT_BUFFER_MEMORY_LIMIT = 64 * 1024 * 1024  # 64 MiB, spilled to disk beyond
+DEFAULT_DRAIN_TIMEOUT = 60  # seconds to wait for running tasks on SIGTERM
 
 # Executor
 EXECUTOR_USER_OUTPUT_KEY = "__n8n_internal_user_output__"
+DEFAULT_PER_ITEM_PARALLELISM = 1  # workers per task, 1 to disable
+PER_ITEM_PARALLEL_MIN_SIZE = 1024 * 1024  # 1 MiB of encoded items
+CODE_CACHE_SIZE = 128  # compiled code objects kept by the runner
+
+# Worker pool
+DEFAULT_WORKER_MAX_TASKS = 1  # tasks per worker before recycling
+DEFAULT_WORKER_MAX_RSS = 512  # MiB
+DEFAULT_WORKER_MAX_AGE = 3600  # seconds
+WORKER_STOP_GRACE_PERIOD = 1  # seconds
+DEFAULT_WORKER_START_METHOD = "spawn"  # or "forkserver"
+DEFAULT_WORKER_PRELOAD_MODULES = "json,datetime,re,math,collections"
+RESULT_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+RESULT_STREAM_FIRST_BATCH_SIZE = 64  # items, later batches are sized to a chunk
+RESULT_STREAM_BATCH_INTERVAL = 0.1  # seconds, for items that user code yields slowly
 
 # Broker
 DEFAULT_TASK_BROKER_URI = "http://127.0.0.1:5679"
 TASK_BROKER_WS_PATH = "/runners/_ws"
+TASK_BROKER_AUTH_PATH = "/runners/auth"
 
 # Env vars
 ENV_TASK_BROKER_URI = "N8N_RUNNERS_TASK_BROKER_URI"
 ENV_GRANT_TOKEN = "N8N_RUNNERS_GRANT_TOKEN"
+ENV_AUTH_TOKEN = "N8N_RUNNERS_AUTH_TOKEN"
 ENV_MAX_CONCURRENCY = "N8N_RUNNERS_MAX_CONCURRENCY"
 ENV_MAX_PAYLOAD_SIZE = "N8N_RUNNERS_MAX_PAYLOAD"
 ENV_TASK_TIMEOUT = "N8N_RUNNERS_TASK_TIMEOUT"
 ENV_HIDE_TASK_OFFER_LOGS = "N8N_RUNNERS_HIDE_TASK_OFFER_LOGS"
+ENV_WORKER_POOL_SIZE = "N8N_RUNNERS_WORKER_POOL_SIZE"
+ENV_WORKER_MAX_TASKS = "N8N_RUNNERS_WORKER_MAX_TASKS"
+ENV_WORKER_MAX_RSS = "N8N_RUNNERS_WORKER_MAX_RSS"
+ENV_WORKER_MAX_AGE = "N8N_RUNNERS_WORKER_MAX_AGE"
+ENV_WORKER_START_METHOD = "N8N_RUNNERS_WORKER_START_METHOD"
+ENV_WORKER_PRELOAD_MODULES = "N8N_RUNNERS_WORKER_PRELOAD_MODULES"
+ENV_PER_ITEM_PARALLELISM = "N8N_RUNNERS_PER_ITEM_PARALLELISM"
+ENV_SEND_QUEUE_HIGH_WATER_MARK = "N8N_RUNNERS_SEND_QUEUE_HIGH_WATER_MARK"
+ENV_RESULT_BUFFER_MEMORY_LIMIT = "N8N_RUNNERS_RESULT_BUFFER_MEMORY_LIMIT"
+ENV_DRAIN_TIMEOUT = "N8N_RUNNERS_DRAIN_TIMEOUT"
 
 # Logging
 LOG_FORMAT = "%(asctime)s.%(msecs)03d\t%(levelname)s\t%(message)s"
@@ -46,3 +85,4 @@ TASK_REJECTED_REASON_OFFER_EXPIRED = (
     "Offer expired - not accepted within validity window"
 )
 TASK_REJECTED_REASON_AT_CAPACITY = "No open task slots - runner already at capacity"
+TASK_REJECTED_REASON_DRAINING = "Runner is shutting down"
@@ -1,14 +1,18 @@
+from .task_cancelled_error import TaskCancelledError
 from .task_missing_error import TaskMissingError
 from .task_result_missing_error import TaskResultMissingError
+from .task_result_stream_interrupted_error import TaskResultStreamInterruptedError
 from .task_process_exit_error import TaskProcessExitError
 from .task_runtime_error import TaskRuntimeError
 from .task_timeout_error import TaskTimeoutError
 from .websocket_connection_error import WebsocketConnectionError
 
 __all__ = [
+    "TaskCancelledError",
     "TaskMissingError",
     "TaskProcessExitError",
     "TaskResultMissingError",
+    "TaskResultStreamInterruptedError",
     "TaskRuntimeError",
     "TaskTimeoutError",
     "WebsocketConnectionError",
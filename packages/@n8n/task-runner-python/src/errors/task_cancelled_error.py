@@ -0,0 +1,5 @@
+class TaskCancelledError(Exception):
+    """Raised when a task is cancelled while it waits for a worker to start."""
+
+    def __init__(self):
+        super().__init__("Task was cancelled before it started running")
@@ -0,0 +1,10 @@
+class TaskResultStreamInterruptedError(Exception):
+    """Raised when the connection a task's result was being streamed over is lost.
+
+    The broker discards a partly received stream, so the task fails instead.
+    """
+
+    def __init__(self):
+        super().__init__(
+            "Task result stream was interrupted by a lost broker connection"
+        )
@@ -0,0 +1,10 @@
+"""Imported last by the forkserver, after the executor and the configured preload modules.
+
+Freezing moves every object allocated so far into the permanent generation, so
+the garbage collector in forked workers never touches (and so never copies) the
+pages shared with the forkserver.
+"""
+
+import gc
+
+gc.freeze()
@@ -0,0 +1,143 @@
+import mmap
+import os
+import secrets
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, List, TypeVar
+
+T = TypeVar("T")
+
+# Where POSIX shared memory segments live on Linux, as plain files that can grow.
+SHARED_MEMORY_DIR = "/dev/shm"
+
+
+def write_items(payload: bytes | memoryview) -> SharedMemory:
+    """Place an encoded items payload in a shared memory segment for a worker to map.
+
+    Called in the runner, which unmaps the segment right away and only keeps the
+    handle around to unlink it if the worker never picks it up.
+    """
+
+    segment = SharedMemory(create=True, size=max(len(payload), 1), track=False)
+    segment.buf[: len(payload)] = payload
+    segment.close()
+
+    return segment
+
+
+class ItemsWriter:
+    """Place an encoded items payload in a shared memory segment piece by piece, as it arrives.
+
+    Called in the runner. On Linux the segment is created as a file under
+    /dev/shm and grows with each write, so the payload is never held in full in
+    the runner's memory. Elsewhere, pieces are collected and copied into a
+    segment on `close`.
+    """
+
+    def __init__(self):
+        self.name = f"n8n-items-{secrets.token_hex(8)}"
+        self.pieces: List[bytes] = []
+        self.fd = None
+
+        if os.path.isdir(SHARED_MEMORY_DIR):
+            self.fd = os.open(
+                os.path.join(SHARED_MEMORY_DIR, self.name),
+                os.O_CREAT | os.O_EXCL | os.O_WRONLY,
+                0o600,
+            )
+
+    def write(self, data: bytes | memoryview) -> None:
+        if self.fd is None:
+            self.pieces.append(bytes(data))
+            return
+
+        view = memoryview(data)
+        while view:
+            written = os.write(self.fd, view)
+            view = view[written:]
+
+    def close(self) -> SharedMemory:
+        """Finish the segment, returning its handle for the runner to unlink."""
+
+        if self.fd is None:
+            segment = write_items(b"".join(self.pieces))
+            self.pieces.clear()
+            return segment
+
+        os.close(self.fd)
+        self.fd = None
+
+        segment = SharedMemory(name=self.name, track=False)
+        segment.close()
+        return segment
+
+    def abort(self) -> None:
+        """Remove a partly written segment."""
+
+        self.pieces.clear()
+
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            os.unlink(os.path.join(SHARED_MEMORY_DIR, self.name))
+
+
+def payload_size(items: bytes | memoryview | SharedMemory) -> int:
+    """Size of an encoded items payload, whether still in the frame or already in a segment."""
+
+    if isinstance(items, SharedMemory):
+        return items.size
+    return len(items)
+
+
+def read_items(
+    name: str, size: int, decode: Callable[[memoryview], T], unlink: bool
+) -> T:
+    """Map an items segment in the worker and decode it in place.
+
+    On Linux the segment is mapped read-only, as the workers of a split task all
+    map the same one. With `unlink`, the segment is removed once decoded, as no
+    other worker will map it.
+    """
+
+    if not os.path.isdir(SHARED_MEMORY_DIR):
+        return _read_items_shared_memory(name, size, decode, unlink)
+
+    path = os.path.join(SHARED_MEMORY_DIR, name)
+    fd = os.open(path, os.O_RDONLY)
+
+    try:
+        if size == 0:
+            return decode(memoryview(b""))
+
+        with (
+            mmap.mmap(fd, size, access=mmap.ACCESS_READ) as mapping,
+            memoryview(mapping) as view,
+        ):
+            return decode(view)
+    finally:
+        os.close(fd)
+        if unlink:
+            os.unlink(path)
+
+
+def _read_items_shared_memory(
+    name: str, size: int, decode: Callable[[memoryview], T], unlink: bool
+) -> T:
+    segment = SharedMemory(name=name, track=False)
+
+    try:
+        with segment.buf[:size] as view:
+            return decode(view)
+    finally:
+        segment.close()
+        if unlink:
+            segment.unlink()
+
+
+def release_items(segment: SharedMemory) -> None:
+    """Remove an items segment in the runner, if the worker did not already do so."""
+
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
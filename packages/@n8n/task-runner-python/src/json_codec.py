@@ -0,0 +1,177 @@
+import json
+import math
+import uuid
+from enum import Enum
+from json.decoder import WHITESPACE
+from typing import Any, Callable, Dict, List, Tuple
+
+# orjson or msgspec, if installed, is used in place of the stdlib. Every backend emits
+# compact UTF-8 that decodes to the same values, but not always the same bytes: floats
+# with a negative exponent are written `1e-7` by orjson and `1e-07` by the stdlib.
+# NaN and infinities, which JSON lacks, are encoded as null by every backend, as
+# JavaScript does. Only the stdlib decodes `NaN` and `Infinity` literals, which the
+# broker never sends.
+#
+# Every backend encodes the same values, so that whether user code's result encodes
+# does not depend on what is installed: those the stdlib does, plus UUIDs and enums,
+# which orjson always encodes and the stdlib is taught to. Values orjson would encode
+# beyond that, e.g. datetimes and dataclasses, are passed to a `default` that rejects
+# them. msgspec encodes even more, e.g. sets and bytes, so it is only used to decode.
+
+NON_FINITE_FLOAT_ERROR = "Out of range float values are not JSON compliant"
+
+Backend = Tuple[Callable[[Any], bytes], Callable[[Any], Any]]  # dumps, loads
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    try:
+        return _stdlib_encode(obj)
+    except ValueError as e:
+        if NON_FINITE_FLOAT_ERROR not in str(e):
+            raise
+        return _stdlib_encode(_finite_floats(obj))
+
+
+def _stdlib_encode(obj: Any) -> bytes:
+    return json.dumps(
+        obj,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        allow_nan=False,
+        default=_stdlib_default,
+    ).encode()
+
+
+def _stdlib_default(obj: Any) -> Any:
+    """Encode the values orjson always encodes the way it does."""
+
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    return _reject(obj)
+
+
+def _reject(obj: Any) -> Any:
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _finite_floats(obj: Any) -> Any:
+    """Copy of `obj` with NaN and infinities replaced by None."""
+
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite_floats(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite_floats(value) for value in obj]
+    return obj
+
+
+def _stdlib_loads(data: Any) -> Any:
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+# Every installed backend, in order of preference.
+BACKENDS: Dict[str, Backend] = {}
+
+try:
+    import orjson
+
+    # Subclasses of builtins go to the stdlib, which encodes them as their base type.
+    ORJSON_OPTIONS = (
+        orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_SUBCLASS
+    )
+
+    def _orjson_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_reject, option=ORJSON_OPTIONS)
+
+    BACKENDS["orjson"] = (_orjson_dumps, orjson.loads)
+except ImportError:
+    pass
+
+try:
+    import msgspec
+
+    BACKENDS["msgspec"] = (_stdlib_dumps, msgspec.json.decode)
+except ImportError:
+    msgspec = None
+
+BACKENDS["json"] = (_stdlib_dumps, _stdlib_loads)
+
+JSON_BACKEND = next(iter(BACKENDS))
+
+_fast_dumps: Callable[[Any], bytes]
+loads: Callable[[Any], Any]  # accepts str, bytes, bytearray and memoryview
+
+_fast_dumps, loads = BACKENDS[JSON_BACKEND]
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode to compact JSON, falling back to the stdlib for values a fast backend rejects, e.g. ints over 64 bits."""
+
+    try:
+        return _fast_dumps(obj)
+    except Exception:
+        return _stdlib_dumps(obj)
+
+
+def loads_share(data: Any, index: int, parts: int) -> Tuple[List[Any], int]:
+    """Decode only the contiguous share `index` of `parts` of the elements of an array.
+
+    Returns the share and the index of its first element. With msgspec installed,
+    the other elements are skipped without being built. Otherwise each element is
+    parsed once to find where it ends and dropped straight away, so only the share
+    is ever held. Anything after the array is ignored.
+    """
+
+    if msgspec is not None:
+        try:
+            elements = msgspec.json.decode(data, type=List[msgspec.Raw])
+        except msgspec.DecodeError:
+            pass  # left to the stdlib, which stops at the end of the array
+        else:
+            start, stop = _share_bounds(len(elements), index, parts)
+            share = [loads(memoryview(element)) for element in elements[start:stop]]
+            return share, start
+
+    text = str(data, "utf-8")
+    spans = _stdlib_element_spans(text)
+    start, stop = _share_bounds(len(spans), index, parts)
+
+    return [loads(text[begin:end]) for begin, end in spans[start:stop]], start
+
+
+def _share_bounds(length: int, index: int, parts: int) -> Tuple[int, int]:
+    return length * index // parts, length * (index + 1) // parts
+
+
+def _stdlib_element_spans(text: str) -> List[Tuple[int, int]]:
+    """Where each element of the array at the start of `text` begins and ends."""
+
+    decoder = json.JSONDecoder()
+    spans = []
+    position = WHITESPACE.match(text).end()
+
+    if not text.startswith("[", position):
+        raise ValueError("Expecting an array")
+
+    position = WHITESPACE.match(text, position + 1).end()
+
+    if text.startswith("]", position):
+        return spans
+
+    while True:
+        _, end = decoder.raw_decode(text, position)
+        spans.append((position, end))
+        position = WHITESPACE.match(text, end).end()
+
+        if text.startswith("]", position):
+            return spans
+
+        if not text.startswith(",", position):
+            raise ValueError(f"Expecting ',' delimiter at char {position}")
+
+        position = WHITESPACE.match(text, position + 1).end()
@@ -1,7 +1,9 @@
 import asyncio
 import logging
 import os
+import signal
 import sys
+from typing import cast
 
 os.environ["WEBSOCKETS_MAX_LOG_SIZE"] = "256"
 
@@ -15,9 +17,30 @@ from .constants import (
     DEFAULT_TASK_BROKER_URI,
     DEFAULT_MAX_PAYLOAD_SIZE,
     ENV_TASK_TIMEOUT,
+    ENV_WORKER_POOL_SIZE,
+    ENV_WORKER_MAX_TASKS,
+    ENV_WORKER_MAX_RSS,
+    ENV_WORKER_MAX_AGE,
+    DEFAULT_WORKER_MAX_TASKS,
+    DEFAULT_WORKER_MAX_RSS,
+    DEFAULT_WORKER_MAX_AGE,
+    ENV_WORKER_START_METHOD,
+    ENV_WORKER_PRELOAD_MODULES,
+    DEFAULT_WORKER_START_METHOD,
+    DEFAULT_WORKER_PRELOAD_MODULES,
+    ENV_PER_ITEM_PARALLELISM,
+    DEFAULT_PER_ITEM_PARALLELISM,
+    ENV_SEND_QUEUE_HIGH_WATER_MARK,
+    DEFAULT_SEND_QUEUE_HIGH_WATER_MARK,
+    ENV_AUTH_TOKEN,
+    ENV_RESULT_BUFFER_MEMORY_LIMIT,
+    DEFAULT_RESULT_BUFFER_MEMORY_LIMIT,
+    ENV_DRAIN_TIMEOUT,
+    DEFAULT_DRAIN_TIMEOUT,
 )
 from .logs import setup_logging
 from .task_runner import TaskRunner, TaskRunnerOpts
+from .worker_pool import StartMethod
 
 
 async def main():
@@ -32,16 +55,54 @@ async def main():
         logger.error(f"{ENV_GRANT_TOKEN} environment variable is required")
         sys.exit(1)
 
+    worker_start_method = os.getenv(
+        ENV_WORKER_START_METHOD, DEFAULT_WORKER_START_METHOD
+    )
+
+    if worker_start_method not in ("spawn", "forkserver"):
+        logger.error(f"{ENV_WORKER_START_METHOD} must be 'spawn' or 'forkserver'")
+        sys.exit(1)
+
+    max_concurrency = int(os.getenv(ENV_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY))
+
     opts = TaskRunnerOpts(
         grant_token,
         os.getenv(ENV_TASK_BROKER_URI, DEFAULT_TASK_BROKER_URI),
-        int(os.getenv(ENV_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY)),
+        max_concurrency,
         int(os.getenv(ENV_MAX_PAYLOAD_SIZE, DEFAULT_MAX_PAYLOAD_SIZE)),
         int(os.getenv(ENV_TASK_TIMEOUT, DEFAULT_TASK_TIMEOUT)),
+        int(os.getenv(ENV_WORKER_POOL_SIZE, max_concurrency)),
+        int(os.getenv(ENV_WORKER_MAX_TASKS, DEFAULT_WORKER_MAX_TASKS)),
+        int(os.getenv(ENV_WORKER_MAX_RSS, DEFAULT_WORKER_MAX_RSS)),
+        int(os.getenv(ENV_WORKER_MAX_AGE, DEFAULT_WORKER_MAX_AGE)),
+        cast(StartMethod, worker_start_method),
+        [
+            module.strip()
+            for module in os.getenv(
+                ENV_WORKER_PRELOAD_MODULES, DEFAULT_WORKER_PRELOAD_MODULES
+            ).split(",")
+            if module.strip()
+        ],
+        max(1, int(os.getenv(ENV_PER_ITEM_PARALLELISM, DEFAULT_PER_ITEM_PARALLELISM))),
+        int(
+            os.getenv(
+                ENV_SEND_QUEUE_HIGH_WATER_MARK, DEFAULT_SEND_QUEUE_HIGH_WATER_MARK
+            )
+        ),
+        os.getenv(ENV_AUTH_TOKEN, ""),
+        int(
+            os.getenv(
+                ENV_RESULT_BUFFER_MEMORY_LIMIT, DEFAULT_RESULT_BUFFER_MEMORY_LIMIT
+            )
+        ),
+        int(os.getenv(ENV_DRAIN_TIMEOUT, DEFAULT_DRAIN_TIMEOUT)),
     )
 
     task_runner = TaskRunner(opts)
 
+    # SIGTERM, e.g. from a rolling deploy, lets running tasks finish before exiting.
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task_runner.drain)
+
     try:
         await task_runner.start()
     except (KeyboardInterrupt, asyncio.CancelledError):
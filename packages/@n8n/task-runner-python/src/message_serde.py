@@ -1,14 +1,19 @@
+import codecs
 import json
-from dataclasses import asdict
-from typing import cast
+import re
+from dataclasses import fields
+from json.decoder import scanstring
+from typing import Any, Callable, Dict, Optional, Tuple, cast, get_args
 
-from .message_types.broker import NodeMode, TaskSettings
+from . import json_codec, msgpack_codec
+from .message_types.broker import NodeMode, TaskSettings, WireFormat
 from .constants import (
     BROKER_INFO_REQUEST,
     BROKER_RUNNER_REGISTERED,
     BROKER_TASK_CANCEL,
     BROKER_TASK_OFFER_ACCEPT,
     BROKER_TASK_SETTINGS,
+    ENVELOPE_SCAN_INITIAL_SIZE,
 )
 from .message_types import (
     BrokerMessage,
@@ -18,6 +23,8 @@ from .message_types import (
     BrokerTaskOfferAccept,
     BrokerTaskSettings,
     BrokerTaskCancel,
+    RunnerTaskDone,
+    RunnerTaskResultChunk,
 )
 
 
@@ -33,7 +40,9 @@ def _get_node_mode(node_mode_str: str) -> NodeMode:
     return cast(NodeMode, NODE_MODE_MAP[node_mode_str])
 
 
-def _parse_task_settings(d: dict) -> BrokerTaskSettings:
+def _parse_task_settings(
+    d: dict, wire_format: WireFormat = "json"
+) -> BrokerTaskSettings:
     try:
         task_id = d["taskId"]
         settings_dict = d["settings"]
@@ -44,6 +53,103 @@ def _parse_task_settings(d: dict) -> BrokerTaskSettings:
     except KeyError as e:
         raise ValueError(f"Missing field in task settings message: {e}")
 
+    return BrokerTaskSettings(
+        task_id=task_id,
+        settings=TaskSettings(
+            code=code,
+            node_mode=node_mode,
+            continue_on_fail=continue_on_fail,
+            items=(json_codec if wire_format == "json" else msgpack_codec).dumps(items),
+            wire_format=wire_format,
+        ),
+    )
+
+
+JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+JSON_DECODER = json.JSONDecoder()
+TASK_SETTINGS_TYPE_MARKER = f'"{BROKER_TASK_SETTINGS}"'.encode()
+
+EnvelopeScan = Tuple[Dict[str, Any], Dict[str, Any], int]
+
+
+def _parse_task_settings_envelope(data: bytes) -> Optional[BrokerTaskSettings]:
+    """Parse a task settings frame without parsing its items.
+
+    The broker sends `taskId` before `settings`, and `items` last within `settings`,
+    so scanning a prefix of the frame is enough to know every envelope field. The
+    items are forwarded as the raw bytes from their start to the end of the frame,
+    for the worker to parse in its own process. Returns None for any other message
+    or layout, leaving it to the full parse.
+    """
+
+    # The scan needs `type` first, so other messages are told apart without decoding.
+    if TASK_SETTINGS_TYPE_MARKER not in data[:ENVELOPE_SCAN_INITIAL_SIZE]:
+        return None
+
+    scan_size = ENVELOPE_SCAN_INITIAL_SIZE
+
+    while True:
+        text = codecs.getincrementaldecoder("utf-8")().decode(data[:scan_size])
+
+        try:
+            scanned = _scan_task_settings_envelope(text)
+            break
+        except (ValueError, IndexError):
+            if scan_size >= len(data):
+                return None
+            scan_size *= 2
+
+    if scanned is None:
+        return None
+
+    envelope, settings_dict, items_index = scanned
+    items_offset = len(text[:items_index].encode())
+
+    return _task_settings_from_envelope(
+        envelope, settings_dict, memoryview(data)[items_offset:], "json"
+    )
+
+
+def _parse_msgpack_task_settings_envelope(
+    data: bytes,
+) -> Optional[BrokerTaskSettings]:
+    """Parse a MessagePack task settings frame without parsing its items."""
+
+    try:
+        scanned = msgpack_codec.scan_task_settings_envelope(
+            data, ENVELOPE_SCAN_INITIAL_SIZE
+        )
+    except Exception:
+        return None
+
+    if scanned is None:
+        return None
+
+    envelope, settings_dict, items_offset = scanned
+
+    if envelope.get("type") != BROKER_TASK_SETTINGS:
+        return None
+
+    return _task_settings_from_envelope(
+        envelope, settings_dict, memoryview(data)[items_offset:], "msgpack"
+    )
+
+
+def _task_settings_from_envelope(
+    envelope: Dict[str, Any],
+    settings_dict: Dict[str, Any],
+    items: memoryview,
+    wire_format: WireFormat,
+) -> Optional[BrokerTaskSettings]:
+    try:
+        task_id = envelope["taskId"]
+        code = settings_dict["code"]
+        node_mode = _get_node_mode(settings_dict["nodeMode"])
+        continue_on_fail = settings_dict["continueOnFail"]
+    except (KeyError, ValueError):
+        # Left to the full parse, which reports what is wrong with the message.
+        return None
+
     return BrokerTaskSettings(
         task_id=task_id,
         settings=TaskSettings(
@@ -51,10 +157,88 @@ def _parse_task_settings(d: dict) -> BrokerTaskSettings:
             node_mode=node_mode,
             continue_on_fail=continue_on_fail,
             items=items,
+            wire_format=wire_format,
         ),
     )
 
 
+def _scan_task_settings_envelope(text: str) -> Optional[EnvelopeScan]:
+    envelope: Dict[str, Any] = {}
+
+    for key, value in _scan_members(text, 0, lazy_key="settings"):
+        if key != "settings":
+            envelope[key] = value
+            if envelope.get("type") != BROKER_TASK_SETTINGS:
+                return None
+            continue
+
+        settings_dict: Dict[str, Any] = {}
+
+        for settings_key, settings_value in _scan_members(text, value, "items"):
+            if settings_key == "items":
+                return envelope, settings_dict, settings_value
+            settings_dict[settings_key] = settings_value
+
+        return None
+
+    return None
+
+
+def _scan_members(text: str, index: int, lazy_key: str):
+    """Yield (key, value) for each member of the JSON object starting at `index`.
+
+    For `lazy_key`, the index where its value starts is yielded instead of the
+    decoded value, and scanning stops there.
+    """
+
+    index = JSON_WHITESPACE.match(text, index).end()
+    if text[index] != "{":
+        raise ValueError("Expected object")
+    index += 1
+
+    while True:
+        index = JSON_WHITESPACE.match(text, index).end()
+        if text[index] == "}":
+            return
+        if text[index] != '"':
+            raise ValueError("Expected object key")
+
+        key, index = scanstring(text, index + 1)
+        index = JSON_WHITESPACE.match(text, index).end()
+        if text[index] != ":":
+            raise ValueError("Expected ':' after object key")
+        index = JSON_WHITESPACE.match(text, index + 1).end()
+
+        if key == lazy_key:
+            yield key, index
+            return
+
+        value, index = JSON_DECODER.raw_decode(text, index)
+        yield key, value
+
+        index = JSON_WHITESPACE.match(text, index).end()
+        if text[index] == ",":
+            index += 1
+        elif text[index] != "}":
+            raise ValueError("Expected ',' or '}' after object member")
+
+
+def _snake_to_camel_case(snake_case_str: str) -> str:
+    parts = snake_case_str.split("_")
+    return parts[0] + "".join(word.capitalize() for word in parts[1:])
+
+
+def _make_function(source: str, namespace: Dict[str, Any]) -> Callable:
+    """Compile the source of a function named `function`, as `dataclasses` does for `__init__`."""
+
+    exec(source, namespace)
+    return namespace["function"]
+
+
+def _parse_runner_registered(d: dict) -> BrokerRunnerRegistered:
+    return BrokerRunnerRegistered(capabilities=d.get("capabilities", []))
+
+
 def _parse_task_offer_accept(d: dict) -> BrokerTaskOfferAccept:
     try:
         task_id = d["taskId"]
@@ -75,21 +259,51 @@ def _parse_task_cancel(d: dict) -> BrokerTaskCancel:
     return BrokerTaskCancel(task_id=task_id, reason=reason)
 
 
-MESSAGE_TYPE_MAP = {
+def _make_encoder(cls: type) -> Callable[[RunnerMessage], Dict[str, Any]]:
+    """Generate an encoder from `cls` to a message dict, with its camelCase keys resolved once.
+
+    Field values are referenced, not copied, as they are only read to encode them.
+    """
+
+    items = [f'"{_snake_to_camel_case(f.name)}": m.{f.name}' for f in fields(cls)]
+
+    return _make_function(f"def function(m):\n    return {{{', '.join(items)}}}", {})
+
+
+MESSAGE_TYPE_MAP: Dict[str, Callable[[dict], BrokerMessage]] = {
     BROKER_INFO_REQUEST: lambda _: BrokerInfoRequest(),
-    BROKER_RUNNER_REGISTERED: lambda _: BrokerRunnerRegistered(),
+    BROKER_RUNNER_REGISTERED: _parse_runner_registered,
     BROKER_TASK_OFFER_ACCEPT: _parse_task_offer_accept,
     BROKER_TASK_SETTINGS: _parse_task_settings,
     BROKER_TASK_CANCEL: _parse_task_cancel,
 }
 
+MSGPACK_FIXMAP_1 = b"\x81"  # map headers, for the members that follow
+MSGPACK_FIXMAP_3 = b"\x83"
+MSGPACK_FIXMAP_4 = b"\x84"
+
+MESSAGE_ENCODERS = {cls: _make_encoder(cls) for cls in get_args(RunnerMessage)}
+
 
 class MessageSerde:
     """Responsible for deserializing incoming messages and serializing outgoing messages."""
 
     @staticmethod
-    def deserialize_broker_message(data: str) -> BrokerMessage:
-        message_dict = json.loads(data)
+    def is_binary_frame(data: bytes | bytearray) -> bool:
+        """JSON messages are objects, so any other frame is MessagePack."""
+
+        return data[:1] != b"{"
+
+    @staticmethod
+    def deserialize_broker_message(data: bytes) -> BrokerMessage:
+        if MessageSerde.is_binary_frame(data):
+            return MessageSerde._deserialize_msgpack(data)
+
+        task_settings = _parse_task_settings_envelope(data)
+        if task_settings is not None:
+            return task_settings
+
+        message_dict = json_codec.loads(data)
         message_type = message_dict.get("type")
 
         if message_type not in MESSAGE_TYPE_MAP:
@@ -98,14 +312,117 @@ class MessageSerde:
         return MESSAGE_TYPE_MAP[message_type](message_dict)
 
     @staticmethod
-    def serialize_runner_message(message: RunnerMessage) -> str:
-        data = asdict(message)
-        camel_case_data = {
-            MessageSerde._snake_to_camel_case(k): v for k, v in data.items()
-        }
-        return json.dumps(camel_case_data)
+    def deserialize_task_settings_head(data: bytes) -> Optional[BrokerTaskSettings]:
+        """Parse a task settings message from the first bytes of its frame.
+
+        The items of the returned settings are only those within `data`, for the
+        caller to complete with the rest of the frame. Returns None if `data` is
+        too short to hold the envelope, or belongs to any other message.
+        """
+
+        if not MessageSerde.is_binary_frame(data):
+            return _parse_task_settings_envelope(data)
+
+        if not msgpack_codec.MSGPACK_AVAILABLE:
+            return None
+
+        return _parse_msgpack_task_settings_envelope(data)
+
+    @staticmethod
+    def _deserialize_msgpack(data: bytes) -> BrokerMessage:
+        if not msgpack_codec.MSGPACK_AVAILABLE:
+            raise ValueError(
+                "Received a MessagePack frame but msgpack is not installed"
+            )
+
+        task_settings = _parse_msgpack_task_settings_envelope(data)
+        if task_settings is not None:
+            return task_settings
+
+        message_dict = msgpack_codec.loads(data)
+        if not isinstance(message_dict, dict):
+            raise ValueError("Received a MessagePack frame that is not a map")
+
+        message_type = message_dict.get("type")
+
+        if message_type == BROKER_TASK_SETTINGS:
+            return _parse_task_settings(message_dict, "msgpack")
+
+        if message_type not in MESSAGE_TYPE_MAP:
+            raise ValueError(f"Unknown message type: {message_type}")
+
+        return MESSAGE_TYPE_MAP[message_type](message_dict)
+
+    @staticmethod
+    def serialize_runner_message(message: RunnerMessage) -> bytes:
+        if isinstance(message, RunnerTaskDone):
+            return MessageSerde._serialize_task_done(message)
+
+        if isinstance(message, RunnerTaskResultChunk):
+            return MessageSerde._serialize_task_result_chunk(message)
+
+        return json_codec.dumps(MESSAGE_ENCODERS[type(message)](message))
 
     @staticmethod
-    def _snake_to_camel_case(snake_case_str: str) -> str:
-        parts = snake_case_str.split("_")
-        return parts[0] + "".join(word.capitalize() for word in parts[1:])
+    def _serialize_task_done(message: RunnerTaskDone) -> bytes:
+        """Splice the result, already encoded by the worker, into the envelope."""
+
+        if message.wire_format == "msgpack":
+            return b"".join(
+                [
+                    MSGPACK_FIXMAP_3,
+                    msgpack_codec.dumps("taskId"),
+                    msgpack_codec.dumps(message.task_id),
+                    msgpack_codec.dumps("data"),
+                    MSGPACK_FIXMAP_1,
+                    msgpack_codec.dumps("result"),
+                    message.result,
+                    msgpack_codec.dumps("type"),
+                    msgpack_codec.dumps(message.type),
+                ]
+            )
+
+        return b"".join(
+            [
+                b'{"taskId":',
+                json_codec.dumps(message.task_id),
+                b',"data":{"result":',
+                message.result,
+                b'},"type":',
+                json_codec.dumps(message.type),
+                b"}",
+            ]
+        )
+
+    @staticmethod
+    def _serialize_task_result_chunk(message: RunnerTaskResultChunk) -> bytes:
+        """Splice the chunk's items, already encoded by the worker, into the envelope."""
+
+        if message.wire_format == "msgpack":
+            return b"".join(
+                [
+                    MSGPACK_FIXMAP_4,
+                    msgpack_codec.dumps("taskId"),
+                    msgpack_codec.dumps(message.task_id),
+                    msgpack_codec.dumps("sequence"),
+                    msgpack_codec.dumps(message.sequence),
+                    msgpack_codec.dumps("items"),
+                    message.items,
+                    msgpack_codec.dumps("type"),
+                    msgpack_codec.dumps(message.type),
+                ]
+            )
+
+        return b"".join(
+            [
+                b'{"taskId":',
+                json_codec.dumps(message.task_id),
+                b',"sequence":',
+                json_codec.dumps(message.sequence),
+                b',"items":',
+                message.items,
+                b',"type":',
+                json_codec.dumps(message.type),
+                b"}",
+            ]
+        )
@@ -10,10 +10,14 @@ from .runner import (
     RunnerMessage,
     RunnerInfo,
     RunnerTaskOffer,
+    RunnerTaskOffers,
     RunnerTaskAccepted,
     RunnerTaskRejected,
     RunnerTaskDone,
     RunnerTaskError,
+    RunnerTaskResultBegin,
+    RunnerTaskResultChunk,
+    RunnerTaskResultEnd,
 )
 
 __all__ = [
@@ -26,8 +30,12 @@ __all__ = [
     "RunnerMessage",
     "RunnerInfo",
     "RunnerTaskOffer",
+    "RunnerTaskOffers",
     "RunnerTaskAccepted",
     "RunnerTaskRejected",
     "RunnerTaskDone",
     "RunnerTaskError",
+    "RunnerTaskResultBegin",
+    "RunnerTaskResultChunk",
+    "RunnerTaskResultEnd",
 ]
@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from multiprocessing.shared_memory import SharedMemory
 from typing import Literal, Union, List, Dict, Any
 
 from ..constants import (
@@ -10,17 +11,18 @@ from ..constants import (
 )
 
 
-@dataclass
+@dataclass(slots=True)
 class BrokerInfoRequest:
     type: Literal["broker:inforequest"] = BROKER_INFO_REQUEST
 
 
-@dataclass
+@dataclass(slots=True)
 class BrokerRunnerRegistered:
+    capabilities: List[str] = field(default_factory=list)  # agreed from runner:info
     type: Literal["broker:runnerregistered"] = BROKER_RUNNER_REGISTERED
 
 
-@dataclass
+@dataclass(slots=True)
 class BrokerTaskOfferAccept:
     task_id: str
     offer_id: str
@@ -29,25 +31,32 @@ class BrokerTaskOfferAccept:
 
 NodeMode = Literal["all_items", "per_item"]
 
+WireFormat = Literal["json", "msgpack"]
+
 Items = List[Dict[str, Any]]  # INodeExecutionData[]
 
+# `Items` encoded in the task's wire format, possibly followed by the rest of the frame
+# they were sent in, and held in a shared memory segment if the frame was streamed in
+RawItems = Union[bytes, memoryview, SharedMemory]
+
 
-@dataclass
+@dataclass(slots=True)
 class TaskSettings:
     code: str
     node_mode: NodeMode
     continue_on_fail: bool
-    items: Items
+    items: RawItems
+    wire_format: WireFormat = "json"  # of the settings frame, and of the result
 
 
-@dataclass
+@dataclass(slots=True)
 class BrokerTaskSettings:
     task_id: str
     settings: TaskSettings
     type: Literal["broker:tasksettings"] = BROKER_TASK_SETTINGS
 
 
-@dataclass
+@dataclass(slots=True)
 class BrokerTaskCancel:
     task_id: str
     reason: str
@@ -1,24 +1,30 @@
 from dataclasses import dataclass
 from typing import List, Literal, Union, Any, Dict
 
+from .broker import WireFormat
 from ..constants import (
     RUNNER_INFO,
     RUNNER_TASK_ACCEPTED,
     RUNNER_TASK_DONE,
     RUNNER_TASK_ERROR,
     RUNNER_TASK_OFFER,
+    RUNNER_TASK_OFFERS,
     RUNNER_TASK_REJECTED,
+    RUNNER_TASK_RESULT_BEGIN,
+    RUNNER_TASK_RESULT_CHUNK,
+    RUNNER_TASK_RESULT_END,
 )
 
 
-@dataclass
+@dataclass(slots=True)
 class RunnerInfo:
     name: str
     types: List[str]
+    capabilities: List[str]
     type: Literal["runner:info"] = RUNNER_INFO
 
 
-@dataclass
+@dataclass(slots=True)
 class RunnerTaskOffer:
     offer_id: str
     task_type: str
@@ -26,38 +32,72 @@ class RunnerTaskOffer:
     type: Literal["runner:taskoffer"] = RUNNER_TASK_OFFER
 
 
-@dataclass
+@dataclass(slots=True)
+class RunnerTaskOffers:
+    task_type: str
+    offers: List[Dict[str, Any]]  # {"offerId", "validFor"} per offer
+    type: Literal["runner:taskoffers"] = RUNNER_TASK_OFFERS
+
+
+@dataclass(slots=True)
 class RunnerTaskAccepted:
     task_id: str
     type: Literal["runner:taskaccepted"] = RUNNER_TASK_ACCEPTED
 
 
-@dataclass
+@dataclass(slots=True)
 class RunnerTaskRejected:
     task_id: str
     reason: str
     type: Literal["runner:taskrejected"] = RUNNER_TASK_REJECTED
 
 
-@dataclass
+@dataclass(slots=True)
 class RunnerTaskDone:
     task_id: str
-    data: Dict[str, Any]
+    result: bytes | bytearray  # encoded in `wire_format`, sent as `data.result`
+    wire_format: WireFormat = "json"
     type: Literal["runner:taskdone"] = RUNNER_TASK_DONE
 
 
-@dataclass
+@dataclass(slots=True)
 class RunnerTaskError:
     task_id: str
     error: Dict[str, Any]
     type: Literal["runner:taskerror"] = RUNNER_TASK_ERROR
 
 
+@dataclass(slots=True)
+class RunnerTaskResultBegin:
+    task_id: str
+    type: Literal["runner:taskresultbegin"] = RUNNER_TASK_RESULT_BEGIN
+
+
+@dataclass(slots=True)
+class RunnerTaskResultChunk:
+    task_id: str
+    sequence: int  # from 0, per task
+    items: bytes | bytearray  # an array of result items encoded in `wire_format`
+    wire_format: WireFormat = "json"
+    type: Literal["runner:taskresultchunk"] = RUNNER_TASK_RESULT_CHUNK
+
+
+@dataclass(slots=True)
+class RunnerTaskResultEnd:
+    task_id: str
+    chunk_count: int
+    type: Literal["runner:taskresultend"] = RUNNER_TASK_RESULT_END
+
+
 RunnerMessage = Union[
     RunnerInfo,
     RunnerTaskOffer,
+    RunnerTaskOffers,
     RunnerTaskAccepted,
     RunnerTaskRejected,
     RunnerTaskDone,
     RunnerTaskError,
+    RunnerTaskResultBegin,
+    RunnerTaskResultChunk,
+    RunnerTaskResultEnd,
 ]
@@ -0,0 +1,144 @@
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Awaitable, Callable, Optional, Tuple
+
+OnFailure = Callable[[bytes], Awaitable[None]]
+
+
+class MessagePriority(IntEnum):
+    CONTROL = 0  # offers, accepts, rejections, errors
+    BULK = 1  # task results
+
+
+@dataclass
+class MessageWriterMetrics:
+    messages_sent: int = 0
+    bytes_sent: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    queued_bytes: int = 0
+    max_queued_bytes: int = 0
+    total_send_latency: float = 0  # seconds, from enqueue to sent
+    max_send_latency: float = 0  # seconds
+
+    @property
+    def avg_send_latency(self) -> float:
+        return self.total_send_latency / max(self.messages_sent, 1)
+
+
+class MessageWriter:
+    """Sends outgoing messages from a single task, so that handlers never wait on the socket.
+
+    Control messages overtake queued results. Once `high_water_mark` bytes are
+    queued, enqueuing a result waits until the queue drains below half of it,
+    which pushes back on the tasks producing results. Control messages are
+    small and never wait. A message put with `on_failure` is handed to it if it
+    cannot be sent, or if it is discarded before being sent.
+    """
+
+    def __init__(self, send: Callable[[bytes], Awaitable[None]], high_water_mark: int):
+        self.send = send
+        self.high_water_mark = high_water_mark
+        self.queue: asyncio.PriorityQueue[
+            Tuple[int, int, float, bytes, Optional[OnFailure]]
+        ] = asyncio.PriorityQueue()
+        self.sequence = itertools.count()  # keeps FIFO order within a priority
+        self.below_low_water_mark = asyncio.Event()
+        self.below_low_water_mark.set()
+        self.metrics = MessageWriterMetrics()
+        self.writer_task: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(__name__)
+
+    def start(self) -> None:
+        self.writer_task = asyncio.create_task(self._write_loop())
+
+    async def put(
+        self,
+        data: bytes,
+        priority: MessagePriority,
+        on_failure: Optional[OnFailure] = None,
+    ) -> None:
+        if priority == MessagePriority.BULK:
+            # Cleared at the high water mark and set again only below half of it.
+            while not self.below_low_water_mark.is_set():
+                await self.below_low_water_mark.wait()
+
+        self.queue.put_nowait(
+            (priority, next(self.sequence), time.monotonic(), data, on_failure)
+        )
+
+        self.metrics.queue_depth = self.queue.qsize()
+        self.metrics.queued_bytes += len(data)
+        self.metrics.max_queue_depth = max(
+            self.metrics.max_queue_depth, self.metrics.queue_depth
+        )
+        self.metrics.max_queued_bytes = max(
+            self.metrics.max_queued_bytes, self.metrics.queued_bytes
+        )
+
+        if self.metrics.queued_bytes >= self.high_water_mark:
+            self.below_low_water_mark.clear()
+
+    async def discard_pending(self) -> None:
+        """Drop queued messages, e.g. after the connection they were meant for closed."""
+
+        while not self.queue.empty():
+            _, _, _, data, on_failure = self.queue.get_nowait()
+            self._mark_done(data)
+
+            if on_failure is not None:
+                await on_failure(data)
+
+    async def stop(self) -> None:
+        """Send what is already queued, then stop the writer task."""
+
+        if self.writer_task is None:
+            return
+
+        await self.queue.join()
+        self.writer_task.cancel()
+
+        metrics = self.metrics
+        self.logger.debug(
+            f"Sent {metrics.messages_sent} messages ({metrics.bytes_sent} bytes), "
+            f"max queue depth: {metrics.max_queue_depth} ({metrics.max_queued_bytes} bytes), "
+            f"send latency avg: {metrics.avg_send_latency * 1000:.1f}ms, "
+            f"max: {metrics.max_send_latency * 1000:.1f}ms"
+        )
+
+    async def _write_loop(self) -> None:
+        while True:
+            _, _, enqueued_at, data, on_failure = await self.queue.get()
+
+            try:
+                await self.send(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if on_failure is None:
+                    self.logger.error(f"Error sending message: {e}")
+                else:
+                    await on_failure(data)
+            else:
+                latency = time.monotonic() - enqueued_at
+                self.metrics.messages_sent += 1
+                self.metrics.bytes_sent += len(data)
+                self.metrics.total_send_latency += latency
+                self.metrics.max_send_latency = max(
+                    self.metrics.max_send_latency, latency
+                )
+            finally:
+                self._mark_done(data)
+
+    def _mark_done(self, data: bytes) -> None:
+        self.metrics.queue_depth = self.queue.qsize()
+        self.metrics.queued_bytes -= len(data)
+
+        if self.metrics.queued_bytes < self.high_water_mark // 2:
+            self.below_low_water_mark.set()
+
+        self.queue.task_done()
@@ -0,0 +1,99 @@
+import io
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# MessagePack is offered to the broker only if msgpack is installed.
+MSGPACK_AVAILABLE = msgpack is not None
+
+EnvelopeScan = Tuple[Dict[str, Any], Dict[str, Any], int]
+
+
+def dumps(obj: Any) -> bytes:
+    return msgpack.packb(obj)
+
+
+def loads(data: Any) -> Any:
+    return msgpack.unpackb(data)
+
+
+def loads_share(data: Any, index: int, parts: int) -> Tuple[List[Any], int]:
+    """Decode only the contiguous share `index` of `parts` of the elements of an array.
+
+    Returns the share and the index of its first element. The elements before it
+    are skipped without being built, and those after it are not read at all.
+    """
+
+    unpacker = msgpack.Unpacker(max_buffer_size=len(data))
+    unpacker.feed(data)
+
+    length = unpacker.read_array_header()
+    start = length * index // parts
+    stop = length * (index + 1) // parts
+
+    for _ in range(start):
+        unpacker.skip()
+
+    return [unpacker.unpack() for _ in range(stop - start)], start
+
+
+def join_arrays(arrays: List[bytes | bytearray]) -> bytes:
+    """Concatenate MessagePack-encoded arrays without decoding their elements."""
+
+    count = 0
+    elements = []
+
+    for array in arrays:
+        unpacker = msgpack.Unpacker(io.BytesIO(array))
+        count += unpacker.read_array_header()
+        elements.append(memoryview(array)[unpacker.tell() :])
+
+    packer = msgpack.Packer()
+    return b"".join([packer.pack_array_header(count), *elements])
+
+
+def scan_task_settings_envelope(data: bytes, read_size: int) -> Optional[EnvelopeScan]:
+    """Decode the envelope of a MessagePack task settings frame, up to its items.
+
+    Returns the envelope, the settings without `items`, and the offset at which the
+    items start. As MessagePack has no closing delimiters, the items run to the end
+    of the frame only if they are the last member of `settings` and `settings` the
+    last member of the envelope; returns None for any other layout.
+    """
+
+    unpacker = msgpack.Unpacker(
+        io.BytesIO(data), read_size=read_size, max_buffer_size=max(len(data), read_size)
+    )
+    envelope: Dict[str, Any] = {}
+
+    member_count = unpacker.read_map_header()
+
+    for index in range(member_count):
+        key = unpacker.unpack()
+
+        if key != "settings":
+            envelope[key] = unpacker.unpack()
+            continue
+
+        if index != member_count - 1:
+            return None
+
+        settings_dict: Dict[str, Any] = {}
+        settings_count = unpacker.read_map_header()
+
+        for settings_index in range(settings_count):
+            settings_key = unpacker.unpack()
+
+            if settings_key == "items":
+                if settings_index != settings_count - 1:
+                    return None
+                return envelope, settings_dict, unpacker.tell()
+
+            settings_dict[settings_key] = unpacker.unpack()
+
+        return None
+
+    return None
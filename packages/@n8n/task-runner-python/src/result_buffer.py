@@ -0,0 +1,64 @@
+import asyncio
+import os
+import tempfile
+from typing import AsyncIterator, List
+
+
+class ResultBuffer:
+    """Serialized task results waiting to be delivered once the broker connection is back.
+
+    Up to `memory_limit` bytes of results are kept in memory, further results are
+    spilled to temporary files. Results are handed back in the order they were added.
+    """
+
+    def __init__(self, memory_limit: int):
+        self.memory_limit = memory_limit
+        self.memory_size = 0
+        self.entries: List[bytes | str] = []  # result, or path of its spill file
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    async def add(self, data: bytes) -> None:
+        if self.memory_size + len(data) <= self.memory_limit:
+            self.entries.append(data)
+            self.memory_size += len(data)
+            return
+
+        self.entries.append(await asyncio.to_thread(self._spill, data))
+
+    async def drain(self) -> AsyncIterator[bytes]:
+        """Yield and remove all buffered results. Results added meanwhile are kept for later."""
+
+        entries, self.entries, self.memory_size = self.entries, [], 0
+
+        for entry in entries:
+            if isinstance(entry, str):
+                yield await asyncio.to_thread(self._unspill, entry)
+            else:
+                yield entry
+
+    def clear(self) -> None:
+        for entry in self.entries:
+            if isinstance(entry, str):
+                os.unlink(entry)
+
+        self.entries.clear()
+        self.memory_size = 0
+
+    @staticmethod
+    def _spill(data: bytes) -> str:
+        fd, path = tempfile.mkstemp(prefix="n8n-runner-result-")
+
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+
+        return path
+
+    @staticmethod
+    def _unspill(path: str) -> bytes:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.unlink(path)
@@ -0,0 +1,122 @@
+import json
+import os
+import struct
+from enum import IntEnum
+from typing import Any, Dict, List
+
+from .constants import RESULT_CHUNK_SIZE
+
+FRAME_HEADER = struct.Struct("!BI")  # frame type, payload length
+
+
+class FrameType(IntEnum):
+    CHUNK = 1
+    END = 2
+    READY = 3
+
+
+def write_result(fd: int, payload: bytes, summary: Dict[str, Any]) -> None:
+    """Write a result to the runner as a sequence of chunk frames closed by an end frame.
+
+    Called in the worker. The payload is the JSON-encoded result, the summary (an
+    error, if any, and worker stats) travels in the end frame. Writes block while
+    the pipe is full, so the runner must drain frames concurrently rather than
+    waiting for the worker to exit.
+    """
+
+    view = memoryview(payload)
+
+    for offset in range(0, len(view), RESULT_CHUNK_SIZE):
+        _write_frame(fd, FrameType.CHUNK, view[offset : offset + RESULT_CHUNK_SIZE])
+
+    _write_frame(fd, FrameType.END, json.dumps(summary).encode())
+
+
+def write_chunk(fd: int, chunk: bytes) -> None:
+    """Write part of a streamed result to the runner as a single chunk frame.
+
+    Called in the worker before `write_result`, which then closes the result.
+    The runner forwards each such frame to the broker as it is, so it must hold
+    a whole encoded array of items.
+    """
+
+    _write_frame(fd, FrameType.CHUNK, chunk)
+
+
+def write_ready(fd: int) -> None:
+    """Tell the runner that the worker has finished importing and waits for tasks.
+
+    Called in the worker once, before it receives its first task.
+    """
+
+    _write_frame(fd, FrameType.READY, b"")
+
+
+def wait_ready(fd: int) -> bool:
+    """Block until the worker's ready frame arrives, returning False if it exited first.
+
+    Called in the runner on a blocking pipe, before any result is read from it.
+    """
+
+    header = bytearray()
+
+    while len(header) < FRAME_HEADER.size:
+        data = os.read(fd, FRAME_HEADER.size - len(header))
+
+        if not data:
+            return False
+
+        header += data
+
+    frame_type, length = FRAME_HEADER.unpack(header)
+    return frame_type == FrameType.READY and length == 0
+
+
+def _write_frame(fd: int, frame_type: FrameType, payload) -> None:
+    _write_all(fd, FRAME_HEADER.pack(frame_type, len(payload)))
+    _write_all(fd, payload)
+
+
+def _write_all(fd: int, data) -> None:
+    view = memoryview(data)
+
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+class ResultReader:
+    """Reassembles result frames in the runner as they arrive from the worker.
+
+    With `stream`, chunk frames are collected one by one in `chunks` for the
+    runner to take, instead of being joined into `payload`.
+    """
+
+    def __init__(self, stream: bool = False):
+        self.stream = stream
+        self.buffer = bytearray()
+        self.payload = bytearray()
+        self.chunks: List[bytearray] = []
+        self.summary: Dict[str, Any] = {}
+        self.is_complete = False
+
+    def feed(self, data: bytes) -> None:
+        self.buffer += data
+
+        while len(self.buffer) >= FRAME_HEADER.size:
+            frame_type, length = FRAME_HEADER.unpack_from(self.buffer)
+            frame_end = FRAME_HEADER.size + length
+
+            if len(self.buffer) < frame_end:
+                return
+
+            if frame_type == FrameType.END:
+                self.summary = json.loads(self.buffer[FRAME_HEADER.size : frame_end])
+                self.is_complete = True
+            elif self.stream:
+                self.chunks.append(self.buffer[FRAME_HEADER.size : frame_end])
+            else:
+                with memoryview(self.buffer) as view:
+                    self.payload += view[FRAME_HEADER.size : frame_end]
+
+            del self.buffer[:frame_end]
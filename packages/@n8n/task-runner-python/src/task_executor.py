@@ -1,8 +1,27 @@
-from queue import Empty
-import multiprocessing
+import asyncio
+import json
+import marshal
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+import resource
+import time
 import traceback
 import textwrap
+from functools import partial
+from types import CodeType, GeneratorType
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 
+from . import json_codec, msgpack_codec
 from .errors import (
     TaskResultMissingError,
     TaskRuntimeError,
@@ -10,124 +29,477 @@ from .errors import (
     TaskProcessExitError,
 )
 
-from .message_types.broker import NodeMode, Items
-from .constants import EXECUTOR_USER_OUTPUT_KEY
+from .message_types.broker import Items, NodeMode, TaskSettings, WireFormat
+from .code_cache import CodeCache
+from .constants import (
+    CODE_CACHE_SIZE,
+    EXECUTOR_USER_OUTPUT_KEY,
+    RESULT_CHUNK_SIZE,
+    RESULT_STREAM_BATCH_INTERVAL,
+    RESULT_STREAM_FIRST_BATCH_SIZE,
+    WORKER_STOP_GRACE_PERIOD,
+)
+from .items_channel import payload_size, read_items, release_items, write_items
+from .result_channel import ResultReader, write_chunk, write_ready, write_result
+from .worker_pool import Worker
+
+OnResultChunk = Callable[[bytearray], Awaitable[None]]
+
+# Closing braces of the settings and the envelope, after forwarded items.
+FRAME_TAIL_BYTES = b" \t\n\r}"
 
-from multiprocessing.context import SpawnProcess
 
-MULTIPROCESSING_CONTEXT = multiprocessing.get_context("spawn")
+@dataclass
+class WorkerTask:
+    """A task as sent by the runner to a worker over its task pipe.
+
+    Per-item tasks may be split across several workers, each decoding and running
+    only the contiguous share `chunk_index` of `chunk_count` of the items. With
+    `stream_result`, the result is written as one chunk frame per batch of items.
+    """
+
+    code: bytes  # marshalled code object, compiled by the runner
+    node_mode: NodeMode
+    items_segment: str
+    items_size: int
+    chunk_index: int = 0
+    chunk_count: int = 1
+    wire_format: WireFormat = "json"  # of the items and the result
+    stream_result: bool = False
 
 
 class TaskExecutor:
     """Responsible for executing Python code tasks in isolated subprocesses."""
 
+    # Used in the runner, which compiles each task's code once for all its workers.
+    code_cache = CodeCache(CODE_CACHE_SIZE)
+
     @staticmethod
-    def create_process(code: str, node_mode: NodeMode, items: Items):
-        """Create a subprocess for executing a Python code task and a queue for communication."""
+    def run_worker(task_conn: Connection, result_conn: Connection):
+        """Serve tasks sent by the runner until the runner closes the pipe."""
 
-        fn = (
-            TaskExecutor._all_items
-            if node_mode == "all_items"
-            else TaskExecutor._per_item
-        )
+        result_fd = result_conn.fileno()
+        write_ready(result_fd)
 
-        queue = MULTIPROCESSING_CONTEXT.Queue()
-        process = MULTIPROCESSING_CONTEXT.Process(target=fn, args=(code, items, queue))
+        while True:
+            try:
+                task: WorkerTask = task_conn.recv()
+            except EOFError:
+                return
 
-        return process, queue
+            TaskExecutor._run_task(task, result_fd)
 
     @staticmethod
-    def execute_process(
-        process: SpawnProcess,
-        queue: multiprocessing.Queue,
+    def _run_task(task: WorkerTask, result_fd: int):
+        """Run a task and write its result to the runner."""
+
+        # Malformed items fail the task rather than kill the worker.
+        try:
+            # Chunked tasks share one segment, which the runner removes once all are done.
+            items, first_index = read_items(
+                task.items_segment,
+                task.items_size,
+                partial(TaskExecutor._decode_chunk, task=task),
+                unlink=task.chunk_count == 1,
+            )
+
+            code = marshal.loads(task.code)
+        except Exception as e:
+            returned = TaskExecutor._format_error(e)
+        else:
+            if task.node_mode == "all_items":
+                returned = TaskExecutor._all_items(code, items)
+            else:
+                returned = TaskExecutor._per_item(code, items, first_index)
+
+            del items
+
+        payload = b""
+        error = returned.get("error")
+
+        # User code that yields runs while its result is encoded.
+        if error is None:
+            try:
+                if task.stream_result:
+                    for batch in TaskExecutor._encode_result_batches(
+                        returned["result"] or [], task.wire_format
+                    ):
+                        write_chunk(result_fd, batch)
+                else:
+                    payload = TaskExecutor._encode_result(
+                        TaskExecutor._result_list(returned["result"] or []),
+                        task.wire_format,
+                    )
+            except Exception as e:
+                error = TaskExecutor._format_error(e)["error"]
+
+        summary: Dict[str, Any] = {
+            "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+        if error is not None:
+            summary["error"] = error
+
+        write_result(result_fd, payload, summary)
+
+    @staticmethod
+    async def execute_task(
+        workers: List[Worker],
+        task_settings: TaskSettings,
+        compiled_code: bytes,
         task_timeout: int,
-        continue_on_fail: bool,
-    ):
-        """Execute a subprocess for a Python code task."""
+        on_result_chunk: Optional[OnResultChunk] = None,
+    ) -> Optional[bytes | bytearray]:
+        """Execute a Python code task on warm worker processes, awaiting its encoded result.
+
+        `compiled_code` is the task's code as returned by `compile_task`, which the
+        workers load instead of compiling it again.
+        Items are handed to the workers through shared memory, after which they are
+        dropped from `task_settings` so the runner does not keep its own copy alive.
+        With several workers, a per-item task is split into one contiguous chunk per
+        worker and the chunk results are joined back in order.
+
+        With `on_result_chunk`, the result is instead handed to it in order, one
+        encoded array of items at a time as the workers produce it, and None is
+        returned. A continue-on-fail result is still returned whole, replacing any
+        chunks already handed over.
+        """
+
+        items_segment = None
 
         try:
-            process.start()
-            process.join(timeout=task_timeout)
+            items_size = payload_size(task_settings.items)
+            if isinstance(task_settings.items, SharedMemory):
+                items_segment = task_settings.items
+            else:
+                items_segment = write_items(task_settings.items)
+            task_settings.items = b""
+
+            for chunk_index, worker in enumerate(workers):
+                worker.task_conn.send(
+                    WorkerTask(
+                        code=compiled_code,
+                        node_mode=task_settings.node_mode,
+                        items_segment=items_segment.name,
+                        items_size=items_size,
+                        chunk_index=chunk_index,
+                        chunk_count=len(workers),
+                        wire_format=task_settings.wire_format,
+                        stream_result=on_result_chunk is not None,
+                    )
+                )
+                worker.tasks_run += 1
+
+            if on_result_chunk is None:
+                read_results = asyncio.gather(
+                    *(worker.read_result() for worker in workers)
+                )
+            else:
+                read_results = TaskExecutor._stream_results(workers, on_result_chunk)
 
-            if process.is_alive():
-                TaskExecutor.stop_process(process)
+            try:
+                results = await asyncio.wait_for(read_results, task_timeout)
+            except TimeoutError:
+                await asyncio.gather(*(worker.stop() for worker in workers))
                 raise TaskTimeoutError(task_timeout)
 
-            if process.exitcode != 0:
-                assert process.exitcode is not None
-                raise TaskProcessExitError(process.exitcode)
+            for worker, returned in zip(workers, results):
+                if returned is None:
+                    await asyncio.to_thread(
+                        worker.process.join, WORKER_STOP_GRACE_PERIOD
+                    )
+                    if worker.process.exitcode not in (None, 0):
+                        raise TaskProcessExitError(worker.process.exitcode)
+                    raise TaskResultMissingError()
 
-            try:
-                returned = queue.get_nowait()
-            except Empty:
-                raise TaskResultMissingError()
+                worker.peak_rss = returned.summary.get("rss", 0)
+
+                if "error" in returned.summary:
+                    raise TaskRuntimeError(returned.summary["error"])
+
+            if on_result_chunk is not None:
+                return None
+
+            if len(results) == 1:
+                return results[0].payload
 
-            if "error" in returned:
-                raise TaskRuntimeError(returned["error"])
+            payloads = [returned.payload for returned in results]
 
-            return returned["result"] or []
+            if task_settings.wire_format == "msgpack":
+                return msgpack_codec.join_arrays(payloads)
+
+            return TaskExecutor._join_json_arrays(payloads)
 
         except Exception as e:
-            if continue_on_fail:
-                return [{"json": {"error": str(e)}}]
+            if task_settings.continue_on_fail:
+                return TaskExecutor.continue_on_fail_result(
+                    str(e), task_settings.wire_format
+                )
             raise
 
+        finally:
+            if items_segment is not None:
+                release_items(items_segment)
+
+    @staticmethod
+    async def _stream_results(
+        workers: List[Worker], on_result_chunk: OnResultChunk
+    ) -> List[Optional[ResultReader]]:
+        """Read the workers' results one after the other, so that chunks stay in item order.
+
+        Later workers wait on their pipe meanwhile. Once a worker fails, the rest of
+        the result is read but no longer handed over, as the task will fail anyway.
+        """
+
+        results = []
+
+        for worker in workers:
+            returned = await worker.read_result(on_result_chunk)
+            results.append(returned)
+
+            if returned is None or "error" in returned.summary:
+                on_result_chunk = TaskExecutor._discard_result_chunk
+
+        return results
+
+    @staticmethod
+    async def _discard_result_chunk(chunk: bytearray) -> None:
+        pass
+
+    @staticmethod
+    async def stop_workers(workers: List[Worker]):
+        """Stop the workers running a task, gracefully else force-killing."""
+
+        await asyncio.gather(*(worker.stop() for worker in workers))
+
+    @staticmethod
+    def check_syntax(raw_code: str, node_mode: NodeMode) -> Optional[Dict[str, Any]]:
+        """Compile user code without running it, returning the formatted error, if any.
+
+        Besides syntax errors, this covers code the compiler gives up on, e.g. with
+        a `MemoryError` or `RecursionError` for very deeply nested expressions.
+        """
+
+        try:
+            TaskExecutor._compile(raw_code, node_mode)
+        except SyntaxError as e:
+            # The location in the user code is the whole useful stack.
+            stack = "".join(traceback.format_exception_only(e))
+            return {"message": str(e), "stack": stack}
+        except Exception as e:
+            stack = "".join(traceback.format_exception_only(e))
+            return {"message": stack.strip(), "stack": stack}
+
+        return None
+
+    @staticmethod
+    def compile_task(
+        raw_code: str, node_mode: NodeMode
+    ) -> Tuple[Optional[bytes], Optional[Dict[str, Any]]]:
+        """Compile user code for the workers, returning it marshalled, else the formatted error."""
+
+        syntax_error = TaskExecutor.check_syntax(raw_code, node_mode)
+
+        if syntax_error is not None:
+            return None, syntax_error
+
+        # A cache hit, as checking the syntax has just compiled it.
+        return marshal.dumps(TaskExecutor._compile(raw_code, node_mode)), None
+
     @staticmethod
-    def stop_process(process: SpawnProcess | None):
-        """Stop a running subprocess, gracefully else force-killing."""
+    def continue_on_fail_result(
+        message: str, wire_format: WireFormat = "json"
+    ) -> bytes:
+        """The encoded result reported in place of an error when the node continues on fail."""
 
-        if process is None or not process.is_alive():
-            return
+        return TaskExecutor._encode_result([{"json": {"error": message}}], wire_format)
 
-        process.terminate()
-        process.join(timeout=1)  # 1s grace period
+    @staticmethod
+    def _encode_result(result: Items, wire_format: WireFormat) -> bytes:
+        if wire_format == "msgpack":
+            return msgpack_codec.dumps(result)
+
+        return json_codec.dumps(result)
+
+    @staticmethod
+    def _encode_result_batches(result: Any, wire_format: WireFormat) -> Iterator[bytes]:
+        """Encode a result as consecutive arrays of items of about a chunk each.
+
+        Each batch is sized from the encoded size of the previous one. Items that
+        user code yields slowly are sent in smaller batches, cut at the first item
+        yielded once `RESULT_STREAM_BATCH_INTERVAL` has passed since the last one.
+        """
+
+        if not isinstance(result, (list, GeneratorType)):
+            # Chunks carry arrays of items, so a single returned item goes as a list of one.
+            result = [result]
+
+        batch_size = RESULT_STREAM_FIRST_BATCH_SIZE
+        batch: Items = []
+        cut_at = time.monotonic() + RESULT_STREAM_BATCH_INTERVAL
 
-        if process.is_alive():
-            process.kill()
+        for item in result:
+            batch.append(item)
+
+            if len(batch) < batch_size and time.monotonic() < cut_at:
+                continue
+
+            encoded = TaskExecutor._encode_result(batch, wire_format)
+            yield encoded
+
+            batch_size = max(1, len(batch) * RESULT_CHUNK_SIZE // len(encoded))
+            batch = []
+            cut_at = time.monotonic() + RESULT_STREAM_BATCH_INTERVAL
+
+        if batch:
+            yield TaskExecutor._encode_result(batch, wire_format)
 
     @staticmethod
-    def _all_items(raw_code: str, items: Items, queue: multiprocessing.Queue):
-        """Execute a Python code task in all-items mode."""
+    def _result_list(result: Any) -> Any:
+        """Run user code that yields to completion, for its result to be encoded in one piece."""
+
+        if isinstance(result, GeneratorType):
+            return list(result)
+
+        return result
+
+    @staticmethod
+    def _join_json_arrays(arrays: List[bytearray]) -> bytes:
+        """Concatenate JSON-encoded arrays without decoding them."""
+
+        elements = [array[1:-1] for array in arrays if len(array) > 2]
+        return b"[" + b",".join(elements) + b"]"
+
+    @staticmethod
+    def _all_items(code: CodeType, items: Items) -> Dict[str, Any]:
+        """Execute a Python code task in all-items mode.
+
+        If the code yields its output items, the result is the generator, which
+        runs the rest of the code as it is consumed.
+        """
 
         try:
-            code = TaskExecutor._wrap_code(raw_code)
             globals = {"__builtins__": __builtins__, "_items": items}
             exec(code, globals)
-            queue.put({"result": globals[EXECUTOR_USER_OUTPUT_KEY]})
+            return {"result": globals[EXECUTOR_USER_OUTPUT_KEY]}
 
         except Exception as e:
-            TaskExecutor._put_error(queue, e)
+            return TaskExecutor._format_error(e)
 
     @staticmethod
-    def _per_item(raw_code: str, items: Items, queue: multiprocessing.Queue):
-        """Execute a Python code task in per-item mode."""
+    def _per_item(code: CodeType, items: Items, first_index: int = 0) -> Dict[str, Any]:
+        """Execute a Python code task in per-item mode, `first_index` being the index of the first item.
+
+        The result is a generator, which runs the code for each item as it is
+        consumed. Code that yields may output several items per input item.
+        """
 
         try:
-            wrapped_code = TaskExecutor._wrap_code(raw_code)
-            compiled_code = compile(wrapped_code, "<per_item_task_execution>", "exec")
+            # Define the user function once, then rebind `_item` in its globals per call.
+            globals = {"__builtins__": __builtins__, "_item": None}
+            exec(code, globals)
+
+            return {
+                "result": TaskExecutor._per_item_outputs(globals, items, first_index)
+            }
+
+        except Exception as e:
+            return TaskExecutor._format_error(e)
+
+    @staticmethod
+    def _per_item_outputs(
+        globals: Dict[str, Any], items: Items, first_index: int
+    ) -> Iterator[Dict[str, Any]]:
+        user_function = globals["_user_function"]
+
+        for index, item in enumerate(items, first_index):
+            globals["_item"] = item
+            user_output = user_function()
 
-            result = []
-            for index, item in enumerate(items):
-                globals = {"__builtins__": __builtins__, "_item": item}
-                exec(compiled_code, globals)
-                user_output = globals[EXECUTOR_USER_OUTPUT_KEY]
+            if not isinstance(user_output, GeneratorType):
+                user_output = (user_output,)
 
-                if user_output is None:
+            for output in user_output:
+                if output is None:
                     continue
 
-                user_output["pairedItem"] = {"item": index}
-                result.append(user_output)
+                output["pairedItem"] = {"item": index}
+                yield output
 
-            queue.put({"result": result})
+    @staticmethod
+    def _items_decoder(wire_format: WireFormat) -> Callable[[memoryview], Items]:
+        if wire_format == "msgpack":
+            return msgpack_codec.loads
 
-        except Exception as e:
-            TaskExecutor._put_error(queue, e)
+        return TaskExecutor._decode_items
+
+    @staticmethod
+    def _decode_chunk(raw_items: memoryview, task: WorkerTask) -> Tuple[Items, int]:
+        """Decode the task's share of the items, returning it with the index of its first item."""
+
+        if task.chunk_count == 1:
+            return TaskExecutor._items_decoder(task.wire_format)(raw_items), 0
+
+        if task.wire_format == "msgpack":
+            return msgpack_codec.loads_share(
+                raw_items, task.chunk_index, task.chunk_count
+            )
+
+        return json_codec.loads_share(
+            raw_items[: TaskExecutor._items_end(raw_items)],
+            task.chunk_index,
+            task.chunk_count,
+        )
+
+    @staticmethod
+    def _decode_items(raw_items: memoryview) -> Items:
+        """Parse items forwarded unparsed by the runner, ignoring any trailing frame bytes."""
+
+        try:
+            return json_codec.loads(raw_items[: TaskExecutor._items_end(raw_items)])
+        except ValueError:
+            # Frame members after `settings`, so the items end further in.
+            items, _ = json.JSONDecoder().raw_decode(str(raw_items, "utf-8"))
+            return items
+
+    @staticmethod
+    def _items_end(raw_items: memoryview) -> int:
+        """Where forwarded JSON items end, short of any closing braces of the frame."""
+
+        end = len(raw_items)
+        while end and raw_items[end - 1] in FRAME_TAIL_BYTES:
+            end -= 1
+
+        return end
+
+    @staticmethod
+    def _compile(raw_code: str, node_mode: NodeMode) -> CodeType:
+        compile_code = (
+            TaskExecutor._compile_all_items
+            if node_mode == "all_items"
+            else TaskExecutor._compile_per_item
+        )
+        return TaskExecutor.code_cache.get(raw_code, node_mode, compile_code)
+
+    @staticmethod
+    def _compile_all_items(raw_code: str) -> CodeType:
+        return compile(TaskExecutor._wrap_code(raw_code), "<string>", "exec")
+
+    @staticmethod
+    def _compile_per_item(raw_code: str) -> CodeType:
+        wrapped_function = TaskExecutor._wrap_function(raw_code)
+        return compile(wrapped_function, "<per_item_task_execution>", "exec")
 
     @staticmethod
     def _wrap_code(raw_code: str) -> str:
+        wrapped_function = TaskExecutor._wrap_function(raw_code)
+        return f"{wrapped_function}\n\n{EXECUTOR_USER_OUTPUT_KEY} = _user_function()"
+
+    @staticmethod
+    def _wrap_function(raw_code: str) -> str:
         indented_code = textwrap.indent(raw_code, "    ")
-        return f"def _user_function():\n{indented_code}\n\n{EXECUTOR_USER_OUTPUT_KEY} = _user_function()"
+        return f"def _user_function():\n{indented_code}"
 
     @staticmethod
-    def _put_error(queue: multiprocessing.Queue, e: Exception):
-        queue.put({"error": {"message": str(e), "stack": traceback.format_exc()}})
+    def _format_error(e: Exception) -> Dict[str, Any]:
+        return {"error": {"message": str(e), "stack": traceback.format_exc()}}
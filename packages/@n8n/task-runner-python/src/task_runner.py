@@ -1,27 +1,47 @@
 import asyncio
 from dataclasses import dataclass
+from functools import partial
+import heapq
+import json
 import logging
+from multiprocessing.shared_memory import SharedMemory
 import time
-from typing import Dict, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any, Set, Tuple
 from urllib.parse import urlparse
+import urllib.request
 import websockets
 import random
 
 
-from .errors import WebsocketConnectionError, TaskMissingError
+from .errors import (
+    WebsocketConnectionError,
+    TaskCancelledError,
+    TaskMissingError,
+    TaskResultStreamInterruptedError,
+)
 from .message_types.broker import TaskSettings
 from .nanoid import nanoid
 
 from .constants import (
+    RUNNER_CAPABILITIES,
     RUNNER_NAME,
+    RUNNER_TASK_OFFERS,
     TASK_REJECTED_REASON_AT_CAPACITY,
+    TASK_REJECTED_REASON_DRAINING,
     TASK_REJECTED_REASON_OFFER_EXPIRED,
     TASK_TYPE_PYTHON,
-    OFFER_INTERVAL,
+    ENVELOPE_SCAN_INITIAL_SIZE,
+    OFFER_SAFETY_INTERVAL,
     OFFER_VALIDITY,
     OFFER_VALIDITY_MAX_JITTER,
     OFFER_VALIDITY_LATENCY_BUFFER,
+    PER_ITEM_PARALLEL_MIN_SIZE,
+    RESULT_STREAMING,
+    TASK_BROKER_AUTH_PATH,
     TASK_BROKER_WS_PATH,
+    WIRE_FORMAT_MSGPACK,
+    RECONNECT_BASE_DELAY,
+    RECONNECT_MAX_DELAY,
 )
 from .message_types import (
     BrokerMessage,
@@ -33,14 +53,23 @@ from .message_types import (
     BrokerTaskCancel,
     RunnerInfo,
     RunnerTaskOffer,
+    RunnerTaskOffers,
     RunnerTaskAccepted,
     RunnerTaskRejected,
     RunnerTaskDone,
     RunnerTaskError,
+    RunnerTaskResultBegin,
+    RunnerTaskResultChunk,
+    RunnerTaskResultEnd,
 )
+from . import msgpack_codec
 from .message_serde import MessageSerde
-from .task_state import TaskState, TaskStatus
+from .items_channel import ItemsWriter, payload_size, release_items
+from .message_writer import MessagePriority, MessageWriter
+from .result_buffer import ResultBuffer
+from .task_state import ResultStream, TaskState, TaskStatus
 from .task_executor import TaskExecutor
+from .worker_pool import StartMethod, Worker, WorkerPool, WorkerPoolOpts
 
 
 class TaskOffer:
@@ -60,6 +89,17 @@ class TaskRunnerOpts:
     max_concurrency: int
     max_payload_size: int
     task_timeout: int
+    worker_pool_size: int
+    worker_max_tasks: int
+    worker_max_rss: int
+    worker_max_age: int
+    worker_start_method: StartMethod
+    worker_preload_modules: List[str]
+    per_item_parallelism: int
+    send_queue_high_water_mark: int
+    auth_token: str  # to fetch grant tokens when reconnecting, empty to not reconnect
+    result_buffer_memory_limit: int
+    drain_timeout: int
 
 
 class TaskRunner:
@@ -74,14 +114,41 @@ class TaskRunner:
         self.opts = opts
 
         self.websocket_connection: Optional[Any] = None
+        self.is_registered = False
+        self.registrations = 0  # with the broker, one per connection
         self.can_send_offers = False
+        self.broker_capabilities: Set[str] = set()
 
         self.open_offers: Dict[str, TaskOffer] = {}
+        self.offer_deadlines: List[Tuple[float, str]] = []  # min-heap of valid_until
+        self.offers_needed = asyncio.Event()
         self.running_tasks: Dict[str, TaskState] = {}
+        self.task_finished = asyncio.Event()
+
+        self.is_draining = False
+        self.start_task: Optional[asyncio.Task] = None
+        self.drain_task: Optional[asyncio.Task] = None
 
         self.offers_coroutine: Optional[asyncio.Task] = None
+        self.message_handlers: Set[asyncio.Task] = set()
+        self.task_message_tails: Dict[str, asyncio.Task] = {}  # last handler per task
         self.serde = MessageSerde()
+        self.message_writer = MessageWriter(
+            self._write_message, opts.send_queue_high_water_mark
+        )
+        self.result_buffer = ResultBuffer(opts.result_buffer_memory_limit)
         self.executor = TaskExecutor()
+        self.worker_pool = WorkerPool(
+            TaskExecutor.run_worker,
+            WorkerPoolOpts(
+                size=opts.worker_pool_size,
+                max_tasks=opts.worker_max_tasks,
+                max_rss=opts.worker_max_rss,
+                max_age=opts.worker_max_age,
+                start_method=opts.worker_start_method,
+                preload_modules=opts.worker_preload_modules,
+            ),
+        )
         self.logger = logging.getLogger(__name__)
 
         self.task_broker_uri = opts.task_broker_uri
@@ -91,6 +158,27 @@ class TaskRunner:
         )
 
     async def start(self) -> None:
+        self.start_task = asyncio.current_task()
+        self.worker_pool.start()
+        self.message_writer.start()
+
+        await self._connect()
+
+        while True:
+            # Grant tokens are single-use, so without an auth token there is no reconnecting.
+            try:
+                await self._listen_for_messages()
+            except websockets.ConnectionClosedError:
+                if not self.opts.auth_token:
+                    raise WebsocketConnectionError(self.task_broker_uri)
+            else:
+                if not self.opts.auth_token:
+                    return
+
+            await self._handle_disconnect()
+            await self._reconnect()
+
+    async def _connect(self) -> None:
         headers = {"Authorization": f"Bearer {self.grant_token}"}
 
         try:
@@ -99,41 +187,264 @@ class TaskRunner:
                 additional_headers=headers,
                 max_size=self.opts.max_payload_size,
             )
+        except Exception:
+            raise WebsocketConnectionError(self.task_broker_uri)
 
-            self.logger.info("Connected to broker")
+        self.logger.info("Connected to broker")
 
-            await self._listen_for_messages()
+    async def _reconnect(self) -> None:
+        """Reconnect with jittered exponential backoff, fetching a fresh grant token per attempt."""
 
-        except Exception:
-            raise WebsocketConnectionError(self.task_broker_uri)
+        attempt = 0
+
+        while True:
+            delay = random.uniform(
+                0, min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2**attempt)
+            )
+            self.logger.info(f"Reconnecting to broker in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+
+            try:
+                self.grant_token = await self._fetch_grant_token()
+                await self._connect()
+                return
+            except Exception as e:
+                self.logger.warning(f"Failed to reconnect to broker: {e}")
+                attempt += 1
+
+    async def _fetch_grant_token(self) -> str:
+        def fetch() -> str:
+            request = urllib.request.Request(
+                f"{self.task_broker_uri}{TASK_BROKER_AUTH_PATH}",
+                data=json.dumps({"token": self.opts.auth_token}).encode(),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            with urllib.request.urlopen(
+                request, timeout=RECONNECT_MAX_DELAY
+            ) as response:
+                return json.load(response)["data"]["token"]
+
+        return await asyncio.to_thread(fetch)
+
+    async def _handle_disconnect(self) -> None:
+        """Forget state tied to the lost connection, keeping running tasks going.
+
+        Offers and tasks still waiting for settings die with the connection. Results
+        of running tasks, and results that were queued but not yet sent, are buffered
+        and delivered once the runner is registered again.
+        """
+
+        self.logger.warning("Lost connection to broker")
+
+        self.is_registered = False
+        self.can_send_offers = False
+        if self.offers_coroutine:
+            self.offers_coroutine.cancel()
+
+        self.open_offers.clear()
+        self.offer_deadlines.clear()
+
+        for task_id, task_state in list(self.running_tasks.items()):
+            if task_state.status == TaskStatus.WAITING_FOR_SETTINGS:
+                self._finish_task(task_id, task_state.workers)
+
+        await self.message_writer.discard_pending()
+
+    def drain(self) -> None:
+        """Stop taking tasks, and stop the runner once running tasks finish.
+
+        Tasks still running after the drain timeout are stopped with the runner.
+        """
+
+        if self.is_draining:
+            return
+
+        self.is_draining = True
+        self.drain_task = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        self.logger.info(
+            f"Draining runner, waiting for {len(self.running_tasks)} running tasks..."
+        )
+
+        # Accepts of offers sent before draining are rejected, so the broker
+        # hands those tasks to another runner.
+        self.can_send_offers = False
+        if self.offers_coroutine:
+            self.offers_coroutine.cancel()
+
+        try:
+            await asyncio.wait_for(
+                self._wait_for_running_tasks(), self.opts.drain_timeout
+            )
+        except TimeoutError:
+            self.logger.warning(
+                f"Drain timed out with {len(self.running_tasks)} tasks still running"
+            )
+
+        if self.start_task:
+            self.start_task.cancel()
+
+    async def _wait_for_running_tasks(self) -> None:
+        while self.running_tasks:
+            self.task_finished.clear()
+            await self.task_finished.wait()
 
     async def stop(self) -> None:
+        if self.drain_task:
+            self.drain_task.cancel()
+
         if self.offers_coroutine:
             self.offers_coroutine.cancel()
 
+        await self.worker_pool.shutdown()
+
         if self.websocket_connection:
+            await self.message_writer.stop()
             await self.websocket_connection.close()
             self.logger.info("Disconnected from broker")
 
+        if self.result_buffer:
+            self.logger.warning(
+                f"Discarding {len(self.result_buffer)} undelivered task results"
+            )
+            self.result_buffer.clear()
+
+        code_cache = self.executor.code_cache
+        self.logger.debug(
+            f"Code cache hits: {code_cache.hits}, misses: {code_cache.misses}"
+        )
+
     # ========== Messages ==========
 
     async def _listen_for_messages(self) -> None:
         if self.websocket_connection is None:
             raise WebsocketConnectionError(self.task_broker_uri)
 
-        async for raw_message in self.websocket_connection:
+        while True:
             try:
-                message = self.serde.deserialize_broker_message(raw_message)
-                await self._handle_message(message)
+                message = await self._receive_message()
+            except websockets.ConnectionClosedOK:
+                break
+            except websockets.ConnectionClosedError:
+                raise
             except Exception as e:
                 self.logger.error(f"Error handling message: {e}")
+                continue
+
+            self._dispatch_message(message)
+
+    async def _receive_message(self) -> BrokerMessage:
+        """Receive a message frame by frame, as the broker may fragment large messages.
+
+        Once the first fragments hold the envelope of task settings, the rest of
+        the items is written to shared memory fragment by fragment, so the runner
+        never holds a large frame in full. Items of a task that is no longer
+        waiting for its settings are dropped as they arrive.
+        """
+
+        if self.websocket_connection is None:
+            raise WebsocketConnectionError(self.task_broker_uri)
+
+        fragments = aiter(self.websocket_connection.recv_streaming(decode=False))
+        received: List[bytes] = []
+        received_size = 0
+        scan_size = ENVELOPE_SCAN_INITIAL_SIZE
+
+        try:
+            async for fragment in fragments:
+                received.append(fragment)
+                received_size += len(fragment)
+
+                if received_size < scan_size:
+                    continue
+
+                head = received[0] if len(received) == 1 else b"".join(received)
+                received = [head]
+                scan_size = received_size * 2
+
+                message = self.serde.deserialize_task_settings_head(head)
+                if message is not None:
+                    await self._stream_items(message, fragments)
+                    return message
+        except Exception:
+            # The next message can only be received once this one is read to its end.
+            async for _ in fragments:
+                pass
+            raise
+
+        data = received[0] if len(received) == 1 else b"".join(received)
+        return self.serde.deserialize_broker_message(data)
+
+    async def _stream_items(
+        self, message: BrokerTaskSettings, fragments: AsyncIterator[bytes]
+    ) -> None:
+        task_state = self.running_tasks.get(message.task_id)
+
+        if task_state is None or task_state.status != TaskStatus.WAITING_FOR_SETTINGS:
+            message.settings.items = b""
+            async for _ in fragments:
+                pass
+            return
+
+        writer = None
+
+        try:
+            writer = ItemsWriter()
+            writer.write(message.settings.items)
+            async for fragment in fragments:
+                writer.write(fragment)
+        except BaseException:
+            # E.g. shared memory is full, in which case the caller reads the rest.
+            if writer is not None:
+                writer.abort()
+            raise
+
+        message.settings.items = writer.close()
+
+    def _dispatch_message(self, message: BrokerMessage) -> None:
+        """Handle a message concurrently with others, after earlier messages for the same task.
+
+        A slow handler, e.g. a cancel waiting for a worker to stop, then no longer
+        delays messages for other tasks.
+        """
+
+        task_id = getattr(message, "task_id", None)
+        previous = self.task_message_tails.get(task_id) if task_id else None
+
+        handler = asyncio.create_task(self._handle_message_after(message, previous))
+        self.message_handlers.add(handler)
+        handler.add_done_callback(self.message_handlers.discard)
+
+        if task_id is None:
+            return
+
+        self.task_message_tails[task_id] = handler
+
+        def forget_tail(_):
+            if self.task_message_tails.get(task_id) is handler:
+                del self.task_message_tails[task_id]
+
+        handler.add_done_callback(forget_tail)
+
+    async def _handle_message_after(
+        self, message: BrokerMessage, previous: Optional[asyncio.Task]
+    ) -> None:
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+
+            await self._handle_message(message)
+        except Exception as e:
+            self.logger.error(f"Error handling message: {e}")
 
     async def _handle_message(self, message: BrokerMessage) -> None:
         match message:
             case BrokerInfoRequest():
                 await self._handle_info_request()
             case BrokerRunnerRegistered():
-                await self._handle_runner_registered()
+                await self._handle_runner_registered(message)
             case BrokerTaskOfferAccept():
                 await self._handle_task_offer_accept(message)
             case BrokerTaskSettings():
@@ -144,15 +455,48 @@ class TaskRunner:
                 self.logger.warning(f"Unhandled message type: {type(message)}")
 
     async def _handle_info_request(self) -> None:
-        response = RunnerInfo(name=self.name, types=[TASK_TYPE_PYTHON])
+        capabilities = RUNNER_CAPABILITIES + (
+            [WIRE_FORMAT_MSGPACK] if msgpack_codec.MSGPACK_AVAILABLE else []
+        )
+        response = RunnerInfo(
+            name=self.name,
+            types=[TASK_TYPE_PYTHON],
+            capabilities=capabilities,
+        )
         await self._send_message(response)
 
-    async def _handle_runner_registered(self) -> None:
-        self.can_send_offers = True
-        self.offers_coroutine = asyncio.create_task(self._send_offers_loop())
+    async def _handle_runner_registered(self, message: BrokerRunnerRegistered) -> None:
+        self.broker_capabilities = set(message.capabilities)
+        self.is_registered = True
+        self.registrations += 1
         self.logger.info("Registered with broker")
 
+        if not self.is_draining:
+            self.can_send_offers = True
+            self.offers_coroutine = asyncio.create_task(self._send_offers_loop())
+
+        await self._redeliver_results()
+
+    async def _redeliver_results(self) -> None:
+        if not self.result_buffer:
+            return
+
+        self.logger.info(f"Redelivering {len(self.result_buffer)} task results")
+
+        async for serialized in self.result_buffer.drain():
+            await self.message_writer.put(
+                serialized, MessagePriority.BULK, on_failure=self.result_buffer.add
+            )
+
     async def _handle_task_offer_accept(self, message: BrokerTaskOfferAccept) -> None:
+        if self.is_draining:
+            response = RunnerTaskRejected(
+                task_id=message.task_id,
+                reason=TASK_REJECTED_REASON_DRAINING,
+            )
+            await self._send_message(response)
+            return
+
         offer = self.open_offers.get(message.offer_id)
 
         if offer is None or offer.has_expired:
@@ -176,6 +520,9 @@ class TaskRunner:
         task_state = TaskState(message.task_id)
         self.running_tasks[message.task_id] = task_state
 
+        # Reserve a warm worker now if one is ready, else one is awaited with the settings.
+        task_state.workers = self.worker_pool.acquire_idle(1)
+
         response = RunnerTaskAccepted(task_id=message.task_id)
         await self._send_message(response)
         self.logger.info(f"Accepted task {message.task_id}")
@@ -183,45 +530,147 @@ class TaskRunner:
     async def _handle_task_settings(self, message: BrokerTaskSettings) -> None:
         task_state = self.running_tasks.get(message.task_id)
         if task_state is None:
+            self._discard_items(message.settings)
             raise TaskMissingError(message.task_id)
 
         if task_state.status != TaskStatus.WAITING_FOR_SETTINGS:
+            self._discard_items(message.settings)
             self.logger.warning(
                 f"Received settings for task but it is already {task_state.status}. Discarding message."
             )
             return
 
+        # Off the event loop, as compiling large code takes a while.
+        compiled_code, syntax_error = await asyncio.to_thread(
+            self.executor.compile_task,
+            message.settings.code,
+            message.settings.node_mode,
+        )
+
+        if compiled_code is None:
+            self._discard_items(message.settings)
+            self._finish_task(message.task_id, task_state.workers)
+            await self._send_syntax_error(
+                message.task_id, message.settings, syntax_error
+            )
+            return
+
         task_state.status = TaskStatus.RUNNING
-        asyncio.create_task(self._execute_task(message.task_id, message.settings))
+        asyncio.create_task(
+            self._execute_task(message.task_id, message.settings, compiled_code)
+        )
         self.logger.info(f"Received task {message.task_id}")
 
-    async def _execute_task(self, task_id: str, task_settings: TaskSettings) -> None:
+    async def _execute_task(
+        self, task_id: str, task_settings: TaskSettings, compiled_code: bytes
+    ) -> None:
+        workers = []
+        stream = self._open_result_stream(task_id, task_settings)
+
         try:
             task_state = self.running_tasks.get(task_id)
 
             if task_state is None:
                 raise TaskMissingError(task_id)
 
-            process, queue = self.executor.create_process(
-                task_settings.code, task_settings.node_mode, task_settings.items
+            parallelism = (
+                self.opts.per_item_parallelism
+                if task_settings.node_mode == "per_item"
+                and payload_size(task_settings.items) >= PER_ITEM_PARALLEL_MIN_SIZE
+                else 1
             )
 
-            task_state.process = process
-
-            result = self.executor.execute_process(
-                process, queue, self.opts.task_timeout, task_settings.continue_on_fail
+            workers = [worker for worker in task_state.workers if worker.is_alive()]
+            self._release_workers(
+                [worker for worker in task_state.workers if worker not in workers]
+            )
+            if not workers:
+                workers = [await self.worker_pool.acquire()]
+            # Split only across workers already warm, never starting extra ones for it.
+            workers += self.worker_pool.acquire_idle(parallelism - len(workers))
+            task_state.workers = workers
+
+            if task_state.status == TaskStatus.ABORTING:
+                raise TaskCancelledError()
+
+            result = await self.executor.execute_task(
+                workers,
+                task_settings,
+                compiled_code,
+                self.opts.task_timeout,
+                None if stream is None else partial(self._send_result_chunk, stream),
             )
 
-            response = RunnerTaskDone(task_id=task_id, data={"result": result})
-            await self._send_message(response)
+            if stream is not None and result is None:
+                await self._end_result_stream(stream)
+            else:
+                response = RunnerTaskDone(
+                    task_id=task_id,
+                    result=result,
+                    wire_format=task_settings.wire_format,
+                )
+                await self._send_task_outcome(response, stream)
             self.logger.info(f"Completed task {task_id}")
 
         except Exception as e:
             response = RunnerTaskError(task_id=task_id, error={"message": str(e)})
-            await self._send_message(response)
+            await self._send_task_outcome(response, stream)
 
         finally:
-            self.running_tasks.pop(task_id, None)
+            self._discard_items(task_settings)
+            self._finish_task(task_id, workers)
+
+    async def _send_task_outcome(
+        self, message: RunnerMessage, stream: Optional[ResultStream]
+    ) -> None:
+        """Send a task's result or error, unless its interrupted stream already failed it.
+
+        A result or error sent after some of a stream's chunks replaces them, so
+        it is queued behind any of them, like they are, rather than ahead.
+        """
+
+        if stream is None:
+            await self._send_message(message)
+        elif not stream.is_interrupted:
+            await self._send_message(message, MessagePriority.BULK)
+
+    def _finish_task(self, task_id: str, workers: List[Worker]) -> None:
+        """Free a task's slot and workers, and offer the slot again."""
+
+        self.running_tasks.pop(task_id, None)
+        self._release_workers(workers)
+        self.offers_needed.set()
+        self.task_finished.set()
+
+    def _discard_items(self, task_settings: TaskSettings) -> None:
+        """Remove the shared memory of items streamed in for a task that will not run."""
+
+        if isinstance(task_settings.items, SharedMemory):
+            release_items(task_settings.items)
+
+        task_settings.items = b""
+
+    def _release_workers(self, workers: List[Worker]) -> None:
+        for worker in workers:
+            self.worker_pool.release(worker)
+
+    async def _send_syntax_error(
+        self, task_id: str, task_settings: TaskSettings, error: Dict[str, Any]
+    ) -> None:
+        """Fail a task whose code does not compile, without handing it to a worker."""
+
+        if task_settings.continue_on_fail:
+            result = self.executor.continue_on_fail_result(
+                error["message"], task_settings.wire_format
+            )
+            response = RunnerTaskDone(
+                task_id=task_id, result=result, wire_format=task_settings.wire_format
+            )
+        else:
+            response = RunnerTaskError(task_id=task_id, error=error)
+
+        await self._send_message(response)
+        self.logger.info(f"Failed task {task_id}, its code does not compile")
 
     async def _handle_task_cancel(self, message: BrokerTaskCancel) -> None:
         task_state = self.running_tasks.get(message.task_id)
@@ -233,50 +682,177 @@ class TaskRunner:
             return
 
         if task_state.status == TaskStatus.WAITING_FOR_SETTINGS:
-            self.running_tasks.pop(message.task_id, None)
-            await self._send_offers()
+            self._finish_task(message.task_id, task_state.workers)
             return
 
         if task_state.status == TaskStatus.RUNNING:
             task_state.status = TaskStatus.ABORTING
-            self.executor.stop_process(task_state.process)
+            await self.executor.stop_workers(task_state.workers)
 
-    async def _send_message(self, message: RunnerMessage) -> None:
+    async def _send_message(
+        self, message: RunnerMessage, priority: Optional[MessagePriority] = None
+    ) -> None:
         if self.websocket_connection is None:
             raise WebsocketConnectionError(self.task_broker_uri)
 
         serialized = self.serde.serialize_runner_message(message)
-        await self.websocket_connection.send(serialized)
+
+        if priority is None:
+            priority = (
+                MessagePriority.BULK
+                if isinstance(message, RunnerTaskDone)
+                else MessagePriority.CONTROL
+            )
+
+        if not isinstance(message, (RunnerTaskDone, RunnerTaskError)):
+            await self.message_writer.put(serialized, priority)
+        elif self.is_registered:
+            await self.message_writer.put(
+                serialized, priority, on_failure=self.result_buffer.add
+            )
+        else:
+            # Disconnected, or reconnected but not yet registered.
+            await self.result_buffer.add(serialized)
+
+    async def _write_message(self, serialized: bytes) -> None:
+        if self.websocket_connection is None:
+            raise WebsocketConnectionError(self.task_broker_uri)
+
+        await self.websocket_connection.send(
+            serialized, text=not self.serde.is_binary_frame(serialized)
+        )
+
+    # ========== Result streaming ==========
+
+    def _open_result_stream(
+        self, task_id: str, task_settings: TaskSettings
+    ) -> Optional[ResultStream]:
+        """Stream the task's result if the broker agreed to, and is connected to take it."""
+
+        if not self.is_registered or RESULT_STREAMING not in self.broker_capabilities:
+            return None
+
+        return ResultStream(
+            task_id=task_id,
+            wire_format=task_settings.wire_format,
+            registration=self.registrations,
+        )
+
+    async def _send_result_chunk(self, stream: ResultStream, items: bytearray) -> None:
+        if stream.chunk_count == 0:
+            await self._send_stream_message(
+                stream, RunnerTaskResultBegin(task_id=stream.task_id)
+            )
+
+        chunk = RunnerTaskResultChunk(
+            task_id=stream.task_id,
+            sequence=stream.chunk_count,
+            items=items,
+            wire_format=stream.wire_format,
+        )
+        stream.chunk_count += 1
+        await self._send_stream_message(stream, chunk)
+
+    async def _end_result_stream(self, stream: ResultStream) -> None:
+        if stream.chunk_count == 0:
+            await self._send_stream_message(
+                stream, RunnerTaskResultBegin(task_id=stream.task_id)
+            )
+
+        end = RunnerTaskResultEnd(
+            task_id=stream.task_id, chunk_count=stream.chunk_count
+        )
+        await self._send_stream_message(stream, end)
+
+    async def _send_stream_message(
+        self, stream: ResultStream, message: RunnerMessage
+    ) -> None:
+        """Queue a message of a result stream, which only makes sense on the connection it started on.
+
+        Stream messages are never buffered for redelivery, as the broker drops a
+        stream with its connection. Once any of them cannot be sent, or the runner
+        has reconnected since the stream started, the rest is dropped and the task
+        is failed instead, by an error that is buffered like any other.
+        """
+
+        if stream.is_interrupted:
+            return
+
+        if not self.is_registered or stream.registration != self.registrations:
+            await self._interrupt_result_stream(stream)
+            return
+
+        async def on_failure(_: bytes) -> None:
+            await self._interrupt_result_stream(stream)
+
+        await self.message_writer.put(
+            self.serde.serialize_runner_message(message),
+            MessagePriority.BULK,
+            on_failure=on_failure,
+        )
+
+    async def _interrupt_result_stream(self, stream: ResultStream) -> None:
+        if stream.is_interrupted:
+            return
+
+        stream.is_interrupted = True
+        self.logger.warning(f"Lost the result stream of task {stream.task_id}")
+
+        error = TaskResultStreamInterruptedError()
+        await self._send_message(
+            RunnerTaskError(task_id=stream.task_id, error={"message": str(error)}),
+            MessagePriority.BULK,
+        )
 
     # ========== Offers ==========
 
     async def _send_offers_loop(self) -> None:
+        """Send offers whenever a slot frees up or an open offer expires.
+
+        Slots free up on task completion or cancellation, which set `offers_needed`.
+        Expiries are tracked in a min-heap of deadlines, so the loop sleeps until the
+        earliest one. The safety interval bounds the sleep in case an event is missed.
+        """
+
         while self.can_send_offers:
             try:
                 await self._send_offers()
-                await asyncio.sleep(OFFER_INTERVAL)
+                await self._wait_for_offers_needed()
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 self.logger.error(f"Error sending offers: {e}")
+                await asyncio.sleep(OFFER_SAFETY_INTERVAL)
+
+    async def _wait_for_offers_needed(self) -> None:
+        timeout = OFFER_SAFETY_INTERVAL
+
+        if self.offer_deadlines:
+            timeout = min(timeout, max(0, self.offer_deadlines[0][0] - time.time()))
+
+        try:
+            await asyncio.wait_for(self.offers_needed.wait(), timeout)
+        except TimeoutError:
+            pass
+
+        self.offers_needed.clear()
 
     async def _send_offers(self) -> None:
         if not self.can_send_offers:
             return
 
-        expired_offer_ids = [
-            offer_id
-            for offer_id, offer in self.open_offers.items()
-            if offer.has_expired
-        ]
+        now = time.time()
 
-        for offer_id in expired_offer_ids:
-            self.open_offers.pop(offer_id, None)
+        while self.offer_deadlines and self.offer_deadlines[0][0] < now:
+            _, offer_id = heapq.heappop(self.offer_deadlines)
+            self.open_offers.pop(offer_id, None)  # absent if accepted meanwhile
 
         offers_to_send = self.opts.max_concurrency - (
             len(self.open_offers) + len(self.running_tasks)
         )
 
+        offers = []
+
         for _ in range(offers_to_send):
             offer_id = nanoid()
 
@@ -287,9 +863,27 @@ class TaskRunner:
             )
 
             self.open_offers[offer_id] = TaskOffer(offer_id, valid_until)
+            heapq.heappush(self.offer_deadlines, (valid_until, offer_id))
+
+            offers.append(
+                RunnerTaskOffer(
+                    offer_id=offer_id,
+                    task_type=TASK_TYPE_PYTHON,
+                    valid_for=valid_for_ms,
+                )
+            )
 
-            message = RunnerTaskOffer(
-                offer_id=offer_id, task_type=TASK_TYPE_PYTHON, valid_for=valid_for_ms
+        if len(offers) > 1 and RUNNER_TASK_OFFERS in self.broker_capabilities:
+            await self._send_message(
+                RunnerTaskOffers(
+                    task_type=TASK_TYPE_PYTHON,
+                    offers=[
+                        {"offerId": offer.offer_id, "validFor": offer.valid_for}
+                        for offer in offers
+                    ],
+                )
             )
+            return
 
-            await self._send_message(message)
+        for offer in offers:
+            await self._send_message(offer)
@@ -1,7 +1,9 @@
 from enum import Enum
-from dataclasses import dataclass
-from multiprocessing.context import SpawnProcess
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import List
+
+from .message_types.broker import WireFormat
+from .worker_pool import Worker
 
 
 class TaskStatus(Enum):
@@ -14,9 +16,20 @@ class TaskStatus(Enum):
 class TaskState:
     task_id: str
     status: TaskStatus
-    process: Optional[SpawnProcess] = None
+    workers: List[Worker] = field(default_factory=list)
 
     def __init__(self, task_id: str):
         self.task_id = task_id
         self.status = TaskStatus.WAITING_FOR_SETTINGS
-        self.process = None
+        self.workers = []
+
+
+@dataclass
+class ResultStream:
+    """A task result being sent to the broker chunk by chunk."""
+
+    task_id: str
+    wire_format: WireFormat
+    registration: int  # count of registrations with the broker when it started
+    chunk_count: int = 0
+    is_interrupted: bool = False
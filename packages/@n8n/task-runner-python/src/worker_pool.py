@@ -0,0 +1,363 @@
+import asyncio
+import fcntl
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import (
+    Awaitable,
+    Callable,
+    Deque,
+    List,
+    Literal,
+    Optional,
+    Set,
+)
+
+from .constants import RESULT_CHUNK_SIZE, WORKER_STOP_GRACE_PERIOD
+from .errors import TaskProcessExitError
+from .result_channel import ResultReader, wait_ready
+
+StartMethod = Literal["spawn", "forkserver"]
+
+# Imported by name only, as importing it freezes the GC of the importing process.
+FORKSERVER_PRELOAD_MODULE = f"{__package__}.forkserver_preload"
+
+
+@dataclass
+class WorkerPoolOpts:
+    size: int
+    max_tasks: int
+    max_rss: int  # MiB, 0 to disable
+    max_age: int  # seconds, 0 to disable
+    start_method: StartMethod
+    preload_modules: List[str]
+
+
+class Worker:
+    """Runner-side handle to a warm worker process that executes tasks sent over a pipe."""
+
+    def __init__(
+        self, process: BaseProcess, task_conn: Connection, result_conn: Connection
+    ):
+        self.process = process
+        self.task_conn = task_conn
+        self.result_conn = result_conn
+        self.started_at = time.monotonic()
+        self.tasks_run = 0
+        self.peak_rss = 0  # KiB
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    async def read_result(
+        self, on_chunk: Optional[Callable[[bytearray], Awaitable[None]]] = None
+    ) -> Optional[ResultReader]:
+        """Drain result frames while the worker writes them, without blocking the loop.
+
+        Returns the reader holding the reassembled result, or None if the worker
+        exited before finishing it. With `on_chunk`, each chunk of a streamed result
+        is handed to it instead, and reading pauses while it runs, so a slow
+        consumer makes the worker wait on the pipe rather than the runner buffer.
+        """
+
+        reader = ResultReader(stream=on_chunk is not None)
+
+        while True:
+            if not await self._read_frames(reader):
+                return None
+
+            while on_chunk is not None and reader.chunks:
+                await on_chunk(reader.chunks.pop(0))
+
+            if reader.is_complete:
+                return reader
+
+    async def _read_frames(self, reader: ResultReader) -> bool:
+        """Feed the reader until it completes or holds chunks, returning False on EOF."""
+
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        fd = self.result_conn.fileno()
+
+        def on_readable():
+            if ready.done():
+                return
+
+            try:
+                data = os.read(fd, RESULT_CHUNK_SIZE)
+            except BlockingIOError:
+                return
+
+            if not data:
+                ready.set_result(False)
+                return
+
+            reader.feed(data)
+
+            if reader.is_complete or reader.chunks:
+                ready.set_result(True)
+
+        loop.add_reader(fd, on_readable)
+        try:
+            return await ready
+        finally:
+            loop.remove_reader(fd)
+
+    async def stop(self) -> None:
+        """Stop the worker process, gracefully else force-killing."""
+
+        if not self.process.is_alive():
+            return
+
+        self.process.terminate()
+        await asyncio.to_thread(self.process.join, WORKER_STOP_GRACE_PERIOD)
+
+        if self.process.is_alive():
+            self.process.kill()
+            await asyncio.to_thread(self.process.join)
+
+    def close(self) -> None:
+        self.task_conn.close()
+        self.result_conn.close()
+
+
+class WorkerPool:
+    """Keeps pre-started worker processes ready so that tasks skip interpreter boot.
+
+    The pool keeps `size` workers around, counting both idle and busy ones, and
+    starts a replacement as soon as a worker is handed out or retired. Workers
+    are started one at a time by a background task, in a thread so that booting
+    them never blocks the event loop, and only warm workers are handed out.
+    Workers are retired after `max_tasks` tasks, once their peak RSS exceeds
+    `max_rss`, or once older than `max_age`.
+
+    With the `forkserver` start method, workers are forked from a server process
+    that has already imported the executor and `preload_modules` and frozen the
+    GC, so each worker boots in about a millisecond and shares those pages.
+    """
+
+    def __init__(self, target: Callable, opts: WorkerPoolOpts):
+        self.target = target
+        self.opts = opts
+        self.context = multiprocessing.get_context(opts.start_method)
+
+        if opts.start_method == "forkserver":
+            self.context.set_forkserver_preload(
+                [
+                    *opts.preload_modules,
+                    target.__module__,
+                    FORKSERVER_PRELOAD_MODULE,
+                ]
+            )
+
+        self.idle_workers: List[Worker] = []
+        self.busy_workers: Set[Worker] = set()
+        self.waiters: Deque[asyncio.Future[Worker]] = deque()
+        self.refilling: Optional[asyncio.Task] = None
+        self.retiring: Set[asyncio.Task] = set()
+        self.is_shutdown = False
+        self.logger = logging.getLogger(__name__)
+
+    def start(self) -> None:
+        self._fill()
+
+    async def acquire(self) -> Worker:
+        """Hand out an idle warm worker, waiting for one to start if none is ready.
+
+        Once every worker of the pool is busy, one is started beyond the pool size.
+        """
+
+        worker = self._take_idle_worker()
+
+        if worker is not None:
+            self.busy_workers.add(worker)
+            self._fill()
+            return worker
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self._fill()
+
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(waiter.result())
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def acquire_idle(self, count: int) -> List[Worker]:
+        """Hand out up to `count` idle warm workers, without starting any beyond the pool size."""
+
+        workers = []
+
+        while len(workers) < count:
+            worker = self._take_idle_worker()
+            if worker is None:
+                break
+            workers.append(worker)
+
+        self.busy_workers.update(workers)
+        self._fill()
+
+        return workers
+
+    def release(self, worker: Worker) -> None:
+        """Return a worker after a task, retiring it if it reached its recycle limits."""
+
+        self.busy_workers.discard(worker)
+
+        if self.is_shutdown or self._should_recycle(worker):
+            self._retire(worker)
+        else:
+            self._hand_out(worker)
+
+        self._fill()
+
+    def _hand_out(self, worker: Worker) -> None:
+        """Pass a warm worker to the longest waiting `acquire`, else keep it idle."""
+
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.busy_workers.add(worker)
+                waiter.set_result(worker)
+                return
+
+        self.idle_workers.append(worker)
+
+    def _take_idle_worker(self) -> Optional[Worker]:
+        while self.idle_workers:
+            worker = self.idle_workers.pop(0)
+            if worker.is_alive() and not self._is_too_old(worker):
+                return worker
+            self._retire(worker)
+
+        return None
+
+    async def shutdown(self) -> None:
+        self.is_shutdown = True
+
+        for worker in [*self.idle_workers, *self.busy_workers]:
+            self._retire(worker)
+
+        self.idle_workers.clear()
+        self.busy_workers.clear()
+
+        for waiter in self.waiters:
+            waiter.cancel()
+
+        if self.refilling is not None:
+            await asyncio.gather(self.refilling, return_exceptions=True)
+
+        await asyncio.gather(*self.retiring, return_exceptions=True)
+
+    def _retire(self, worker: Worker) -> None:
+        self.logger.debug(
+            f"Retiring worker {worker.process.pid} after {worker.tasks_run} tasks"
+        )
+
+        task = asyncio.create_task(self._stop_and_close(worker))
+        self.retiring.add(task)
+        task.add_done_callback(self.retiring.discard)
+
+    async def _stop_and_close(self, worker: Worker) -> None:
+        await worker.stop()
+        worker.close()
+
+    def _fill(self) -> None:
+        """Start the background refill, unless it is already running or not needed."""
+
+        if self.is_shutdown or self.refilling is not None:
+            return
+
+        if self._missing_workers() > 0:
+            self.refilling = asyncio.create_task(self._refill())
+
+    def _missing_workers(self) -> int:
+        missing = self.opts.size - len(self.idle_workers) - len(self.busy_workers)
+        waiting = sum(1 for waiter in self.waiters if not waiter.done())
+
+        return max(missing, waiting)
+
+    async def _refill(self) -> None:
+        try:
+            while not self.is_shutdown and self._missing_workers() > 0:
+                worker = await asyncio.to_thread(self._start_worker)
+
+                if self.is_shutdown:
+                    self._retire(worker)
+                else:
+                    self._hand_out(worker)
+        except Exception as e:
+            self.logger.error(f"Failed to start a worker: {e}")
+
+            # Fail those waiting rather than leave them hanging, the next refill tries again.
+            for waiter in self.waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+        finally:
+            self.refilling = None
+
+    def _start_worker(self) -> Worker:
+        task_reader, task_writer = self.context.Pipe(duplex=False)
+        result_reader, result_writer = self.context.Pipe(duplex=False)
+
+        process = self.context.Process(
+            target=self.target, args=(task_reader, result_writer)
+        )
+        process.start()
+
+        # Child holds its own copies, closing ours lets EOF signal worker exit.
+        task_reader.close()
+        result_writer.close()
+
+        # Under spawn the worker still has to import the executor, so wait for it here.
+        if not wait_ready(result_reader.fileno()):
+            task_writer.close()
+            result_reader.close()
+            process.join()
+            raise TaskProcessExitError(process.exitcode)
+
+        os.set_blocking(result_reader.fileno(), False)
+        self._grow_pipe(result_reader.fileno())
+
+        return Worker(process, task_writer, result_reader)
+
+    @staticmethod
+    def _grow_pipe(fd: int) -> None:
+        """Let the worker write a whole result chunk per wakeup where the OS allows it."""
+
+        if not hasattr(fcntl, "F_SETPIPE_SZ"):
+            return
+
+        try:
+            fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, RESULT_CHUNK_SIZE)
+        except OSError:
+            pass  # above the system limit, keep the default size
+
+    def _should_recycle(self, worker: Worker) -> bool:
+        if not worker.is_alive():
+            return True
+
+        if self.opts.max_tasks > 0 and worker.tasks_run >= self.opts.max_tasks:
+            return True
+
+        if self.opts.max_rss > 0 and worker.peak_rss > self.opts.max_rss * 1024:
+            return True
+
+        return self._is_too_old(worker)
+
+    def _is_too_old(self, worker: Worker) -> bool:
+        return self.opts.max_age > 0 and worker.age > self.opts.max_age
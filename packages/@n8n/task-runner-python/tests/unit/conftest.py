@@ -0,0 +1,32 @@
+import pytest
+
+from src.constants import (
+    DEFAULT_MAX_PAYLOAD_SIZE,
+    DEFAULT_RESULT_BUFFER_MEMORY_LIMIT,
+    DEFAULT_SEND_QUEUE_HIGH_WATER_MARK,
+)
+from src.task_runner import TaskRunnerOpts
+
+
+@pytest.fixture
+def task_runner_opts() -> TaskRunnerOpts:
+    """Options of a runner whose worker pool is never started."""
+
+    return TaskRunnerOpts(
+        grant_token="test",
+        task_broker_uri="http://127.0.0.1:5679",
+        max_concurrency=2,
+        max_payload_size=DEFAULT_MAX_PAYLOAD_SIZE,
+        task_timeout=10,
+        worker_pool_size=1,
+        worker_max_tasks=1,
+        worker_max_rss=0,
+        worker_max_age=0,
+        worker_start_method="spawn",
+        worker_preload_modules=[],
+        per_item_parallelism=1,
+        send_queue_high_water_mark=DEFAULT_SEND_QUEUE_HIGH_WATER_MARK,
+        auth_token="",
+        result_buffer_memory_limit=DEFAULT_RESULT_BUFFER_MEMORY_LIMIT,
+        drain_timeout=0,
+    )
@@ -0,0 +1,43 @@
+import json
+from typing import List
+
+
+class SentMessages:
+    """Stands in for the runner's message writer, failing messages once `fail` is set."""
+
+    def __init__(self):
+        self.messages: List[dict] = []
+        self.priorities: List[int] = []
+        self.fail = False
+
+    async def put(self, data, priority, on_failure=None):
+        if self.fail and on_failure is not None:
+            await on_failure(data)
+            return
+
+        self.messages.append(json.loads(data))
+        self.priorities.append(priority)
+
+    @property
+    def types(self) -> List[str]:
+        return [message["type"] for message in self.messages]
+
+
+class StartedProcess:
+    """Stands in for a worker process that runs until it is terminated."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.exitcode = None
+
+    def is_alive(self) -> bool:
+        return self.exitcode is None
+
+    def terminate(self) -> None:
+        self.exitcode = -15
+
+    def kill(self) -> None:
+        self.exitcode = -9
+
+    def join(self, timeout=None) -> None:
+        pass
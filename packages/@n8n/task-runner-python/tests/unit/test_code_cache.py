@@ -0,0 +1,66 @@
+import pytest
+
+from src.code_cache import CodeCache
+
+
+class Compiler:
+    """Stands in for the executor's compile step, counting compiles per source."""
+
+    def __init__(self):
+        self.compiled = []
+
+    def __call__(self, raw_code: str):
+        self.compiled.append(raw_code)
+        return compile(raw_code, "<string>", "exec")
+
+
+class TestCodeCache:
+    def test_code_is_compiled_once_then_served_from_the_cache(self):
+        cache = CodeCache(2)
+        compiler = Compiler()
+
+        first = cache.get("x = 1", "all_items", compiler)
+        second = cache.get("x = 1", "all_items", compiler)
+
+        assert first is second
+        assert compiler.compiled == ["x = 1"]
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_node_modes_are_cached_apart(self):
+        cache = CodeCache(2)
+        compiler = Compiler()
+
+        cache.get("x = 1", "all_items", compiler)
+        cache.get("x = 1", "per_item", compiler)
+
+        assert compiler.compiled == ["x = 1", "x = 1"]
+        assert cache.misses == 2
+
+    def test_least_recently_used_code_is_evicted(self):
+        cache = CodeCache(2)
+        compiler = Compiler()
+
+        cache.get("a = 1", "all_items", compiler)
+        cache.get("b = 1", "all_items", compiler)
+        cache.get("a = 1", "all_items", compiler)  # now more recent than b
+        cache.get("c = 1", "all_items", compiler)  # evicts b
+        cache.get("a = 1", "all_items", compiler)
+        cache.get("b = 1", "all_items", compiler)
+
+        assert compiler.compiled == ["a = 1", "b = 1", "c = 1", "b = 1"]
+        assert len(cache.entries) == 2
+        assert (cache.hits, cache.misses) == (2, 4)
+
+    def test_syntax_errors_are_cached_and_raised_on_every_get(self):
+        cache = CodeCache(2)
+        compiler = Compiler()
+
+        errors = []
+        for _ in range(2):
+            with pytest.raises(SyntaxError) as exc_info:
+                cache.get("return (", "all_items", compiler)
+            errors.append(exc_info.value)
+
+        assert errors[0] is errors[1]
+        assert compiler.compiled == ["return ("]
+        assert (cache.hits, cache.misses) == (1, 1)
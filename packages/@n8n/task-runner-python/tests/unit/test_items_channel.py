@@ -0,0 +1,42 @@
+import pytest
+
+from src.items_channel import ItemsWriter, read_items, release_items, write_items
+
+
+def overwrite(view: memoryview) -> bytes:
+    view[0] = ord("x")
+    return bytes(view)
+
+
+@pytest.fixture(params=["write_items", "ItemsWriter"])
+def segment(request):
+    """An items segment as placed by the runner, whole or piece by piece."""
+
+    if request.param == "write_items":
+        segment = write_items(b"[1,2]")
+    else:
+        writer = ItemsWriter()
+        writer.write(b"[1,")
+        writer.write(b"2]")
+        segment = writer.close()
+
+    yield segment
+    release_items(segment)
+
+
+class TestReadItems:
+    def test_decodes_the_payload(self, segment):
+        assert read_items(segment.name, 5, bytes, unlink=False) == b"[1,2]"
+        assert read_items(segment.name, 3, bytes, unlink=False) == b"[1,"
+
+    def test_maps_the_segment_read_only(self, segment):
+        with pytest.raises(TypeError):
+            read_items(segment.name, 5, overwrite, unlink=False)
+
+        assert read_items(segment.name, 5, bytes, unlink=False) == b"[1,2]"
+
+    def test_unlink_removes_the_segment(self, segment):
+        read_items(segment.name, 5, bytes, unlink=True)
+
+        with pytest.raises(FileNotFoundError):
+            read_items(segment.name, 5, bytes, unlink=False)
@@ -0,0 +1,227 @@
+import dataclasses
+import datetime
+import decimal
+import enum
+import json
+import math
+import uuid
+
+import pytest
+
+from src import json_codec
+from src.message_serde import MessageSerde
+from src.message_types import (
+    BrokerInfoRequest,
+    BrokerRunnerRegistered,
+    BrokerTaskCancel,
+    BrokerTaskOfferAccept,
+    RunnerInfo,
+    RunnerTaskAccepted,
+    RunnerTaskDone,
+    RunnerTaskError,
+    RunnerTaskOffer,
+    RunnerTaskOffers,
+    RunnerTaskRejected,
+)
+
+ITEMS = [
+    {
+        "json": {
+            "id": index,
+            "name": "Zoë Müller",
+            "active": index % 3 == 0,
+            "score": index * 0.37,
+            "geo": [52.53, 13.38],
+            "notes": None,
+        },
+        "pairedItem": {"item": index},
+    }
+    for index in range(100)
+]
+
+RUNNER_MESSAGES = [
+    RunnerInfo(name="Python Task Runner", types=["python"], capabilities=["a"]),
+    RunnerTaskOffer(offer_id="o1", task_type="python", valid_for=5000),
+    RunnerTaskOffers(task_type="python", offers=[{"offerId": "o1", "validFor": 1}]),
+    RunnerTaskAccepted(task_id="t1"),
+    RunnerTaskRejected(task_id="t1", reason="No open task slots"),
+    RunnerTaskDone(task_id="t1", result='[{"json":{"a":"é"}}]'.encode()),
+    RunnerTaskError(task_id="t1", error={"message": "boom", "stack": "é"}),
+]
+
+BROKER_MESSAGES = [
+    ({"type": "broker:inforequest"}, BrokerInfoRequest()),
+    (
+        {"type": "broker:runnerregistered", "capabilities": ["a"]},
+        BrokerRunnerRegistered(capabilities=["a"]),
+    ),
+    (
+        {"type": "broker:taskofferaccept", "taskId": "t1", "offerId": "o1"},
+        BrokerTaskOfferAccept(task_id="t1", offer_id="o1"),
+    ),
+    (
+        {"type": "broker:taskcancel", "taskId": "t1", "reason": "é"},
+        BrokerTaskCancel(task_id="t1", reason="é"),
+    ),
+]
+
+
+@pytest.fixture(params=list(json_codec.BACKENDS), autouse=True)
+def backend(request, monkeypatch):
+    """Run each test against every installed backend, as if it were the one in use."""
+
+    fast_dumps, loads = json_codec.BACKENDS[request.param]
+    monkeypatch.setattr(json_codec, "_fast_dumps", fast_dumps)
+    monkeypatch.setattr(json_codec, "loads", loads)
+    return request.param
+
+
+class TestRoundTrips:
+    @pytest.mark.parametrize("message", RUNNER_MESSAGES)
+    def test_runner_message_frames_are_stable(self, message):
+        frame = MessageSerde.serialize_runner_message(message)
+
+        assert json_codec.dumps(json_codec.loads(frame)) == frame
+
+    @pytest.mark.parametrize("message_dict, expected", BROKER_MESSAGES)
+    def test_broker_messages_decode(self, message_dict, expected):
+        frame = json_codec.dumps(message_dict)
+
+        assert (
+            frame
+            == json.dumps(
+                message_dict, separators=(",", ":"), ensure_ascii=False
+            ).encode()
+        )
+        assert MessageSerde.deserialize_broker_message(frame) == expected
+
+    def test_items_encode_as_compact_utf8(self):
+        encoded = json_codec.dumps(ITEMS)
+
+        assert (
+            encoded
+            == json.dumps(ITEMS, separators=(",", ":"), ensure_ascii=False).encode()
+        )
+        assert json_codec.loads(encoded) == ITEMS
+        assert json_codec.loads(memoryview(encoded)) == ITEMS
+
+
+class TestFloats:
+    @pytest.mark.parametrize("value", [1e16, 1e-7, 1.5e300, 1e22, -0.0, 0.1])
+    def test_floats_decode_to_the_same_value(self, value):
+        # The exponent notation differs between backends, the value does not.
+        encoded = json_codec.dumps([value])
+
+        assert json.loads(encoded) == [value]
+        assert json_codec.loads(encoded) == [value]
+        assert math.copysign(1, json_codec.loads(encoded)[0]) == math.copysign(1, value)
+
+    def test_nan_and_infinities_encode_as_null(self):
+        values = {"a": [math.nan, 1.5, math.inf], "b": (-math.inf,)}
+
+        assert json_codec.dumps(values) == b'{"a":[null,1.5,null],"b":[null]}'
+
+
+class Color(enum.Enum):
+    RED = "red"
+
+
+class Size(enum.IntEnum):
+    SMALL = 1
+
+
+class Name(str):
+    pass
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+
+
+class TestEncodableValues:
+    """Every backend encodes the same values, so a result encodes whatever is installed."""
+
+    @pytest.mark.parametrize(
+        "value, expected",
+        [
+            (uuid.UUID(int=1), b'["00000000-0000-0000-0000-000000000001"]'),
+            (Color.RED, b'["red"]'),
+            (Size.SMALL, b"[1]"),
+            (Name("a"), b'["a"]'),
+            ((1, 2), b"[[1,2]]"),
+            ({"a": {1: 2}}, b'[{"a":{"1":2}}]'),
+        ],
+    )
+    def test_encoded_alike_by_every_backend(self, value, expected):
+        assert json_codec.dumps([value]) == expected
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            datetime.datetime(2024, 1, 1),
+            datetime.date(2024, 1, 1),
+            datetime.time(12),
+            Point(1),
+            {1, 2},
+            b"bytes",
+            decimal.Decimal("1.5"),
+            object(),
+        ],
+    )
+    def test_rejected_by_every_backend(self, value):
+        with pytest.raises(TypeError):
+            json_codec.dumps({"json": {"value": value}})
+
+
+class TestStdlibFallback:
+    def test_ints_over_64_bits_are_encoded(self):
+        assert json_codec.dumps({"a": 2**70}) == b'{"a":1180591620717411303424}'
+
+    def test_non_string_keys_are_encoded_as_strings(self):
+        assert json_codec.dumps({1: "a"}) == b'{"1":"a"}'
+
+    def test_unencodable_values_raise(self):
+        with pytest.raises(TypeError):
+            json_codec.dumps({"a": object()})
+
+
+class TestMalformedInput:
+    @pytest.mark.parametrize("data", [b'{"a":', b"", b'{"a":1}x', b"\xff"])
+    def test_invalid_json_raises(self, data):
+        with pytest.raises(ValueError):
+            json_codec.loads(data)
+
+
+class TestArrayShares:
+    @pytest.fixture(params=["msgspec", "json"])
+    def splitter(self, request, monkeypatch):
+        """Find element boundaries with msgspec where installed, and with the stdlib."""
+
+        if request.param == "msgspec":
+            pytest.importorskip("msgspec")
+        else:
+            monkeypatch.setattr(json_codec, "msgspec", None)
+
+    @pytest.mark.parametrize("parts", [1, 2, 3, 7, 150])
+    def test_shares_add_up_to_the_array(self, splitter, parts):
+        encoded = json_codec.dumps(ITEMS)
+        shares = [
+            json_codec.loads_share(encoded, index, parts) for index in range(parts)
+        ]
+
+        assert [item for share, _ in shares for item in share] == ITEMS
+        assert [start for _, start in shares] == [
+            len(ITEMS) * index // parts for index in range(parts)
+        ]
+
+    def test_whitespace_and_trailing_bytes_are_ignored(self, splitter):
+        encoded = b' [ {"a": "],["} ,\n[1, 2] , "x" ]  ,"taskId":"t1"}'
+
+        assert json_codec.loads_share(memoryview(encoded), 1, 2) == ([[1, 2], "x"], 1)
+        assert json_codec.loads_share(b"[ ]", 0, 2) == ([], 0)
+
+    @pytest.mark.parametrize("data", [b'{"a":1}', b"[1 2]", b"[1,", b""])
+    def test_invalid_arrays_raise(self, splitter, data):
+        with pytest.raises(ValueError):
+            json_codec.loads_share(data, 0, 2)
@@ -0,0 +1,284 @@
+import json
+from dataclasses import fields
+
+import pytest
+
+from src.constants import ENVELOPE_SCAN_INITIAL_SIZE
+from src.message_serde import MESSAGE_ENCODERS, MessageSerde
+from src.message_types import (
+    BrokerInfoRequest,
+    BrokerRunnerRegistered,
+    BrokerTaskCancel,
+    BrokerTaskOfferAccept,
+    BrokerTaskSettings,
+    RunnerInfo,
+    RunnerTaskAccepted,
+    RunnerTaskDone,
+    RunnerTaskError,
+    RunnerTaskOffer,
+    RunnerTaskOffers,
+    RunnerTaskRejected,
+    RunnerTaskResultBegin,
+    RunnerTaskResultEnd,
+)
+from src.task_executor import TaskExecutor
+
+ITEMS = [{"json": {"name": "Zoë", "tags": ["a", "b"]}}, {"json": {"n": None}}]
+
+
+def task_settings_frame(
+    code: str = "return _items",
+    node_mode: str = "runOnceForAllItems",
+    items=ITEMS,
+    indent=None,
+) -> bytes:
+    """A task settings frame in the broker's member order, items last."""
+
+    return json.dumps(
+        {
+            "type": "broker:tasksettings",
+            "taskId": "task-1",
+            "settings": {
+                "code": code,
+                "nodeMode": node_mode,
+                "continueOnFail": False,
+                "items": items,
+            },
+        },
+        ensure_ascii=False,
+        indent=indent,
+        separators=None if indent else (",", ":"),
+    ).encode()
+
+
+def decoded_items(message: BrokerTaskSettings):
+    return TaskExecutor._decode_items(memoryview(message.settings.items))
+
+
+class TestTaskSettingsEnvelope:
+    @pytest.mark.parametrize("indent", [None, 2])
+    def test_items_are_forwarded_unparsed(self, indent):
+        message = MessageSerde.deserialize_broker_message(
+            task_settings_frame(indent=indent)
+        )
+
+        assert isinstance(message, BrokerTaskSettings)
+        assert isinstance(message.settings.items, memoryview)
+        assert message.task_id == "task-1"
+        assert message.settings.code == "return _items"
+        assert message.settings.node_mode == "all_items"
+        assert message.settings.continue_on_fail is False
+        assert decoded_items(message) == ITEMS
+
+    def test_items_offset_counts_bytes_of_multibyte_characters(self):
+        message = MessageSerde.deserialize_broker_message(
+            task_settings_frame(code="return [{'json': {'s': 'é€😀'}}]")
+        )
+
+        assert message.settings.code == "return [{'json': {'s': 'é€😀'}}]"
+        assert decoded_items(message) == ITEMS
+
+    def test_envelope_longer_than_the_initial_scan_is_parsed(self):
+        code = "# " + "x" * (3 * ENVELOPE_SCAN_INITIAL_SIZE) + "\nreturn _items"
+
+        message = MessageSerde.deserialize_broker_message(task_settings_frame(code))
+
+        assert message.settings.code == code
+        assert isinstance(message.settings.items, memoryview)
+        assert decoded_items(message) == ITEMS
+
+    def test_members_after_settings_are_skipped_when_decoding_items(self):
+        frame = task_settings_frame()[:-1] + b',"extra":{"a":[1,2]}}'
+
+        message = MessageSerde.deserialize_broker_message(frame)
+
+        assert decoded_items(message) == ITEMS
+
+    def test_other_member_order_falls_back_to_the_full_parse(self):
+        frame = json.dumps(
+            {
+                "taskId": "task-1",
+                "type": "broker:tasksettings",
+                "settings": {
+                    "items": ITEMS,
+                    "code": "return _items",
+                    "nodeMode": "runOnceForEachItem",
+                    "continueOnFail": True,
+                },
+            }
+        ).encode()
+
+        message = MessageSerde.deserialize_broker_message(frame)
+
+        assert decoded_items(message) == ITEMS
+        assert message.settings.node_mode == "per_item"
+        assert message.settings.continue_on_fail is True
+
+    def test_other_messages_are_not_scanned(self):
+        frame = (
+            b'{"type":"broker:taskcancel","taskId":"broker:tasksettings","reason":"x"}'
+        )
+
+        assert MessageSerde.deserialize_task_settings_head(frame) is None
+        assert MessageSerde.deserialize_broker_message(frame).task_id == (
+            "broker:tasksettings"
+        )
+
+
+class TestTaskSettingsHead:
+    def test_head_holding_the_envelope_yields_the_items_so_far(self):
+        frame = task_settings_frame()
+        items_start = frame.index(b'"items":') + len(b'"items":')
+
+        message = MessageSerde.deserialize_task_settings_head(frame[: items_start + 5])
+
+        assert message is not None
+        assert message.settings.code == "return _items"
+        assert bytes(message.settings.items) == frame[items_start : items_start + 5]
+
+    @pytest.mark.parametrize("cut", [b'"type"', b'"code"', b'"it', b'"items"'])
+    def test_head_cut_before_the_items_is_not_enough(self, cut):
+        frame = task_settings_frame()
+        head = frame[: frame.index(cut) + len(cut)]
+
+        assert MessageSerde.deserialize_task_settings_head(head) is None
+
+
+class TestMalformedTaskSettings:
+    def test_invalid_json_raises(self):
+        with pytest.raises(ValueError):
+            MessageSerde.deserialize_broker_message(b'{"type":"broker:tasksettings",')
+
+    def test_missing_field_raises(self):
+        frame = b'{"type":"broker:tasksettings","taskId":"t","settings":{"items":[]}}'
+
+        with pytest.raises(ValueError, match="Missing field"):
+            MessageSerde.deserialize_broker_message(frame)
+
+    def test_unknown_node_mode_raises(self):
+        with pytest.raises(ValueError, match="Unknown nodeMode"):
+            MessageSerde.deserialize_broker_message(
+                task_settings_frame(node_mode="runOnceForSomeItems")
+            )
+
+    def test_unknown_message_type_raises(self):
+        with pytest.raises(ValueError, match="Unknown message type"):
+            MessageSerde.deserialize_broker_message(b'{"type":"broker:unknown"}')
+
+
+class TestTaskDoneSplicing:
+    @pytest.mark.parametrize(
+        "result", [b"[]", b'[{"json":{"a":"\xc3\xa9"}}]', bytearray(b'[{"json":{}}]')]
+    )
+    def test_result_is_spliced_into_the_envelope(self, result):
+        frame = MessageSerde.serialize_runner_message(
+            RunnerTaskDone(task_id="task-1", result=result)
+        )
+
+        assert json.loads(frame) == {
+            "type": "runner:taskdone",
+            "taskId": "task-1",
+            "data": {"result": json.loads(result)},
+        }
+
+    def test_task_id_is_escaped(self):
+        frame = MessageSerde.serialize_runner_message(
+            RunnerTaskDone(task_id='a"\\é', result=b"[]")
+        )
+
+        assert json.loads(frame)["taskId"] == 'a"\\é'
+
+    def test_result_is_spliced_verbatim(self):
+        # The worker encodes the result, so a truncated one yields an invalid frame.
+        frame = MessageSerde.serialize_runner_message(
+            RunnerTaskDone(task_id="task-1", result=b'[{"json":')
+        )
+
+        assert b'"result":[{"json":}' in frame
+        with pytest.raises(ValueError):
+            json.loads(frame)
+
+
+class TestBrokerMessageDecoding:
+    @pytest.mark.parametrize(
+        "message_dict, expected",
+        [
+            ({"type": "broker:inforequest"}, BrokerInfoRequest()),
+            (
+                {"type": "broker:runnerregistered", "capabilities": ["a"]},
+                BrokerRunnerRegistered(capabilities=["a"]),
+            ),
+            (
+                {"type": "broker:taskofferaccept", "taskId": "t", "offerId": "o"},
+                BrokerTaskOfferAccept(task_id="t", offer_id="o"),
+            ),
+            (
+                {"type": "broker:taskcancel", "taskId": "t", "reason": "é"},
+                BrokerTaskCancel(task_id="t", reason="é"),
+            ),
+        ],
+    )
+    def test_message_round_trips(self, message_dict, expected):
+        frame = json.dumps(message_dict).encode()
+
+        assert MessageSerde.deserialize_broker_message(frame) == expected
+
+    def test_unknown_keys_are_ignored(self):
+        frame = b'{"type":"broker:taskcancel","taskId":"t","reason":"r","extra":1}'
+
+        assert MessageSerde.deserialize_broker_message(frame) == BrokerTaskCancel(
+            task_id="t", reason="r"
+        )
+
+    def test_missing_capabilities_get_a_fresh_default(self):
+        frame = b'{"type":"broker:runnerregistered"}'
+
+        first = MessageSerde.deserialize_broker_message(frame)
+        second = MessageSerde.deserialize_broker_message(frame)
+
+        assert first.capabilities == []
+        assert first.capabilities is not second.capabilities
+
+    def test_missing_required_key_raises(self):
+        frame = b'{"type":"broker:taskofferaccept","taskId":"t"}'
+
+        with pytest.raises(
+            ValueError, match="Missing field in task offer acceptance message"
+        ):
+            MessageSerde.deserialize_broker_message(frame)
+
+    def test_truncated_frame_raises(self):
+        with pytest.raises(ValueError):
+            MessageSerde.deserialize_broker_message(b'{"type":"broker:taskcancel"')
+
+
+class TestGeneratedEncoders:
+    @pytest.mark.parametrize(
+        "message",
+        [
+            RunnerInfo(name="Python Task Runner", types=["python"], capabilities=[]),
+            RunnerTaskOffer(offer_id="o", task_type="python", valid_for=5000),
+            RunnerTaskOffers(task_type="python", offers=[{"offerId": "o"}]),
+            RunnerTaskAccepted(task_id="t"),
+            RunnerTaskRejected(task_id="t", reason="No open task slots"),
+            RunnerTaskError(task_id="t", error={"message": "é"}),
+            RunnerTaskResultBegin(task_id="t"),
+            RunnerTaskResultEnd(task_id="t", chunk_count=3),
+        ],
+    )
+    def test_fields_are_encoded_with_camel_case_keys(self, message):
+        expected = {
+            "".join(
+                word if index == 0 else word.capitalize()
+                for index, word in enumerate(f.name.split("_"))
+            ): getattr(message, f.name)
+            for f in fields(message)
+        }
+
+        assert json.loads(MessageSerde.serialize_runner_message(message)) == expected
+
+    def test_field_values_are_not_copied(self):
+        offers = [{"offerId": "o"}]
+        message = RunnerTaskOffers(task_type="python", offers=offers)
+
+        assert MESSAGE_ENCODERS[RunnerTaskOffers](message)["offers"] is offers
@@ -0,0 +1,179 @@
+import asyncio
+
+from src.message_writer import MessagePriority, MessageWriter
+
+CONTROL = MessagePriority.CONTROL
+BULK = MessagePriority.BULK
+
+
+class Socket:
+    """Stands in for the websocket, sending only while `open` is set."""
+
+    def __init__(self):
+        self.sent = []
+        self.failed = []
+        self.open = asyncio.Event()
+        self.open.set()
+        self.error = None
+
+    async def send(self, data: bytes) -> None:
+        await self.open.wait()
+
+        if self.error is not None:
+            raise self.error
+
+        self.sent.append(data)
+
+    async def on_failure(self, data: bytes) -> None:
+        self.failed.append(data)
+
+
+class TestOrder:
+    def test_control_messages_overtake_queued_results(self):
+        async def run():
+            socket = Socket()
+            writer = MessageWriter(socket.send, high_water_mark=1024)
+
+            await writer.put(b"result-1", BULK)
+            await writer.put(b"result-2", BULK)
+            await writer.put(b"offer", CONTROL)
+            await writer.put(b"result-3", BULK)
+            await writer.put(b"accept", CONTROL)
+
+            writer.start()
+            await writer.stop()
+            return socket
+
+        socket = asyncio.run(run())
+
+        assert socket.sent == [
+            b"offer",
+            b"accept",
+            b"result-1",
+            b"result-2",
+            b"result-3",
+        ]
+
+
+class TestBackPressure:
+    def test_results_wait_at_the_high_water_mark_but_control_messages_do_not(self):
+        async def run():
+            socket = Socket()
+            socket.open.clear()
+            writer = MessageWriter(socket.send, high_water_mark=10)
+            writer.start()
+
+            await writer.put(b"a" * 6, BULK)
+            await writer.put(b"b" * 6, BULK)  # reaches the high water mark
+            blocked = asyncio.create_task(writer.put(b"c" * 6, BULK))
+            await writer.put(b"offer", CONTROL)
+            await asyncio.sleep(0)
+
+            was_blocked = not blocked.done()
+            socket.open.set()
+            await blocked
+            await writer.stop()
+            return socket, was_blocked
+
+        socket, was_blocked = asyncio.run(run())
+
+        assert was_blocked
+        assert socket.sent == [b"offer", b"a" * 6, b"b" * 6, b"c" * 6]
+
+    def test_waiting_results_resume_once_below_half_the_high_water_mark(self):
+        async def run():
+            sends = asyncio.Semaphore(0)  # one permit per message let through
+            sent = []
+
+            async def send(data: bytes) -> None:
+                await sends.acquire()
+                sent.append(data)
+
+            writer = MessageWriter(send, high_water_mark=10)
+            writer.start()
+
+            await writer.put(b"a" * 6, BULK)
+            await writer.put(b"b" * 6, BULK)
+            blocked = asyncio.create_task(writer.put(b"c", BULK))
+
+            blocked_at = []
+            for _ in range(2):
+                sends.release()
+                for _ in range(5):
+                    await asyncio.sleep(0)
+                blocked_at.append((len(sent), not blocked.done()))
+
+            sends.release()
+            await writer.stop()
+            return blocked_at
+
+        blocked_at = asyncio.run(run())
+
+        # 6 bytes still queued is above half of 10, none queued is below it.
+        assert blocked_at == [(1, True), (2, False)]
+
+
+class TestFailures:
+    def test_failed_send_is_handed_to_on_failure(self):
+        async def run():
+            socket = Socket()
+            socket.error = ConnectionError("closed")
+            writer = MessageWriter(socket.send, high_water_mark=1024)
+            writer.start()
+
+            await writer.put(b"result", BULK, socket.on_failure)
+            await writer.put(b"offer", CONTROL)  # logged and dropped
+            await writer.stop()
+            return socket, writer
+
+        socket, writer = asyncio.run(run())
+
+        assert socket.failed == [b"result"]
+        assert writer.metrics.messages_sent == 0
+        assert writer.metrics.queued_bytes == 0
+
+    def test_discarded_messages_are_handed_to_on_failure(self):
+        async def run():
+            socket = Socket()
+            writer = MessageWriter(socket.send, high_water_mark=10)
+
+            await writer.put(b"a" * 6, BULK, socket.on_failure)
+            await writer.put(b"b" * 6, BULK, socket.on_failure)
+            await writer.put(b"offer", CONTROL)
+            await writer.discard_pending()
+
+            writer.start()
+            await writer.stop()
+            return socket, writer
+
+        socket, writer = asyncio.run(run())
+
+        assert socket.sent == []
+        assert socket.failed == [b"a" * 6, b"b" * 6]
+        assert writer.queue.empty()
+        assert writer.metrics.queued_bytes == 0
+        assert writer.below_low_water_mark.is_set()
+
+
+class TestMetrics:
+    def test_sent_and_queued_messages_are_counted(self):
+        async def run():
+            socket = Socket()
+            writer = MessageWriter(socket.send, high_water_mark=1024)
+
+            await writer.put(b"offer", CONTROL)
+            await writer.put(b"result", BULK)
+
+            writer.start()
+            await writer.stop()
+            return writer.metrics
+
+        metrics = asyncio.run(run())
+
+        assert metrics.messages_sent == 2
+        assert metrics.bytes_sent == len(b"offer") + len(b"result")
+        assert metrics.max_queue_depth == 2
+        assert metrics.max_queued_bytes == len(b"offer") + len(b"result")
+        assert metrics.queue_depth == 0
+        assert metrics.queued_bytes == 0
+        assert 0 <= metrics.avg_send_latency <= metrics.max_send_latency
@@ -0,0 +1,142 @@
+import pytest
+
+msgpack = pytest.importorskip("msgpack")
+
+from src import msgpack_codec  # noqa: E402
+from src.message_serde import MessageSerde  # noqa: E402
+from src.message_types import BrokerTaskCancel, RunnerTaskDone  # noqa: E402
+
+ITEMS = [{"json": {"name": "Zoë", "data": b"\x00\x01"}}, {"json": {"n": None}}]
+
+
+def task_settings_frame(**settings) -> bytes:
+    """A MessagePack task settings frame in the broker's member order, items last."""
+
+    return msgpack.packb(
+        {
+            "type": "broker:tasksettings",
+            "taskId": "task-1",
+            "settings": {
+                "code": "return _items",
+                "nodeMode": "runOnceForAllItems",
+                "continueOnFail": False,
+                "items": ITEMS,
+                **settings,
+            },
+        }
+    )
+
+
+class TestArrayShares:
+    @pytest.mark.parametrize("parts", [1, 2, 3, 5])
+    def test_shares_add_up_to_the_array(self, parts):
+        items = [{"json": {"n": index}} for index in range(4)]
+        encoded = memoryview(msgpack_codec.dumps(items))
+        shares = [
+            msgpack_codec.loads_share(encoded, index, parts) for index in range(parts)
+        ]
+
+        assert [item for share, _ in shares for item in share] == items
+        assert [start for _, start in shares] == [
+            len(items) * index // parts for index in range(parts)
+        ]
+
+
+class TestTaskSettings:
+    def test_items_are_forwarded_unparsed(self):
+        message = MessageSerde.deserialize_broker_message(task_settings_frame())
+
+        assert isinstance(message.settings.items, memoryview)
+        assert message.settings.wire_format == "msgpack"
+        assert message.settings.code == "return _items"
+        assert msgpack_codec.loads(message.settings.items) == ITEMS
+
+    def test_items_not_last_fall_back_to_the_full_parse(self):
+        frame = msgpack.packb(
+            {
+                "type": "broker:tasksettings",
+                "taskId": "task-1",
+                "settings": {
+                    "items": ITEMS,
+                    "code": "return _items",
+                    "nodeMode": "runOnceForEachItem",
+                    "continueOnFail": True,
+                },
+            }
+        )
+
+        message = MessageSerde.deserialize_broker_message(frame)
+
+        assert message.settings.node_mode == "per_item"
+        assert message.settings.wire_format == "msgpack"
+        assert msgpack_codec.loads(message.settings.items) == ITEMS
+
+    def test_head_holding_the_envelope_yields_the_items_so_far(self):
+        frame = task_settings_frame()
+        items_start = frame.index(b"\xa5items") + len(b"\xa5items")
+
+        message = MessageSerde.deserialize_task_settings_head(frame[: items_start + 3])
+
+        assert message is not None
+        assert bytes(message.settings.items) == frame[items_start : items_start + 3]
+
+    @pytest.mark.parametrize("cut", [1, 10, -len(b"\xa5items") - 1])
+    def test_head_cut_before_the_items_is_not_enough(self, cut):
+        frame = task_settings_frame()
+        items_start = frame.index(b"\xa5items") + len(b"\xa5items")
+        head = frame[:cut] if cut > 0 else frame[: items_start + cut]
+
+        assert MessageSerde.deserialize_task_settings_head(head) is None
+
+
+class TestOtherMessages:
+    def test_message_round_trips(self):
+        frame = msgpack.packb(
+            {"type": "broker:taskcancel", "taskId": "t", "reason": "r"}
+        )
+
+        assert MessageSerde.deserialize_broker_message(frame) == BrokerTaskCancel(
+            task_id="t", reason="r"
+        )
+
+    @pytest.mark.parametrize(
+        "frame",
+        [
+            msgpack.packb({"type": "broker:taskcancel"})[:-3],  # truncated
+            b"\xc1",  # never used
+            msgpack.packb([1, 2]),
+            msgpack.packb({"type": "broker:unknown"}),
+        ],
+    )
+    def test_malformed_frame_raises(self, frame):
+        with pytest.raises(ValueError):
+            MessageSerde.deserialize_broker_message(frame)
+
+
+class TestTaskDoneSplicing:
+    @pytest.mark.parametrize("result", [[], ITEMS])
+    def test_result_is_spliced_into_the_envelope(self, result):
+        frame = MessageSerde.serialize_runner_message(
+            RunnerTaskDone(
+                task_id="task-1", result=msgpack.packb(result), wire_format="msgpack"
+            )
+        )
+
+        assert MessageSerde.is_binary_frame(frame)
+        assert msgpack.unpackb(frame) == {
+            "type": "runner:taskdone",
+            "taskId": "task-1",
+            "data": {"result": result},
+        }
+
+    def test_chunk_results_are_joined_in_order(self):
+        joined = msgpack_codec.join_arrays(
+            [msgpack.packb([1, 2]), msgpack.packb([]), bytearray(msgpack.packb([3]))]
+        )
+
+        assert msgpack.unpackb(joined) == [1, 2, 3]
+
+    def test_joined_array_header_grows_past_a_fixarray(self):
+        joined = msgpack_codec.join_arrays([msgpack.packb(list(range(10)))] * 2)
+
+        assert msgpack.unpackb(joined) == list(range(10)) * 2
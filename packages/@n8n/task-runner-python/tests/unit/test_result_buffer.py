@@ -0,0 +1,83 @@
+import asyncio
+import os
+
+from src.result_buffer import ResultBuffer
+
+
+def spill_files(buffer: ResultBuffer):
+    return [entry for entry in buffer.entries if isinstance(entry, str)]
+
+
+def drain(buffer: ResultBuffer):
+    async def run():
+        return [data async for data in buffer.drain()]
+
+    return asyncio.run(run())
+
+
+def filled(memory_limit: int, results) -> ResultBuffer:
+    buffer = ResultBuffer(memory_limit)
+
+    async def run():
+        for data in results:
+            await buffer.add(data)
+
+    asyncio.run(run())
+    return buffer
+
+
+class TestSpilling:
+    def test_results_within_the_memory_limit_stay_in_memory(self):
+        buffer = filled(8, [b"aaaa", b"bbbb"])
+
+        assert buffer.entries == [b"aaaa", b"bbbb"]
+        assert buffer.memory_size == 8
+
+    def test_results_past_the_memory_limit_are_spilled_to_files(self):
+        buffer = filled(8, [b"aaaa", b"bbbbbbbb", b"cccc"])
+
+        [spilled] = spill_files(buffer)
+        try:
+            assert buffer.entries == [b"aaaa", spilled, b"cccc"]
+            with open(spilled, "rb") as f:
+                assert f.read() == b"bbbbbbbb"
+        finally:
+            buffer.clear()
+
+
+class TestDrain:
+    def test_results_are_redelivered_in_the_order_they_were_added(self):
+        results = [b"aaaa", b"bbbbbbbb", b"cccc", b"dddddddd", b"ee"]
+        buffer = filled(8, results)
+        spilled = spill_files(buffer)
+
+        assert drain(buffer) == results
+        assert len(buffer) == 0
+        assert buffer.memory_size == 0
+        assert not any(os.path.exists(path) for path in spilled)
+
+    def test_results_added_while_draining_are_kept_for_later(self):
+        buffer = filled(8, [b"a", b"b"])
+
+        async def run():
+            drained = []
+            async for data in buffer.drain():
+                drained.append(data)
+                await buffer.add(data.upper())  # e.g. failed again
+            return drained
+
+        assert asyncio.run(run()) == [b"a", b"b"]
+        assert buffer.entries == [b"A", b"B"]
+
+
+class TestClear:
+    def test_clear_removes_spill_files(self):
+        buffer = filled(4, [b"aaaa", b"bbbb", b"cccc"])
+        spilled = spill_files(buffer)
+
+        buffer.clear()
+
+        assert len(spilled) == 2
+        assert not any(os.path.exists(path) for path in spilled)
+        assert len(buffer) == 0
+        assert buffer.memory_size == 0
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+
+import pytest
+
+from src.constants import RESULT_CHUNK_SIZE
+from src.result_channel import (
+    FRAME_HEADER,
+    FrameType,
+    ResultReader,
+    wait_ready,
+    write_chunk,
+    write_ready,
+    write_result,
+)
+
+
+def written(write) -> bytes:
+    """Bytes written to a pipe by `write(fd)`, read concurrently as the runner does."""
+
+    read_fd, write_fd = os.pipe()
+    received = bytearray()
+
+    def drain():
+        while data := os.read(read_fd, 65536):
+            received.extend(data)
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+
+    try:
+        write(write_fd)
+    finally:
+        os.close(write_fd)
+        reader.join()
+        os.close(read_fd)
+
+    return bytes(received)
+
+
+def frame(frame_type: FrameType, payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(frame_type, len(payload)) + payload
+
+
+class TestRoundTrip:
+    def test_result_is_reassembled_with_its_summary(self):
+        payload = b'[{"json":{"a":1}}]'
+        reader = ResultReader()
+
+        reader.feed(written(lambda fd: write_result(fd, payload, {"rss": 1})))
+
+        assert reader.is_complete
+        assert reader.payload == payload
+        assert reader.summary == {"rss": 1}
+
+    def test_result_larger_than_a_chunk_is_split_into_chunk_frames(self):
+        payload = os.urandom(2 * RESULT_CHUNK_SIZE + 1)
+        data = written(lambda fd: write_result(fd, payload, {}))
+
+        chunk_frames = 0
+        offset = 0
+        while offset < len(data):
+            frame_type, length = FRAME_HEADER.unpack_from(data, offset)
+            chunk_frames += frame_type == FrameType.CHUNK
+            offset += FRAME_HEADER.size + length
+
+        reader = ResultReader()
+        reader.feed(data)
+
+        assert chunk_frames == 3
+        assert reader.payload == payload
+
+    def test_empty_result_is_a_lone_end_frame(self):
+        data = written(lambda fd: write_result(fd, b"", {"error": {"message": "x"}}))
+        reader = ResultReader()
+
+        reader.feed(data)
+
+        assert data[0] == FrameType.END
+        assert reader.payload == b""
+        assert reader.summary == {"error": {"message": "x"}}
+
+    def test_streamed_chunks_are_kept_apart_in_order(self):
+        def write(fd):
+            write_chunk(fd, b"[1]")
+            write_chunk(fd, b"[2,3]")
+            write_result(fd, b"", {})
+
+        reader = ResultReader(stream=True)
+        reader.feed(written(write))
+
+        assert reader.chunks == [b"[1]", b"[2,3]"]
+        assert reader.payload == b""
+        assert reader.is_complete
+
+
+class TestReady:
+    def test_ready_frame_is_awaited(self):
+        read_fd, write_fd = os.pipe()
+
+        try:
+            write_ready(write_fd)
+            assert wait_ready(read_fd)
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+    def test_exit_before_ready_is_reported(self):
+        read_fd, write_fd = os.pipe()
+        os.close(write_fd)
+
+        try:
+            assert not wait_ready(read_fd)
+        finally:
+            os.close(read_fd)
+
+
+class TestPartialFrames:
+    def test_frames_fed_byte_by_byte_are_reassembled(self):
+        data = frame(FrameType.CHUNK, b"[1,2]") + frame(FrameType.END, b"{}")
+        reader = ResultReader()
+
+        for index in range(len(data)):
+            reader.feed(data[index : index + 1])
+            assert reader.is_complete == (index == len(data) - 1)
+
+        assert reader.payload == b"[1,2]"
+
+    @pytest.mark.parametrize("cut", [1, FRAME_HEADER.size, FRAME_HEADER.size + 2])
+    def test_truncated_frame_is_held_back(self, cut):
+        data = frame(FrameType.CHUNK, b"[1,2]")
+        reader = ResultReader(stream=True)
+
+        reader.feed(data[:cut])
+
+        assert reader.chunks == []
+        assert not reader.is_complete
+        assert reader.buffer == data[:cut]
+
+    def test_end_frame_missing_leaves_result_incomplete(self):
+        reader = ResultReader()
+
+        reader.feed(frame(FrameType.CHUNK, b"[1]"))
+
+        assert reader.payload == b"[1]"
+        assert not reader.is_complete
+
+
+class TestMalformedFrames:
+    def test_end_frame_with_invalid_summary_raises(self):
+        reader = ResultReader()
+
+        with pytest.raises(json.JSONDecodeError):
+            reader.feed(frame(FrameType.END, b"{not json"))
+
+        assert not reader.is_complete
+
+    def test_header_announcing_more_than_sent_never_completes(self):
+        reader = ResultReader()
+
+        reader.feed(FRAME_HEADER.pack(FrameType.END, 1024) + b"{}")
+
+        assert not reader.is_complete
+        assert reader.summary == {}
@@ -0,0 +1,232 @@
+import asyncio
+import json
+from typing import List
+
+import pytest
+
+from src.constants import RESULT_STREAMING, RUNNER_TASK_OFFERS
+from src.message_serde import MessageSerde
+from src.message_types import RunnerTaskDone, RunnerTaskError, RunnerTaskResultChunk
+from src.message_writer import MessagePriority, MessageWriter
+from src.message_types.broker import TaskSettings
+from src.task_executor import TaskExecutor
+from src.task_runner import TaskRunner, TaskRunnerOpts
+from tests.unit.fakes import SentMessages
+
+TASK_SETTINGS = TaskSettings(
+    code="return _items", node_mode="all_items", continue_on_fail=False, items=b"[]"
+)
+
+
+def registered_runner(opts: TaskRunnerOpts, capabilities: List[str]) -> TaskRunner:
+    runner = TaskRunner(opts)
+    runner.websocket_connection = object()
+    runner.message_writer = SentMessages()
+    runner.broker_capabilities = set(capabilities)
+    runner.is_registered = True
+    runner.registrations = 1
+    return runner
+
+
+class TestResultStream:
+    def test_chunks_are_framed_by_begin_and_end(self, task_runner_opts):
+        async def stream():
+            runner = registered_runner(task_runner_opts, [RESULT_STREAMING])
+            stream = runner._open_result_stream("t", TASK_SETTINGS)
+            await runner._send_result_chunk(stream, bytearray(b"[1,2]"))
+            await runner._send_result_chunk(stream, bytearray(b"[3]"))
+            await runner._end_result_stream(stream)
+            return runner.message_writer.messages
+
+        assert asyncio.run(stream()) == [
+            {"type": "runner:taskresultbegin", "taskId": "t"},
+            {
+                "type": "runner:taskresultchunk",
+                "taskId": "t",
+                "sequence": 0,
+                "items": [1, 2],
+            },
+            {
+                "type": "runner:taskresultchunk",
+                "taskId": "t",
+                "sequence": 1,
+                "items": [3],
+            },
+            {"type": "runner:taskresultend", "taskId": "t", "chunkCount": 2},
+        ]
+
+    def test_empty_result_is_begin_and_end(self, task_runner_opts):
+        async def stream():
+            runner = registered_runner(task_runner_opts, [RESULT_STREAMING])
+            stream = runner._open_result_stream("t", TASK_SETTINGS)
+            await runner._end_result_stream(stream)
+            return runner.message_writer.messages
+
+        assert asyncio.run(stream()) == [
+            {"type": "runner:taskresultbegin", "taskId": "t"},
+            {"type": "runner:taskresultend", "taskId": "t", "chunkCount": 0},
+        ]
+
+    def test_no_stream_unless_the_broker_agreed(self, task_runner_opts):
+        async def open_stream():
+            runner = registered_runner(task_runner_opts, [RUNNER_TASK_OFFERS])
+            return runner._open_result_stream("t", TASK_SETTINGS)
+
+        assert asyncio.run(open_stream()) is None
+
+
+class TestInterruptedResultStream:
+    def test_failed_chunk_fails_the_task_and_drops_the_rest(self, task_runner_opts):
+        async def stream():
+            runner = registered_runner(task_runner_opts, [RESULT_STREAMING])
+            stream = runner._open_result_stream("t", TASK_SETTINGS)
+            await runner._send_result_chunk(stream, bytearray(b"[1]"))
+            runner.message_writer.fail = True
+            await runner._send_result_chunk(stream, bytearray(b"[2]"))
+            runner.message_writer.fail = False
+            await runner._send_result_chunk(stream, bytearray(b"[3]"))
+            await runner._end_result_stream(stream)
+            return runner, stream
+
+        runner, stream = asyncio.run(stream())
+
+        assert stream.is_interrupted
+        # The error itself failed to send, so it waits for the next connection.
+        assert runner.message_writer.types == [
+            "runner:taskresultbegin",
+            "runner:taskresultchunk",
+        ]
+        assert len(runner.result_buffer) == 1
+
+    def test_stream_does_not_survive_a_reconnect(self, task_runner_opts):
+        async def stream():
+            runner = registered_runner(task_runner_opts, [RESULT_STREAMING])
+            stream = runner._open_result_stream("t", TASK_SETTINGS)
+            await runner._send_result_chunk(stream, bytearray(b"[1]"))
+            runner.registrations += 1
+            await runner._send_result_chunk(stream, bytearray(b"[2]"))
+            await runner._end_result_stream(stream)
+            return runner.message_writer.messages
+
+        messages = asyncio.run(stream())
+
+        assert [message["type"] for message in messages] == [
+            "runner:taskresultbegin",
+            "runner:taskresultchunk",
+            "runner:taskerror",
+        ]
+        assert messages[-1]["taskId"] == "t"
+
+
+class TestStreamedTaskOutcome:
+    @pytest.mark.parametrize("fail_task", [False, True])
+    def test_outcome_does_not_overtake_queued_stream_frames(
+        self, task_runner_opts, fail_task
+    ):
+        async def stream():
+            runner = registered_runner(task_runner_opts, [RESULT_STREAMING])
+            sent = []
+            socket_free = asyncio.Event()
+
+            async def send(data: bytes) -> None:
+                await socket_free.wait()
+                sent.append(json.loads(data)["type"])
+
+            runner.message_writer = MessageWriter(send, high_water_mark=1 << 20)
+            runner.message_writer.start()
+
+            stream = runner._open_result_stream("t", TASK_SETTINGS)
+            await runner._send_result_chunk(stream, bytearray(b"[1]"))
+            await runner._send_result_chunk(stream, bytearray(b"[2]"))
+            if fail_task:
+                outcome = RunnerTaskError(task_id="t", error={"message": "boom"})
+            else:
+                outcome = RunnerTaskDone(task_id="t", result=b"[1,2]")
+            await runner._send_task_outcome(outcome, stream)
+
+            socket_free.set()
+            await runner.message_writer.stop()
+            return sent
+
+        assert asyncio.run(stream()) == [
+            "runner:taskresultbegin",
+            "runner:taskresultchunk",
+            "runner:taskresultchunk",
+            "runner:taskerror" if fail_task else "runner:taskdone",
+        ]
+
+    def test_interrupted_stream_error_follows_queued_frames(self, task_runner_opts):
+        async def stream():
+            runner = registered_runner(task_runner_opts, [RESULT_STREAMING])
+            stream = runner._open_result_stream("t", TASK_SETTINGS)
+            await runner._send_result_chunk(stream, bytearray(b"[1]"))
+            await runner._interrupt_result_stream(stream)
+            return runner.message_writer
+
+        writer = asyncio.run(stream())
+
+        assert writer.types[-1] == "runner:taskerror"
+        assert writer.priorities[-1] == MessagePriority.BULK
+
+
+class TestResultChunkSplicing:
+    def test_items_are_spliced_into_the_envelope(self):
+        frame = MessageSerde.serialize_runner_message(
+            RunnerTaskResultChunk(
+                task_id="t", sequence=7, items=bytearray('[{"a":"é"}]'.encode())
+            )
+        )
+
+        assert json.loads(frame) == {
+            "type": "runner:taskresultchunk",
+            "taskId": "t",
+            "sequence": 7,
+            "items": [{"a": "é"}],
+        }
+
+    def test_items_are_spliced_into_a_msgpack_envelope(self):
+        msgpack = pytest.importorskip("msgpack")
+
+        frame = MessageSerde.serialize_runner_message(
+            RunnerTaskResultChunk(
+                task_id="t",
+                sequence=300,
+                items=msgpack.packb([{"a": b"\x00"}]),
+                wire_format="msgpack",
+            )
+        )
+
+        assert msgpack.unpackb(frame) == {
+            "type": "runner:taskresultchunk",
+            "taskId": "t",
+            "sequence": 300,
+            "items": [{"a": b"\x00"}],
+        }
+
+
+class TestResultBatches:
+    @pytest.mark.parametrize("count", [0, 1, 63, 64, 65, 5000])
+    def test_batches_hold_every_item_in_order(self, count):
+        result = [{"json": {"index": index}} for index in range(count)]
+
+        batches = list(TaskExecutor._encode_result_batches(result, "json"))
+
+        assert all(batch.startswith(b"[") and batch.endswith(b"]") for batch in batches)
+        assert [item for batch in batches for item in json.loads(batch)] == result
+
+    def test_single_returned_item_is_a_batch_of_one(self):
+        batches = list(TaskExecutor._encode_result_batches({"json": {}}, "json"))
+
+        assert batches == [b'[{"json":{}}]']
+
+    def test_unencodable_item_raises_after_earlier_batches(self):
+        def result():
+            for index in range(100):
+                yield {"json": {"index": index}}
+            yield {"json": object()}
+
+        batches = TaskExecutor._encode_result_batches(result(), "json")
+
+        assert len(json.loads(next(batches))) == 64
+        with pytest.raises(TypeError):
+            list(batches)
@@ -0,0 +1,241 @@
+import json
+import marshal
+import os
+
+import pytest
+
+from src.items_channel import release_items, write_items
+from src.result_channel import ResultReader
+from src.task_executor import TaskExecutor, WorkerTask
+
+
+class TestResultEncoding:
+    @pytest.mark.parametrize(
+        "result",
+        [
+            [],
+            [{"json": {"name": "Zoë", "tags": ["a"], "n": None}}],
+            [{"json": {"big": 2**70}}],  # beyond what fast backends encode
+        ],
+    )
+    def test_result_round_trips(self, result):
+        assert json.loads(TaskExecutor._encode_result(result, "json")) == result
+
+    def test_unencodable_result_raises(self):
+        with pytest.raises(TypeError):
+            TaskExecutor._encode_result([{"json": {"a": object()}}], "json")
+
+    def test_continue_on_fail_result_carries_the_message(self):
+        result = TaskExecutor.continue_on_fail_result("boom")
+
+        assert json.loads(result) == [{"json": {"error": "boom"}}]
+
+
+class TestJsonArrayJoining:
+    def test_chunk_results_are_joined_in_order(self):
+        joined = TaskExecutor._join_json_arrays(
+            [bytearray(b"[1,2]"), bytearray(b"[]"), bytearray(b'[{"a":3}]')]
+        )
+
+        assert json.loads(joined) == [1, 2, {"a": 3}]
+
+    def test_empty_chunk_results_join_to_an_empty_array(self):
+        assert TaskExecutor._join_json_arrays([bytearray(b"[]")] * 3) == b"[]"
+        assert TaskExecutor._join_json_arrays([]) == b"[]"
+
+
+class TestChunkDecoding:
+    @pytest.mark.parametrize("chunk_count", [1, 3])
+    def test_chunks_decode_their_share_of_forwarded_items(self, chunk_count):
+        items = [{"json": {"n": index}} for index in range(5)]
+        raw_items = memoryview(json.dumps(items).encode() + b"}}")
+
+        chunks = [
+            TaskExecutor._decode_chunk(
+                raw_items,
+                WorkerTask(
+                    code=b"",
+                    node_mode="per_item",
+                    items_segment="",
+                    items_size=len(raw_items),
+                    chunk_index=chunk_index,
+                    chunk_count=chunk_count,
+                ),
+            )
+            for chunk_index in range(chunk_count)
+        ]
+
+        assert [item for chunk, _ in chunks for item in chunk] == items
+        assert [first_index for _, first_index in chunks] == [
+            len(items) * chunk_index // chunk_count
+            for chunk_index in range(chunk_count)
+        ]
+
+    @pytest.mark.parametrize("chunk_count", [2, 3, 7])
+    def test_split_task_pairs_items_like_a_single_worker(self, chunk_count):
+        items = json.dumps([{"json": {"n": index}} for index in range(7)]).encode()
+        code = (
+            "n = _item['json']['n']\n"
+            "if n % 3 == 0:\n"
+            "    return None\n"
+            "return {'json': {'n': n}}"
+        )
+
+        def outputs(chunk_index: int, chunk_count: int):
+            reader = run_task(
+                items + b"}}",
+                code,
+                "per_item",
+                chunk_index=chunk_index,
+                chunk_count=chunk_count,
+            )
+            assert "error" not in reader.summary
+            return json.loads(reader.payload)
+
+        single = outputs(0, 1)
+        split = [
+            output
+            for chunk_index in range(chunk_count)
+            for output in outputs(chunk_index, chunk_count)
+        ]
+
+        assert split == single
+        assert [output["pairedItem"]["item"] for output in single] == [1, 2, 4, 5]
+
+
+def per_item(code: str, items, first_index: int = 0):
+    returned = TaskExecutor._per_item(
+        TaskExecutor._compile(code, "per_item"), items, first_index
+    )
+    return list(returned["result"])
+
+
+class TestPerItem:
+    ITEMS = [{"json": {"n": n}} for n in range(4)]
+
+    def test_outputs_are_paired_with_their_item(self):
+        outputs = per_item(
+            "return {'json': {'double': _item['json']['n'] * 2}}", self.ITEMS
+        )
+
+        assert outputs == [
+            {"json": {"double": n * 2}, "pairedItem": {"item": n}} for n in range(4)
+        ]
+
+    def test_pairing_starts_at_the_first_index_of_the_chunk(self):
+        outputs = per_item("return {'json': {}}", self.ITEMS[2:], first_index=2)
+
+        assert [output["pairedItem"] for output in outputs] == [
+            {"item": 2},
+            {"item": 3},
+        ]
+
+    def test_none_outputs_are_skipped(self):
+        code = "return None if _item['json']['n'] % 2 else {'json': _item['json']}"
+
+        outputs = per_item(code, self.ITEMS)
+
+        assert outputs == [
+            {"json": {"n": 0}, "pairedItem": {"item": 0}},
+            {"json": {"n": 2}, "pairedItem": {"item": 2}},
+        ]
+
+    def test_yielded_outputs_are_paired_with_the_item_that_yielded_them(self):
+        code = "for i in range(_item['json']['n']):\n    yield {'json': {'i': i}}"
+
+        outputs = per_item(code, self.ITEMS)
+
+        assert [output["pairedItem"]["item"] for output in outputs] == [
+            1,
+            2,
+            2,
+            3,
+            3,
+            3,
+        ]
+
+
+class TestCheckSyntax:
+    def test_valid_code_passes(self):
+        assert TaskExecutor.check_syntax("return _items", "all_items") is None
+
+    def test_syntax_error_points_into_the_code(self):
+        error = TaskExecutor.check_syntax("return (", "per_item")
+
+        assert error["message"].startswith("'(' was never closed")
+        assert "SyntaxError" in error["stack"]
+
+    def test_code_too_complex_to_compile_is_an_error(self):
+        error = TaskExecutor.check_syntax("x = " + "-" * 200_000 + "1", "all_items")
+
+        assert error is not None
+        assert error["message"].startswith("MemoryError")
+
+
+class TestCompileTask:
+    def test_workers_load_the_code_compiled_by_the_runner(self):
+        compiled_code, error = TaskExecutor.compile_task(
+            "return [{'json': {'n': len(_items)}}]", "all_items"
+        )
+
+        assert error is None
+        returned = TaskExecutor._all_items(marshal.loads(compiled_code), [{}, {}])
+        assert returned["result"] == [{"json": {"n": 2}}]
+
+    def test_code_that_does_not_compile_has_no_compiled_code(self):
+        compiled_code, error = TaskExecutor.compile_task("return (", "per_item")
+
+        assert compiled_code is None
+        assert error["message"].startswith("'(' was never closed")
+
+
+def run_task(items: bytes, code: str, node_mode: str, **fields) -> ResultReader:
+    """Run a task in this process as a worker would, returning the result it wrote."""
+
+    compiled_code, _ = TaskExecutor.compile_task(code, node_mode)
+    segment = write_items(items)
+    read_fd, write_fd = os.pipe()
+    reader = ResultReader(stream=fields.get("stream_result", False))
+
+    try:
+        TaskExecutor._run_task(
+            WorkerTask(
+                code=compiled_code,
+                node_mode=node_mode,
+                items_segment=segment.name,
+                items_size=len(items),
+                **fields,
+            ),
+            write_fd,
+        )
+        reader.feed(os.read(read_fd, 65536))
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+        release_items(segment)
+
+    return reader
+
+
+class TestRunTask:
+    @pytest.mark.parametrize("stream_result", [False, True])
+    def test_per_item_error_raised_while_encoding_is_a_task_error(self, stream_result):
+        # Per-item code runs as its result is encoded, so the error surfaces there.
+        reader = run_task(
+            b'[{"json":{}}]',
+            "raise ValueError('boom')",
+            "per_item",
+            stream_result=stream_result,
+        )
+
+        assert reader.is_complete
+        assert reader.summary["error"]["message"] == "boom"
+
+    @pytest.mark.parametrize("node_mode", ["all_items", "per_item"])
+    def test_malformed_items_are_a_task_error(self, node_mode):
+        reader = run_task(b'[{"json":{"a":', "return []", node_mode)
+
+        assert reader.is_complete
+        assert reader.payload == b""
+        assert "error" in reader.summary
+        assert "stack" in reader.summary["error"]
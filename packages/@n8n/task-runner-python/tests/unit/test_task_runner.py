@@ -0,0 +1,700 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from multiprocessing.shared_memory import SharedMemory
+from typing import List
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+import websockets
+
+from src import task_runner
+from src.constants import RUNNER_TASK_OFFERS, TASK_REJECTED_REASON_DRAINING
+from src.errors import WebsocketConnectionError
+from src.items_channel import SHARED_MEMORY_DIR, ItemsWriter, release_items
+from src.message_types import (
+    BrokerRunnerRegistered,
+    BrokerTaskCancel,
+    BrokerTaskOfferAccept,
+    BrokerTaskSettings,
+    RunnerTaskAccepted,
+    RunnerTaskDone,
+)
+from src.message_types.broker import TaskSettings
+from src.task_executor import TaskExecutor
+from src.task_runner import TaskOffer, TaskRunner
+from src.task_state import TaskState, TaskStatus
+from tests.unit.fakes import SentMessages
+
+FRAGMENT_SIZE = 16 * 1024
+
+
+class ConcurrencyError(RuntimeError):
+    pass
+
+
+class FragmentedConnection:
+    """Stands in for a websocket connection receiving each frame in fragments.
+
+    Like websockets, refuses to receive a message before the previous one was
+    read to its end.
+    """
+
+    def __init__(self, frames: List[bytes]):
+        self.frames = frames
+        self.is_reading = False
+
+    def recv_streaming(self, decode: bool):
+        if self.is_reading:
+            raise ConcurrencyError("Still reading the previous message")
+        return self._fragments(self.frames.pop(0))
+
+    async def _fragments(self, frame: bytes):
+        self.is_reading = True
+        for offset in range(0, len(frame), FRAGMENT_SIZE):
+            yield frame[offset : offset + FRAGMENT_SIZE]
+        self.is_reading = False
+
+
+@pytest.fixture(autouse=True)
+def no_leaked_segments():
+    """Fail tests that leave items segments behind in shared memory."""
+
+    def segments():
+        if not os.path.isdir(SHARED_MEMORY_DIR):
+            return set()
+        return {
+            name
+            for name in os.listdir(SHARED_MEMORY_DIR)
+            if name.startswith("n8n-items-")
+        }
+
+    before = segments()
+    yield
+    assert segments() <= before
+
+
+def task_settings_frame(task_id: str, node_mode: str = "runOnceForAllItems") -> bytes:
+    items = [{"json": {"index": index, "s": "x" * 100}} for index in range(2000)]
+    return json.dumps(
+        {
+            "type": "broker:tasksettings",
+            "taskId": task_id,
+            "settings": {
+                "code": "return _items",
+                "nodeMode": node_mode,
+                "continueOnFail": False,
+                "items": items,
+            },
+        }
+    ).encode()
+
+
+def receive_all(runner: TaskRunner, count: int):
+    """Receive `count` messages, each as the message or the error receiving it raised."""
+
+    async def receive():
+        received = []
+        for _ in range(count):
+            try:
+                received.append(await runner._receive_message())
+            except Exception as e:
+                received.append(e)
+        return received
+
+    return asyncio.run(receive())
+
+
+class TestReceiveMessage:
+    def test_items_of_a_waiting_task_are_streamed_to_shared_memory(
+        self, task_runner_opts
+    ):
+        frame = task_settings_frame("t")
+        runner = TaskRunner(task_runner_opts)
+        runner.websocket_connection = FragmentedConnection([frame])
+        runner.running_tasks["t"] = TaskState("t")
+
+        [message] = receive_all(runner, 1)
+
+        assert isinstance(message.settings.items, SharedMemory)
+        try:
+            segment = SharedMemory(message.settings.items.name, track=False)
+            items = TaskExecutor._decode_items(segment.buf[: segment.size])
+            assert items == json.loads(frame)["settings"]["items"]
+            del items
+            segment.close()
+        finally:
+            release_items(message.settings.items)
+
+    def test_items_of_an_unknown_task_are_dropped(self, task_runner_opts):
+        runner = TaskRunner(task_runner_opts)
+        runner.websocket_connection = FragmentedConnection([task_settings_frame("t")])
+
+        [message] = receive_all(runner, 1)
+
+        assert message.task_id == "t"
+        assert message.settings.items == b""
+
+    def test_malformed_fragmented_message_is_read_to_its_end(self, task_runner_opts):
+        runner = TaskRunner(task_runner_opts)
+        runner.websocket_connection = FragmentedConnection(
+            [
+                task_settings_frame("bad", node_mode="runOnceForSomeItems"),
+                task_settings_frame("good"),
+                b'{"type":"broker:taskcancel","taskId":"good","reason":"r"}',
+            ]
+        )
+
+        bad, good, cancel = receive_all(runner, 3)
+
+        assert isinstance(bad, ValueError)
+        assert isinstance(good, BrokerTaskSettings) and good.task_id == "good"
+        assert isinstance(cancel, BrokerTaskCancel)
+
+    def test_failed_items_write_leaves_the_connection_readable(
+        self, task_runner_opts, monkeypatch
+    ):
+        def fail(self, data):
+            raise OSError("No space left on device")
+
+        monkeypatch.setattr(ItemsWriter, "write", fail)
+        runner = TaskRunner(task_runner_opts)
+        runner.websocket_connection = FragmentedConnection(
+            [
+                task_settings_frame("t"),
+                b'{"type":"broker:taskcancel","taskId":"t","reason":"r"}',
+            ]
+        )
+        runner.running_tasks["t"] = TaskState("t")
+
+        failed, cancel = receive_all(runner, 2)
+
+        assert isinstance(failed, OSError)
+        assert isinstance(cancel, BrokerTaskCancel)
+
+
+class TestHandleTaskSettings:
+    @pytest.mark.parametrize("code", ["return (", "x = " + "-" * 200_000 + "1"])
+    def test_code_that_does_not_compile_fails_the_task(self, task_runner_opts, code):
+        async def handle():
+            runner = TaskRunner(task_runner_opts)
+            runner.websocket_connection = object()
+            runner.message_writer = SentMessages()
+            runner.is_registered = True
+            runner.running_tasks["t"] = TaskState("t")
+
+            await runner._handle_task_settings(
+                BrokerTaskSettings(
+                    task_id="t",
+                    settings=TaskSettings(
+                        code=code,
+                        node_mode="all_items",
+                        continue_on_fail=False,
+                        items=b"[]",
+                    ),
+                )
+            )
+            return runner
+
+        runner = asyncio.run(handle())
+
+        assert runner.running_tasks == {}
+        assert runner.offers_needed.is_set()
+        [error] = runner.message_writer.messages
+        assert error["type"] == "runner:taskerror"
+        assert error["taskId"] == "t"
+
+
+class TestExecuteTask:
+    def test_cancel_while_waiting_for_a_worker_fails_the_task(self, task_runner_opts):
+        async def execute():
+            runner = TaskRunner(task_runner_opts)
+            runner.websocket_connection = object()
+            runner.message_writer = SentMessages()
+            runner.is_registered = True
+            runner.running_tasks["t"] = task_state = TaskState("t")
+            task_state.status = TaskStatus.RUNNING
+
+            async def acquire():
+                await runner._handle_task_cancel(
+                    BrokerTaskCancel(task_id="t", reason="x")
+                )
+                return Mock()
+
+            runner.worker_pool.acquire = acquire
+            runner.worker_pool.release = Mock()
+
+            await runner._execute_task(
+                "t",
+                TaskSettings(
+                    code="return _items",
+                    node_mode="all_items",
+                    continue_on_fail=False,
+                    items=b"[]",
+                ),
+                compiled_code=b"",
+            )
+            return runner
+
+        runner = asyncio.run(execute())
+
+        assert runner.running_tasks == {}
+        [error] = runner.message_writer.messages
+        assert error["type"] == "runner:taskerror"
+        assert "cancelled" in error["error"]["message"]
+        runner.worker_pool.release.assert_called_once()
+
+
+class TestDispatchMessage:
+    def settings(self, task_id: str) -> BrokerTaskSettings:
+        return BrokerTaskSettings(
+            task_id=task_id,
+            settings=TaskSettings(
+                code="return _items",
+                node_mode="all_items",
+                continue_on_fail=False,
+                items=b"[]",
+            ),
+        )
+
+    def dispatch(self, task_runner_opts, messages):
+        """Dispatch `messages`, holding the handling of settings until all are dispatched."""
+
+        async def run():
+            runner = TaskRunner(task_runner_opts)
+            settings_held = asyncio.Event()
+            handled = []
+
+            async def handle(message):
+                if isinstance(message, BrokerTaskSettings):
+                    await settings_held.wait()
+                handled.append((type(message).__name__, message.task_id))
+
+            runner._handle_message = handle
+
+            for message in messages:
+                runner._dispatch_message(message)
+
+            await asyncio.sleep(0)
+            handled_while_held = list(handled)
+            settings_held.set()
+            await asyncio.gather(*runner.message_handlers)
+
+            return runner, handled_while_held, handled
+
+        return asyncio.run(run())
+
+    def test_messages_for_a_task_are_handled_in_arrival_order(self, task_runner_opts):
+        runner, handled_while_held, handled = self.dispatch(
+            task_runner_opts,
+            [self.settings("a"), BrokerTaskCancel(task_id="a", reason="x")],
+        )
+
+        assert handled_while_held == []
+        assert handled == [("BrokerTaskSettings", "a"), ("BrokerTaskCancel", "a")]
+        assert runner.task_message_tails == {}
+
+    def test_control_messages_for_other_tasks_overtake_settings(self, task_runner_opts):
+        _, handled_while_held, handled = self.dispatch(
+            task_runner_opts,
+            [self.settings("a"), BrokerTaskCancel(task_id="b", reason="x")],
+        )
+
+        assert handled_while_held == [("BrokerTaskCancel", "b")]
+        assert handled == [("BrokerTaskCancel", "b"), ("BrokerTaskSettings", "a")]
+
+
+class Disconnected(Exception):
+    """Ends a test's connection loop, as the runner never stops reconnecting on its own."""
+
+
+def closed_error():
+    return websockets.ConnectionClosedError(None, None)
+
+
+class TestConnectionLoop:
+    def run_start(self, task_runner_opts, closes):
+        """Run `start`, each listen raising the next of `closes`, or returning for None."""
+
+        async def run():
+            runner = TaskRunner(task_runner_opts)
+            runner.worker_pool.start = Mock()
+            runner.message_writer.start = Mock()
+            runner._connect = AsyncMock()
+            runner._listen_for_messages = AsyncMock(side_effect=closes)
+            runner._handle_disconnect = AsyncMock()
+            runner._reconnect = AsyncMock()
+
+            try:
+                await runner.start()
+            except Exception as e:
+                return runner, e
+            return runner, None
+
+        return asyncio.run(run())
+
+    def test_closed_connection_without_an_auth_token_stops_the_runner(
+        self, task_runner_opts
+    ):
+        runner, error = self.run_start(task_runner_opts, [None])
+
+        assert error is None
+        runner._reconnect.assert_not_called()
+
+    def test_lost_connection_without_an_auth_token_fails(self, task_runner_opts):
+        runner, error = self.run_start(task_runner_opts, [closed_error()])
+
+        assert isinstance(error, WebsocketConnectionError)
+        runner._reconnect.assert_not_called()
+
+    def test_lost_connection_with_an_auth_token_reconnects(self, task_runner_opts):
+        task_runner_opts.auth_token = "auth"
+        runner, error = self.run_start(
+            task_runner_opts, [closed_error(), None, Disconnected()]
+        )
+
+        assert isinstance(error, Disconnected)
+        assert runner._handle_disconnect.await_count == 2
+        assert runner._reconnect.await_count == 2
+
+
+class TestReconnect:
+    def test_backs_off_exponentially_up_to_the_max_delay(
+        self, task_runner_opts, monkeypatch
+    ):
+        delays = []
+
+        async def sleep(delay):
+            delays.append(delay)
+
+        monkeypatch.setattr(task_runner.asyncio, "sleep", sleep)
+        monkeypatch.setattr(task_runner.random, "uniform", lambda low, high: high)
+
+        async def run():
+            runner = TaskRunner(task_runner_opts)
+            failures = [OSError("refused")] * 8
+            runner._fetch_grant_token = AsyncMock(side_effect=[*failures, "grant"])
+            runner._connect = AsyncMock()
+
+            await runner._reconnect()
+            return runner
+
+        runner = asyncio.run(run())
+
+        assert delays == [0.5, 1, 2, 4, 8, 16, 30, 30, 30]
+        assert runner.grant_token == "grant"
+        runner._connect.assert_awaited_once()
+
+    def test_failed_connect_is_retried_with_a_fresh_grant_token(
+        self, task_runner_opts, monkeypatch
+    ):
+        async def sleep(delay):
+            pass
+
+        monkeypatch.setattr(task_runner.asyncio, "sleep", sleep)
+
+        async def run():
+            runner = TaskRunner(task_runner_opts)
+            runner._fetch_grant_token = AsyncMock(side_effect=["first", "second"])
+            runner._connect = AsyncMock(
+                side_effect=[WebsocketConnectionError(""), None]
+            )
+
+            await runner._reconnect()
+            return runner
+
+        runner = asyncio.run(run())
+
+        assert runner.grant_token == "second"
+        assert runner._connect.await_count == 2
+
+
+class TestResultBuffering:
+    def done(self, task_id: str) -> RunnerTaskDone:
+        return RunnerTaskDone(task_id=task_id, result=b"[]")
+
+    def test_results_are_buffered_while_unregistered_and_redelivered(
+        self, task_runner_opts
+    ):
+        async def run():
+            runner = TaskRunner(task_runner_opts)
+            runner.websocket_connection = object()
+            runner.message_writer = SentMessages()
+            runner.is_draining = True  # no offers
+
+            await runner._send_message(self.done("a"))
+            await runner._send_message(self.done("b"))
+            buffered = len(runner.result_buffer)
+            sent_before = list(runner.message_writer.messages)
+
+            await runner._handle_runner_registered(BrokerRunnerRegistered())
+            return runner, buffered, sent_before
+
+        runner, buffered, sent_before = asyncio.run(run())
+
+        assert buffered == 2
+        assert sent_before == []
+        assert [message["taskId"] for message in runner.message_writer.messages] == [
+            "a",
+            "b",
+        ]
+        assert len(runner.result_buffer) == 0
+
+    def test_results_that_fail_to_send_are_buffered(self, task_runner_opts):
+        async def run():
+            runner = TaskRunner(task_runner_opts)
+            runner.websocket_connection = object()
+            runner.message_writer = SentMessages()
+            runner.message_writer.fail = True
+            runner.is_registered = True
+
+            await runner._send_message(self.done("a"))
+            await runner._send_message(RunnerTaskAccepted(task_id="b"))
+            return runner
+
+        runner = asyncio.run(run())
+
+        assert len(runner.result_buffer) == 1
+        assert runner.message_writer.messages == [
+            {"taskId": "b", "type": "runner:taskaccepted"}
+        ]
+
+
+def registered_runner(opts) -> TaskRunner:
+    runner = TaskRunner(opts)
+    runner.websocket_connection = object()
+    runner.message_writer = SentMessages()
+    runner.is_registered = True
+    return runner
+
+
+class TestDrain:
+    def test_accepts_are_rejected_while_draining(self, task_runner_opts):
+        async def run():
+            runner = registered_runner(task_runner_opts)
+            runner.open_offers["o"] = TaskOffer("o", time.time() + 60)
+            runner.start_task = asyncio.create_task(asyncio.sleep(60))
+
+            runner.drain()
+            await runner._handle_task_offer_accept(
+                BrokerTaskOfferAccept(task_id="t", offer_id="o")
+            )
+            await runner.drain_task
+            return runner
+
+        runner = asyncio.run(run())
+
+        assert runner.running_tasks == {}
+        assert runner.message_writer.messages == [
+            {
+                "taskId": "t",
+                "reason": TASK_REJECTED_REASON_DRAINING,
+                "type": "runner:taskrejected",
+            }
+        ]
+
+    def test_offers_stop_and_are_not_restarted_on_registration(self, task_runner_opts):
+        async def run():
+            runner = registered_runner(task_runner_opts)
+            runner.running_tasks["t"] = TaskState("t")
+            runner.start_task = asyncio.create_task(asyncio.sleep(60))
+            await runner._handle_runner_registered(BrokerRunnerRegistered())
+            offers_coroutine = runner.offers_coroutine
+            await asyncio.sleep(0)
+            offers_before = len(runner.message_writer.messages)
+
+            runner.drain()
+            await asyncio.sleep(0)
+            await runner._handle_runner_registered(BrokerRunnerRegistered())
+            runner.offers_needed.set()
+            await asyncio.sleep(0)
+
+            result = (
+                runner,
+                offers_coroutine,
+                offers_before,
+                len(runner.message_writer.messages),
+            )
+            runner.drain_task.cancel()
+            runner.start_task.cancel()
+            return result
+
+        runner, offers_coroutine, offers_before, offers_after = asyncio.run(run())
+
+        assert offers_before == 1
+        assert offers_after == offers_before
+        assert offers_coroutine.done()
+        assert runner.offers_coroutine is offers_coroutine
+        assert not runner.can_send_offers
+
+    def test_runner_stops_once_running_tasks_finish(self, task_runner_opts):
+        task_runner_opts.drain_timeout = 60
+
+        async def run():
+            runner = registered_runner(task_runner_opts)
+            runner.running_tasks["a"] = TaskState("a")
+            runner.running_tasks["b"] = TaskState("b")
+            runner.start_task = start_task = asyncio.create_task(asyncio.sleep(60))
+
+            runner.drain()
+            states = []
+            for task_id in ["a", "b"]:
+                await asyncio.sleep(0)
+                states.append(start_task.cancelling() > 0 or start_task.done())
+                runner._finish_task(task_id, [])
+
+            await runner.drain_task
+            return states, start_task
+
+        states, start_task = asyncio.run(run())
+
+        assert states == [False, False]
+        assert start_task.cancelled()
+
+    def test_runner_stops_once_the_drain_timeout_expires(self, task_runner_opts):
+        task_runner_opts.drain_timeout = 0.01
+
+        async def run():
+            runner = registered_runner(task_runner_opts)
+            runner.running_tasks["a"] = TaskState("a")
+            runner.start_task = start_task = asyncio.create_task(asyncio.sleep(60))
+
+            runner.drain()
+            await runner.drain_task
+            return runner, start_task
+
+        runner, start_task = asyncio.run(run())
+
+        assert start_task.cancelled()
+        assert "a" in runner.running_tasks
+
+
+async def until(condition, timeout: float = 0.5) -> None:
+    """Wait for `condition` to hold, well within the offer safety interval."""
+
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.001)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+class TestOffersLoop:
+    def offer_ids(self, runner: TaskRunner):
+        return [
+            message["offerId"]
+            for message in runner.message_writer.messages
+            if message["type"] == "runner:taskoffer"
+        ]
+
+    def test_offer_is_sent_as_soon_as_a_slot_frees_up(self, task_runner_opts):
+        async def run():
+            runner = registered_runner(task_runner_opts)
+            runner.running_tasks["a"] = TaskState("a")
+            runner.running_tasks["b"] = TaskState("b")
+            runner.can_send_offers = True
+            loop = asyncio.create_task(runner._send_offers_loop())
+
+            await asyncio.sleep(0.01)
+            offers_at_capacity = list(self.offer_ids(runner))
+
+            runner._finish_task("a", [])
+            await until(lambda: self.offer_ids(runner))
+
+            loop.cancel()
+            return runner, offers_at_capacity
+
+        runner, offers_at_capacity = asyncio.run(run())
+
+        assert offers_at_capacity == []
+        assert list(runner.open_offers) == self.offer_ids(runner)
+
+    def test_expired_offers_are_replaced_when_they_expire(
+        self, task_runner_opts, monkeypatch
+    ):
+        monkeypatch.setattr(task_runner, "OFFER_VALIDITY", 20)
+        monkeypatch.setattr(task_runner, "OFFER_VALIDITY_MAX_JITTER", 0)
+        monkeypatch.setattr(task_runner, "OFFER_VALIDITY_LATENCY_BUFFER", 0)
+        task_runner_opts.max_concurrency = 1
+
+        async def run():
+            runner = registered_runner(task_runner_opts)
+            runner.can_send_offers = True
+            loop = asyncio.create_task(runner._send_offers_loop())
+
+            await until(lambda: len(self.offer_ids(runner)) == 2)
+
+            loop.cancel()
+            return runner
+
+        runner = asyncio.run(run())
+
+        first, second = self.offer_ids(runner)
+        assert first != second
+        assert first not in runner.open_offers
+
+
+class TestSendOffers:
+    @pytest.mark.parametrize(
+        "capabilities, max_concurrency, expected_types",
+        [
+            (
+                {RUNNER_TASK_OFFERS},
+                3,
+                ["runner:taskoffers"],
+            ),
+            (
+                set(),
+                3,
+                ["runner:taskoffer", "runner:taskoffer", "runner:taskoffer"],
+            ),
+            (
+                {RUNNER_TASK_OFFERS},
+                1,
+                ["runner:taskoffer"],
+            ),
+        ],
+    )
+    def test_offers_are_batched_only_when_agreed_and_more_than_one(
+        self, task_runner_opts, capabilities, max_concurrency, expected_types
+    ):
+        task_runner_opts.max_concurrency = max_concurrency
+
+        async def run():
+            runner = registered_runner(task_runner_opts)
+            runner.broker_capabilities = capabilities
+            runner.can_send_offers = True
+            await runner._send_offers()
+            return runner
+
+        runner = asyncio.run(run())
+
+        assert runner.message_writer.types == expected_types
+        offer_ids = [
+            offer["offerId"]
+            for message in runner.message_writer.messages
+            for offer in message.get("offers", [message])
+        ]
+        assert sorted(offer_ids) == sorted(runner.open_offers)
+        assert all(
+            message["taskType"] == "python"
+            for message in runner.message_writer.messages
+        )
+
+
+class TestStop:
+    def test_code_cache_stats_are_logged(self, task_runner_opts, caplog, monkeypatch):
+        monkeypatch.setattr(TaskExecutor.code_cache, "hits", 3)
+        monkeypatch.setattr(TaskExecutor.code_cache, "misses", 2)
+
+        async def run():
+            runner = TaskRunner(task_runner_opts)
+            runner.worker_pool.shutdown = AsyncMock()
+            await runner.stop()
+
+        with caplog.at_level(logging.DEBUG):
+            asyncio.run(run())
+
+        assert "Code cache hits: 3, misses: 2" in caplog.messages
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from src.errors import TaskProcessExitError
+from src.task_executor import TaskExecutor
+from src.worker_pool import Worker, WorkerPool, WorkerPoolOpts
+from tests.unit.fakes import StartedProcess
+
+
+class StartRecorder:
+    """Stands in for `WorkerPool._start_worker`, recording the thread each start runs on."""
+
+    def __init__(self):
+        self.threads = []
+        self.error = None
+        self.gate = threading.Event()  # cleared to hold starts back
+        self.gate.set()
+
+    def __call__(self) -> Worker:
+        self.gate.wait()
+        self.threads.append(threading.current_thread())
+
+        if self.error is not None:
+            raise self.error
+
+        return Worker(StartedProcess(len(self.threads)), Mock(), Mock())
+
+
+@pytest.fixture
+def starts(monkeypatch):
+    recorder = StartRecorder()
+    monkeypatch.setattr(WorkerPool, "_start_worker", lambda self: recorder())
+    return recorder
+
+
+def slow_to_import(task_conn, result_conn):
+    time.sleep(0.2)
+    TaskExecutor.run_worker(task_conn, result_conn)
+
+
+def exit_before_ready(task_conn, result_conn):
+    raise SystemExit(3)
+
+
+def make_pool(size: int, target=print) -> WorkerPool:
+    opts = WorkerPoolOpts(
+        size=size,
+        max_tasks=0,
+        max_rss=0,
+        max_age=0,
+        start_method="spawn",
+        preload_modules=[],
+    )
+    return WorkerPool(target, opts)
+
+
+async def settle(pool: WorkerPool) -> None:
+    while pool.refilling is not None:
+        await asyncio.sleep(0.001)
+
+
+class TestStarting:
+    def test_workers_start_off_the_event_loop(self, starts):
+        async def run():
+            pool = make_pool(2)
+            pool.start()
+
+            assert pool.idle_workers == []
+
+            await settle(pool)
+            return pool
+
+        pool = asyncio.run(run())
+
+        assert len(pool.idle_workers) == 2
+        assert threading.main_thread() not in starts.threads
+
+    def test_retired_workers_are_replaced(self, starts):
+        async def run():
+            pool = make_pool(1)
+            worker = await pool.acquire()
+            worker.process.terminate()
+            pool.release(worker)
+            await settle(pool)
+            return pool, worker
+
+        pool, worker = asyncio.run(run())
+
+        assert worker.process.exitcode is not None
+        assert [worker.process.pid for worker in pool.idle_workers] == [2]
+
+
+class TestStartWorker:
+    def test_returns_once_the_worker_is_ready(self):
+        started_at = time.monotonic()
+        worker = make_pool(1, slow_to_import)._start_worker()
+
+        try:
+            assert time.monotonic() - started_at >= 0.2
+            assert worker.is_alive()
+            assert not worker.result_conn.poll()  # ready frame already consumed
+        finally:
+            worker.task_conn.close()
+            worker.process.join()
+
+        assert worker.process.exitcode == 0
+
+    def test_worker_exiting_before_ready_raises(self):
+        with pytest.raises(TaskProcessExitError) as exc_info:
+            make_pool(1, exit_before_ready)._start_worker()
+
+        assert exc_info.value.exit_code == 3
+
+
+class TestAcquire:
+    def test_waits_for_a_warm_worker_when_none_is_idle(self, starts):
+        async def run():
+            pool = make_pool(1)
+            pool.start()
+            return await pool.acquire(), pool
+
+        worker, pool = asyncio.run(run())
+
+        assert worker.process.pid == 1
+        assert pool.busy_workers == {worker}
+
+    def test_starts_one_beyond_the_pool_size_once_all_are_busy(self, starts):
+        async def run():
+            pool = make_pool(1)
+            first = await pool.acquire()
+            second = await pool.acquire()
+            return pool, first, second
+
+        pool, first, second = asyncio.run(run())
+
+        assert first is not second
+        assert pool.busy_workers == {first, second}
+
+    def test_released_worker_goes_to_the_longest_waiting_acquire(self, starts):
+        async def run():
+            pool = make_pool(1)
+            first = await pool.acquire()
+            starts.gate.clear()
+
+            waiting = [asyncio.create_task(pool.acquire()) for _ in range(2)]
+            await asyncio.sleep(0)
+            pool.release(first)
+
+            handed_out = await waiting[0]
+            starts.gate.set()
+            return handed_out, await waiting[1], first
+
+        handed_out, started, first = asyncio.run(run())
+
+        assert handed_out is first
+        assert started is not first
+
+    def test_failure_to_start_fails_the_waiting_acquire(self, starts):
+        starts.error = OSError("no more processes")
+
+        async def run():
+            pool = make_pool(1)
+            await pool.acquire()
+
+        with pytest.raises(OSError, match="no more processes"):
+            asyncio.run(run())
+
+
+class TestAcquireIdle:
+    def test_hands_out_only_idle_workers(self, starts):
+        async def run():
+            pool = make_pool(2)
+            pool.start()
+            await settle(pool)
+
+            workers = pool.acquire_idle(3)
+            started = len(starts.threads)
+            return pool, workers, started
+
+        pool, workers, started = asyncio.run(run())
+
+        assert len(workers) == 2
+        assert started == 2
+        assert pool.busy_workers == set(workers)
+
+
+class TestShutdown:
+    def test_retires_workers_started_during_shutdown(self, starts):
+        async def run():
+            pool = make_pool(2)
+            pool.start()
+            await pool.shutdown()
+            return pool
+
+        pool = asyncio.run(run())
+
+        assert pool.idle_workers == []
+        assert pool.refilling is None
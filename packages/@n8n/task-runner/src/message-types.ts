@@ -15,6 +15,8 @@ export namespace BrokerMessage {
 
 		export interface RunnerRegistered {
 			type: 'broker:runnerregistered';
+			/** Protocol extensions requested by the runner that the broker supports. */
+			capabilities?: string[];
 		}
 
 		export interface TaskOfferAccept {
@@ -171,6 +173,8 @@ export namespace RunnerMessage {
 			type: 'runner:info';
 			name: string;
 			types: string[];
+			/** Protocol extensions the runner supports, e.g. `runner:taskoffers`. */
+			capabilities?: string[];
 		}
 
 		export interface TaskAccepted {
@@ -209,6 +213,13 @@ export namespace RunnerMessage {
 			validFor: number;
 		}
 
+		/** Several offers in one message, if the broker agreed to the `runner:taskoffers` capability. */
+		export interface TaskOffers {
+			type: 'runner:taskoffers';
+			taskType: string;
+			offers: Array<Pick<TaskOffer, 'offerId' | 'validFor'>>;
+		}
+
 		export interface TaskDataRequest {
 			type: 'runner:taskdatarequest';
 			taskId: string;
@@ -251,6 +262,7 @@ export namespace RunnerMessage {
 			| TaskRejected
 			| TaskDeferred
 			| TaskOffer
+			| TaskOffers
 			| RPC
 			| TaskDataRequest
 			| NodeTypesRequest;
@@ -82,5 +82,28 @@ describe('TaskBrokerWsServer', () => {
 				'{"type":"broker:taskdataresponse","taskId":"taskId","requestId":"requestId","data":{"circular":"[Circular Reference]"}}',
 			);
 		});
+
+		it('should send a large message as several fragments', () => {
+			const server = new TaskBrokerWsServer(mock(), mock(), mock(), mock(), mock());
+			const ws = mock<WebSocket>();
+			server.runnerConnections.set('test-runner', ws);
+
+			const message = {
+				type: 'broker:tasksettings' as const,
+				taskId: 'taskId',
+				settings: { items: 'a'.repeat(2.5 * 1024 * 1024) },
+			};
+
+			server.sendMessage('test-runner', message);
+
+			expect(ws.send).toHaveBeenCalledTimes(3);
+			expect(ws.send.mock.calls.map(([, options]) => options)).toEqual([
+				{ binary: false, fin: false },
+				{ binary: false, fin: false },
+				{ binary: false, fin: true },
+			]);
+			const sent = Buffer.concat(ws.send.mock.calls.map(([data]) => data as Buffer));
+			expect(sent.toString()).toBe(JSON.stringify(message));
+		});
 	});
 });
@@ -106,6 +106,18 @@ describe('TaskBroker', () => {
 			expect(knownRunners.get(runnerId)?.messageCallback).toEqual(messageCallback);
 		});
 
+		it('should agree to supported capabilities requested by the runner', () => {
+			const runner = mock<TaskRunner>({ id: 'runner1' });
+			const messageCallback = jest.fn();
+
+			taskBroker.registerRunner(runner, messageCallback, ['runner:taskoffers', 'unknown']);
+
+			expect(messageCallback).toHaveBeenCalledWith({
+				type: 'broker:runnerregistered',
+				capabilities: ['runner:taskoffers'],
+			});
+		});
+
 		it('should send node types to runner', () => {
 			const runnerId = 'runner1';
 			const runner = mock<TaskRunner>({ id: runnerId });
@@ -688,6 +700,41 @@ describe('TaskBroker', () => {
 				validUntil: 0n,
 			});
 		});
+
+		it('should handle `runner:taskoffers` message', async () => {
+			const runnerId = 'runner1';
+			const message: RunnerMessage.ToBroker.TaskOffers = {
+				type: 'runner:taskoffers',
+				taskType: 'taskType1',
+				offers: [
+					{ offerId: 'offer1', validFor: 1000 },
+					{ offerId: 'offer2', validFor: -1 },
+				],
+			};
+
+			taskBroker.registerRunner(mock<TaskRunner>({ id: runnerId }), jest.fn());
+
+			await taskBroker.onRunnerMessage(runnerId, message);
+
+			const offers = taskBroker.getPendingTaskOffers();
+
+			expect(offers).toHaveLength(2);
+			expect(offers[0]).toEqual(
+				expect.objectContaining({
+					runnerId,
+					taskType: message.taskType,
+					offerId: 'offer1',
+					validFor: 1000,
+				}),
+			);
+			expect(offers[1]).toEqual({
+				runnerId,
+				taskType: message.taskType,
+				offerId: 'offer2',
+				validFor: -1,
+				validUntil: 0n,
+			});
+		});
 	});
 
 	describe('onRequesterMessage', () => {
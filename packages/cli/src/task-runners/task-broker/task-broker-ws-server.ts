@@ -18,6 +18,9 @@ import { TaskRunnerLifecycleEvents } from '@/task-runners/task-runner-lifecycle-
 
 import { TaskBroker, type MessageCallback, type TaskRunner } from './task-broker.service';
 
+/** Messages larger than this are sent as several websocket frames of this size */
+const MESSAGE_FRAGMENT_SIZE = 1024 * 1024;
+
 function heartbeat(this: WebSocket) {
 	this.isAlive = true;
 }
@@ -88,7 +91,23 @@ export class TaskBrokerWsServer {
 	}
 
 	sendMessage(id: TaskRunner['id'], message: BrokerMessage.ToRunner.All) {
-		this.runnerConnections.get(id)?.send(jsonStringify(message, { replaceCircularRefs: true }));
+		const connection = this.runnerConnections.get(id);
+		if (!connection) return;
+
+		const data = jsonStringify(message, { replaceCircularRefs: true });
+		if (data.length <= MESSAGE_FRAGMENT_SIZE) {
+			connection.send(data);
+			return;
+		}
+
+		// Fragment large messages, e.g. task settings, so the runner can handle them as they arrive
+		const buffer = Buffer.from(data);
+		for (let offset = 0; offset < buffer.length; offset += MESSAGE_FRAGMENT_SIZE) {
+			connection.send(buffer.subarray(offset, offset + MESSAGE_FRAGMENT_SIZE), {
+				binary: false,
+				fin: offset + MESSAGE_FRAGMENT_SIZE >= buffer.length,
+			});
+		}
 	}
 
 	add(id: TaskRunner['id'], connection: WebSocket) {
@@ -125,6 +144,7 @@ export class TaskBrokerWsServer {
 							name: message.name,
 						},
 						this.sendMessage.bind(this, id) as MessageCallback,
+						message.capabilities,
 					);
 
 					this.logger.info(`Registered runner "${message.name}" (${id}) `);
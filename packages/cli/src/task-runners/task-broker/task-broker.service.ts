@@ -17,6 +17,9 @@ import { TaskRunnerAcceptTimeoutError } from '@/task-runners/task-broker/errors/
 import { TaskRunnerExecutionTimeoutError } from '@/task-runners/task-broker/errors/task-runner-execution-timeout.error';
 import { TaskRunnerLifecycleEvents } from '@/task-runners/task-runner-lifecycle-events';
 
+/** Protocol extensions the broker agrees to when a runner requests them in `runner:info`. */
+const BROKER_CAPABILITIES = ['runner:taskoffers'];
+
 export interface TaskRunner {
 	id: string;
 	name?: string;
@@ -108,9 +111,20 @@ export class TaskBroker {
 		}
 	}
 
-	registerRunner(runner: TaskRunner, messageCallback: MessageCallback) {
+	registerRunner(
+		runner: TaskRunner,
+		messageCallback: MessageCallback,
+		capabilities: string[] = [],
+	) {
 		this.knownRunners.set(runner.id, { runner, messageCallback });
-		void this.knownRunners.get(runner.id)!.messageCallback({ type: 'broker:runnerregistered' });
+
+		const agreedCapabilities = capabilities.filter((capability) =>
+			BROKER_CAPABILITIES.includes(capability),
+		);
+		void this.knownRunners.get(runner.id)!.messageCallback({
+			type: 'broker:runnerregistered',
+			...(agreedCapabilities.length > 0 ? { capabilities: agreedCapabilities } : {}),
+		});
 	}
 
 	deregisterRunner(runnerId: string, error: Error) {
@@ -167,16 +181,13 @@ export class TaskBroker {
 				this.handleRunnerDeferred(message.taskId);
 				break;
 			case 'runner:taskoffer':
-				this.taskOffered({
-					runnerId,
-					taskType: message.taskType,
-					offerId: message.offerId,
-					validFor: message.validFor,
-					validUntil:
-						message.validFor === -1
-							? 0n // sentinel value for non-expiring offer
-							: process.hrtime.bigint() + BigInt(message.validFor * 1_000_000),
-				});
+				this.taskOffered(this.toTaskOffer(runnerId, message.taskType, message));
+				break;
+			case 'runner:taskoffers':
+				this.pendingTaskOffers.push(
+					...message.offers.map((offer) => this.toTaskOffer(runnerId, message.taskType, offer)),
+				);
+				this.settleTasks();
 				break;
 			case 'runner:taskdone':
 				await this.taskDoneHandler(message.taskId, message.data);
@@ -199,6 +210,23 @@ export class TaskBroker {
 		}
 	}
 
+	private toTaskOffer(
+		runnerId: TaskRunner['id'],
+		taskType: string,
+		{ offerId, validFor }: Pick<TaskOffer, 'offerId' | 'validFor'>,
+	): TaskOffer {
+		return {
+			runnerId,
+			taskType,
+			offerId,
+			validFor,
+			validUntil:
+				validFor === -1
+					? 0n // sentinel value for non-expiring offer
+					: process.hrtime.bigint() + BigInt(validFor * 1_000_000),
+		};
+	}
+
 	async handleRpcRequest(
 		taskId: Task['id'],
 		callId: string,